@@ -35,34 +35,27 @@
 #
 # To add diagrams to all such fields, or regenerate them with new
 # settings, use the "Kanji Colorizer: (re)generate all" option in the
-# tools menu.
+# tools menu.  "regenerate stale" only redoes notes whose diagrams were
+# made with other settings or from different source text.
 
 
 from anki.hooks import addHook
 from aqt import mw
 from aqt.utils import showInfo, askUser
 from aqt.qt import *
-from .kanjicolorizer.colorizer import (KanjiVG, KanjiColorizer,
+from .kanjicolorizer.colorizer import (KanjiColorizer,
                                       InvalidCharacterError)
+from .kanjicolorizer.prewarm import read_character_list
+from .kanjicolorizer.worker import DebouncedWorker
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import hashlib
+import json
+import os
+import weakref
 
 # Configuration
 
-addon_config = mw.addonManager.getConfig(__name__)
-
-config = "--mode "
-config += addon_config["mode"]
-if addon_config["group-mode"]:
-  config += " --group-mode "
-config += " --saturation "
-config += str(addon_config["saturation"])
-config += " --value "
-config += str(addon_config["value"])
-config += " --image-size "
-config += str(addon_config["image-size"])
-config += " --grid "
-config += addon_config["grid"]
-
 default_config = {
     "modelNameSubstring": "japanese",
     "srcField": "Kanji",
@@ -70,46 +63,140 @@ default_config = {
     "overwrite": True
 }
 
-configs = []
 
-# avoid errors due to invalid config
-if 'model' in addon_config and type(addon_config['model']) is list:  # multiple models specified
-    for model in addon_config['model']:
-        new_model_config = copy.deepcopy(default_config)
-        if 'name' in model and type(model['name']) is str:
-            new_model_config["modelNameSubstring"] = model["name"].lower()
-        else:
-            continue
-        if 'src-field' in model and type(model['src-field']) is str:
-            new_model_config["srcField"] = model['src-field']
-        if 'dst-field' in model and type(model['dst-field']) is str:
-            new_model_config["dstFields"] = [model['dst-field']]
-        if 'dst-field' in model and type(model['dst-field']) is list:
-            new_model_config["dstFields"] = model['dst-field']
-        if 'overwrite-dest' in model and type(model['overwrite-dest']) is bool:
-            new_model_config["overwrite"] = model['overwrite-dest']
-        configs.append(new_model_config)
-else: # only one model
-    configs.append(copy.deepcopy(default_config))
-    if 'model' in addon_config and type(addon_config['model']) is str:
-        configs[0]["modelNameSubstring"] = addon_config['model'].lower()
-    if 'src-field' in addon_config and type(addon_config['src-field']) is str:
-        configs[0]["srcField"] = addon_config['src-field']
-    if 'dst-field' in addon_config and type(addon_config['dst-field']) is str:
-        configs[0]["dstFields"] = [addon_config['dst-field']]
-    if 'dst-field' in addon_config and type(addon_config['dst-field']) is list:
-        configs[0]["dstFields"] = addon_config['dst-field']
-    if 'overwrite-dest' in addon_config and type(addon_config['overwrite-dest']) is bool:
-        configs[0]["overwrite"] = addon_config['overwrite-dest']
-
-kc = KanjiColorizer(config)
+def colorizer_args(addon_config):
+    '''
+    Returns the KanjiColorizer argument string for the add-on config
+    '''
+    config = "--mode "
+    config += addon_config["mode"]
+    if addon_config["group-mode"]:
+      config += " --group-mode "
+    config += " --saturation "
+    config += str(addon_config["saturation"])
+    config += " --value "
+    config += str(addon_config["value"])
+    config += " --image-size "
+    config += str(addon_config["image-size"])
+    config += " --grid "
+    config += addon_config["grid"]
+    return config
+
+
+def model_configs(addon_config):
+    '''
+    Returns a list of model configs (in the format of default_config)
+    from the add-on config
+    '''
+    configs = []
+
+    # avoid errors due to invalid config
+    if 'model' in addon_config and type(addon_config['model']) is list:  # multiple models specified
+        for model in addon_config['model']:
+            new_model_config = copy.deepcopy(default_config)
+            if 'name' in model and type(model['name']) is str:
+                new_model_config["modelNameSubstring"] = model["name"].lower()
+            else:
+                continue
+            if 'src-field' in model and type(model['src-field']) is str:
+                new_model_config["srcField"] = model['src-field']
+            if 'dst-field' in model and type(model['dst-field']) is str:
+                new_model_config["dstFields"] = [model['dst-field']]
+            if 'dst-field' in model and type(model['dst-field']) is list:
+                new_model_config["dstFields"] = model['dst-field']
+            if 'overwrite-dest' in model and type(model['overwrite-dest']) is bool:
+                new_model_config["overwrite"] = model['overwrite-dest']
+            configs.append(new_model_config)
+    else: # only one model
+        configs.append(copy.deepcopy(default_config))
+        if 'model' in addon_config and type(addon_config['model']) is str:
+            configs[0]["modelNameSubstring"] = addon_config['model'].lower()
+        if 'src-field' in addon_config and type(addon_config['src-field']) is str:
+            configs[0]["srcField"] = addon_config['src-field']
+        if 'dst-field' in addon_config and type(addon_config['dst-field']) is str:
+            configs[0]["dstFields"] = [addon_config['dst-field']]
+        if 'dst-field' in addon_config and type(addon_config['dst-field']) is list:
+            configs[0]["dstFields"] = addon_config['dst-field']
+        if 'overwrite-dest' in addon_config and type(addon_config['overwrite-dest']) is bool:
+            configs[0]["overwrite"] = addon_config['overwrite-dest']
+    return configs
+
+
+def load_config(new_config=None):
+    '''
+    (Re)reads the add-on config and everything derived from it.  Anki
+    calls this with the new config when it is edited, so the config
+    file is only read at startup.
+    '''
+    global addon_config, configs, kc
+    if new_config is None:
+        new_config = mw.addonManager.getConfig(__name__)
+    addon_config = new_config
+    configs = model_configs(addon_config)
+    kc = KanjiColorizer(colorizer_args(addon_config))
+    if os.path.exists(prerendered_path):
+        # only used while the config has the settings it was made with
+        kc.settings.prerendered = prerendered_path
+    model_cache.clear()
+    last_render.clear()
+    startPrewarm()
+
+
+def startPrewarm():
+    '''
+    If the config names a prewarm-list in the add-on's user_files
+    folder, renders its first prewarm-top characters in the background
+    (for up to prewarm-budget seconds), keeping them on disk as well so
+    that the next startup is faster still
+    '''
+    global prewarming
+    if prewarming is not None:
+        prewarming.cancel()
+        prewarming = None
+    name = addon_config.get('prewarm-list')
+    if not name:
+        return
+    try:
+        characters = read_character_list(
+            os.path.join(user_files_path, name))
+    except IOError:
+        return
+    kc.settings.cache_directory = os.path.join(user_files_path, 'cache')
+    prewarming = kc.prewarm(characters, addon_config.get('prewarm-top', 500),
+                            addon_config.get('prewarm-budget', 30))
 
 
-def getModelType(model):
+# background prewarming started by load_config, if any
+prewarming = None
+
+# diagrams for the default config, made by the build (see
+# build_anki_addon in pavement.py) if it was asked to
+prerendered_path = os.path.join(os.path.dirname(__file__), 'prerendered.bin')
+
+# files the add-on keeps for itself; Anki leaves the user_files folder
+# alone when it updates an add-on
+user_files_path = os.path.join(os.path.dirname(__file__), 'user_files')
+
+
+# model id -> (model mod time, index in configs or None, field names)
+model_cache = {}
+
+# what the editor last rendered: note key, source text and the
+# destination fields it produced
+last_render = {}
+
+load_config()
+mw.addonManager.setConfigUpdatedAction(__name__, load_config)
+
+
+def modelInfo(model):
     '''
-    Returns the index in configs if model has a valid model name and has both srcField
-    and dstField; otherwise returns None
+    Returns (index in configs or None, field names) for model, cached
+    until the model is modified
     '''
+    cached = model_cache.get(model['id'])
+    if cached is not None and cached[0] == model['mod']:
+        return cached[1:]
     model_name = model['name'].lower()
     fields = mw.col.models.fieldNames(model)
     modelidx = None
@@ -119,7 +206,16 @@ def getModelType(model):
                 any(field for field in model_conf["dstFields"] if field in fields)):
             modelidx = i
             break
-    return modelidx
+    model_cache[model['id']] = (model['mod'], modelidx, fields)
+    return modelidx, fields
+
+
+def getModelType(model):
+    '''
+    Returns the index in configs if model has a valid model name and has both srcField
+    and dstField; otherwise returns None
+    '''
+    return modelInfo(model)[0]
 
 
 def is_kanji(c):
@@ -136,7 +232,7 @@ def characters_to_colorize(s):
     If the string mixes kanji and other characters, it will return
     only the kanji. Otherwise it will return all characters.
     '''
-    conf = mw.addonManager.getConfig(__name__)['diagrammed-characters']
+    conf = addon_config['diagrammed-characters']
     if conf == 'all':
         return list(s)
     elif conf == 'kanji':
@@ -152,47 +248,183 @@ def addKanji(note, flag=False, currentFieldIndex=None):
     '''
     Checks to see if a kanji should be added, and adds it if so.
     '''
-    modelidx = getModelType(note.model())
-    if modelidx is None:
+    plan = diagramPlan(note, currentFieldIndex)
+    if plan is None:
         return flag
+    if not applyDiagrams(note, plan, renderPlans([plan])):
+        return flag
+    # if we're editing an existing card, flush the changes
+    if note.id != 0:
+        note.flush()
+    return True
+
+
+def diagramPlan(note, currentFieldIndex=None):
+    '''
+    Works out which characters of note need diagrams and where they go,
+    or returns None if there is nothing to do
+    '''
+    modelidx, fields = modelInfo(note.model())
+    if modelidx is None:
+        return None
 
     if currentFieldIndex != None:  # We've left a field
         # But it isn't the relevant one
         if note.model()['flds'][currentFieldIndex]['name'] != configs[modelidx]["srcField"]:
-            return flag
+            return None
 
-    srcTxt = mw.col.media.strip(note[configs[modelidx]["srcField"]])
-    existingDstFields = [field for field in configs[modelidx]["dstFields"] if field in mw.col.models.fieldNames(note.model())]
+    existingDstFields = [field for field in configs[modelidx]["dstFields"] if field in fields]
 
-    note_edited = False
+    if currentFieldIndex != None:
+        # Nothing to do if the source and the diagrams are unchanged
+        # since the last time the editor left this field
+        if last_render == renderState(note, modelidx, existingDstFields):
+            return None
+
+    src = note[configs[modelidx]["srcField"]]
+    srcTxt = mw.col.media.strip(src)
     characters = characters_to_colorize(str(srcTxt))
+    compounds = []
+    if addon_config.get('compound-diagram') and len(characters) > 1:
+        # the whole word goes in the first destination as one image
+        compounds = [''.join(characters)]
+    return {'modelidx': modelidx,
+            'dstFields': existingDstFields,
+            'src': src,
+            'srcTxt': srcTxt,
+            'characters': characters,
+            'compounds': compounds,
+            'editing': currentFieldIndex != None}
+
+
+def renderDiagrams(characters, threads=1, compounds=()):
+    '''
+    Renders the characters and writes them to the media folder;
+    returns a dict of character to image tag, leaving out characters
+    there is no data for.  Each distinct character is only rendered and
+    written once.  Doesn't touch notes, so can run in the background.
+
+    Each of compounds (strings of several characters) is written as
+    one image with all of their diagrams side by side instead, keyed by
+    the string.
+
+    With more than one thread, rendering is spread over a thread pool;
+    media is still written from the calling thread.
+    '''
+    singles = list(dict.fromkeys(characters))
+    characters = list(dict.fromkeys(singles + list(''.join(compounds))))
+    if threads > 1 and len(characters) > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            svgs = list(pool.map(renderSvg, characters))
+    else:
+        svgs = [renderSvg(character) for character in characters]
+    svgs = dict(zip(characters, svgs))
+    images = {}
+    for character in singles:
+        svg = svgs[character]
+        if svg is None:
+            # silently ignore non-Japanese characters
+            continue
+        # write to file; anki works in the media directory by default
+        filename = '%05x.svg' % ord(character)
+        anki_fname = mw.col.media.writeData(filename, svg)
+        images[character] = '<img src="{!s}">'.format(anki_fname)
+    for compound in dict.fromkeys(compounds):
+        # characters without data are left out, as they are above
+        shown = [c for c in compound if svgs[c] is not None]
+        if not shown:
+            continue
+        svg = kc.renderer().render_compound_bytes(shown)
+        filename = '_'.join('%05x' % ord(c) for c in shown) + '.svg'
+        anki_fname = mw.col.media.writeData(filename, svg)
+        images[compound] = '<img src="{!s}">'.format(anki_fname)
+    return images
+
+
+def renderPlans(plans, threads=1):
+    '''
+    renderDiagrams for everything that plans need: single diagrams,
+    or compound ones for plans that have them
+    '''
+    characters = {}
+    compounds = {}
+    for plan in plans:
+        if plan['compounds']:
+            compounds.update(dict.fromkeys(plan['compounds']))
+        else:
+            characters.update(dict.fromkeys(plan['characters']))
+    return renderDiagrams(characters, threads, compounds)
+
+
+def renderSvg(character):
+    '''
+    The encoded diagram for character, or None if there is no data
+    for it
+    '''
+    try:
+        return kc.get_colored_svg_bytes(character)
+    except InvalidCharacterError:
+        return None
+
+
+def bulkAddKanji(notes):
+    '''
+    addKanji for many notes (NoteFields from fetchNoteFields): works
+    out the distinct characters all of them need, renders each of those
+    once, fills in the notes and saves the ones that changed with
+    saveNotes.  Returns the number of notes changed.
+    '''
+    plans = []
+    for note in notes:
+        plan = diagramPlan(note)
+        if plan is not None:
+            plans.append((note, plan))
+    images = renderPlans([plan for note, plan in plans],
+                         addon_config.get('render-threads', 1))
+    edited = [note for note, plan in plans
+              if applyDiagrams(note, plan, images)]
+    saveNotes(edited)
+    return len(edited)
+
+
+def applyDiagrams(note, plan, images):
+    '''
+    Puts the rendered images for plan into note's destination fields;
+    returns whether the note was changed.  The note isn't saved; that
+    is up to the caller, so that it happens once however many fields
+    changed.
+    '''
+    modelidx = plan['modelidx']
+    existingDstFields = plan['dstFields']
+    characters = plan['compounds'] or plan['characters']
+
+    note_edited = False
 
     last_destination_field_contents = note[existingDstFields[-1]]
 
     for dstField, character in zip(existingDstFields, characters):
         oldDst = note[dstField]
-        dst=''
-
-        # write to file; anki works in the media directory by default
-        try:
-            filename = KanjiVG(character).ascii_filename
-        except InvalidCharacterError:
-            # silently ignore non-Japanese characters
+        if character not in images:
             continue
-        char_svg = kc.get_colored_svg(character).encode('utf_8')
-        anki_fname = mw.col.media.writeData(filename, char_svg)
-        dst += '<img src="{!s}">'.format(anki_fname)
+        dst = images[character]
 
         if oldDst != '' and not configs[modelidx]["overwrite"]:
             continue
 
         if dst != oldDst and dst != '':
             note[dstField] = dst
-            # if we're editing an existing card, flush the changes
-            if note.id != 0:
-                note.flush()
             note_edited = True
 
+    # A compound diagram replaces the per-character ones, so when
+    # overwriting, the other destinations are cleared rather than left
+    # showing characters a second time
+    if (plan['compounds'] and configs[modelidx]["overwrite"] and
+            characters[0] in images):
+        for dstField in existingDstFields[1:]:
+            if note[dstField] != '':
+                note[dstField] = ''
+                note_edited = True
+
     # Put leftover characters in the last destination. However if it isn't empty and overwrite is false,
     # don't write any characters to it.
     if len(characters) > len(existingDstFields) and (last_destination_field_contents == '' or configs[modelidx]["overwrite"]):
@@ -201,34 +433,242 @@ def addKanji(note, flag=False, currentFieldIndex=None):
         dst = note[dstField]
 
         for character in characters[len(existingDstFields):]:
-            # write to file; anki works in the media directory by default
-            try:
-                filename = KanjiVG(character).ascii_filename
-            except InvalidCharacterError:
-                # silently ignore non-Japanese characters
-                continue
-            char_svg = kc.get_colored_svg(character).encode('utf_8')
-            anki_fname = mw.col.media.writeData(filename, char_svg)
-            dst += '<img src="{!s}">'.format(anki_fname)
+            dst += images.get(character, '')
 
         if dst != oldDst and dst != '':
             note[dstField] = dst
-            # if we're editing an existing card, flush the changes
-            if note.id != 0:
-                note.flush()
             note_edited = True
 
-    return note_edited or flag
+    if plan['editing']:
+        last_render.clear()
+        last_render.update(renderState(note, modelidx, existingDstFields))
 
+    if note.id != 0:
+        generatedIndex().record(note.id, diagramFingerprint(modelidx),
+                                plan['srcTxt'])
 
-# Add a colorized kanji to a Diagram whenever leaving a Kanji field
+    return note_edited
 
-def onFocusLost(flag, note, currentFieldIndex):
-    return addKanji(note, flag, currentFieldIndex)
 
+def renderState(note, modelidx, dstFields):
+    '''
+    What addKanji's result depends on for a note being edited
+    '''
+    return {'note': note.id or id(note),
+            'src': note[configs[modelidx]["srcField"]],
+            'dst': [note[field] for field in dstFields]}
+
+
+# The bulk actions read just the fields of the notes they go through,
+# a batch of notes per query, and write back only the notes they
+# change, a batch at a time
+
+class NoteFields(object):
+    '''
+    The fields of a note as read by fetchNoteFields: enough for
+    diagramPlan and applyDiagrams without loading the whole note.
+    Fields that are set are kept in changes for saveNotes.
+    '''
+
+    def __init__(self, nid, model, fields):
+        self.id = nid
+        self._model = model
+        self._names = modelInfo(model)[1]
+        self.fields = fields
+        self.changes = {}
+
+    def model(self):
+        return self._model
+
+    def __getitem__(self, name):
+        return self.fields[self._names.index(name)]
+
+    def __setitem__(self, name, value):
+        self.fields[self._names.index(name)] = value
+        self.changes[name] = value
+
+
+def batchSize():
+    '''
+    How many notes the bulk actions read or write at a time
+    '''
+    return max(1, int(addon_config.get('note-batch-size', 500)))
+
+
+def fetchNoteFields(nids):
+    '''
+    Yields NoteFields for the notes with ids nids, reading them from
+    the database batchSize() notes per query
+    '''
+    nids = list(nids)
+    models = {}
+    size = batchSize()
+    for start in range(0, len(nids), size):
+        ids = ','.join(str(int(nid)) for nid in nids[start:start + size])
+        rows = mw.col.db.all(
+            'select id, mid, flds from notes where id in (%s)' % ids)
+        for nid, mid, flds in rows:
+            if mid not in models:
+                models[mid] = mw.col.models.get(mid)
+            yield NoteFields(nid, models[mid], flds.split('\x1f'))
+
+
+def saveNotes(notes):
+    '''
+    Writes the changed fields of notes (NoteFields) back to the
+    collection, batchSize() notes per update, each note once
+    '''
+    notes = [note for note in notes if note.changes]
+    size = batchSize()
+    for start in range(0, len(notes), size):
+        batch = []
+        for fields in notes[start:start + size]:
+            note = mw.col.getNote(fields.id)
+            for name, value in fields.changes.items():
+                note[name] = value
+            batch.append(note)
+        if hasattr(mw.col, 'update_notes'):
+            # one transaction, and one undo step, for the batch
+            mw.col.update_notes(batch)
+        else:  # older Anki
+            for note in batch:
+                note.flush()
+
+
+# Record of what each note's diagrams were generated from
+
+class GeneratedIndex(object):
+    '''
+    Maps note ids to the fingerprint of the settings and the source
+    text their diagrams were generated from, stored as JSON in the
+    add-on's user_files folder
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (IOError, ValueError):
+            pass
+
+    def record(self, nid, fingerprint, src):
+        entry = [fingerprint, src]
+        if self.entries.get(str(nid)) != entry:
+            self.entries[str(nid)] = entry
+            self.dirty = True
+
+    def isStale(self, nid, fingerprint, src):
+        return self.entries.get(str(nid)) != [fingerprint, src]
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        self.dirty = False
+
+
+generated_indexes = {}
+
+
+def generatedIndex():
+    '''
+    The GeneratedIndex for the current profile
+    '''
+    profile = mw.pm.name
+    if profile not in generated_indexes:
+        path = os.path.join(user_files_path, 'generated-%s.json' % profile)
+        generated_indexes[profile] = GeneratedIndex(path)
+    return generated_indexes[profile]
+
+
+def saveGeneratedIndexes():
+    for index in generated_indexes.values():
+        index.save()
+
+
+def diagramFingerprint(modelidx):
+    '''
+    Identifies everything other than the source text that a note's
+    diagrams depend on
+    '''
+    parts = [kc.settings_fingerprint(),
+             addon_config['diagrammed-characters'],
+             json.dumps(configs[modelidx]["dstFields"])]
+    if addon_config.get('compound-diagram'):
+        parts.append('compound')
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def onNoteAdded(note):
+    '''
+    Notes added from the editor have no id while their diagrams are
+    generated, so they are recorded once they are saved
+    '''
+    modelidx = getModelType(note.model())
+    if modelidx is None:
+        return
+    srcTxt = mw.col.media.strip(note[configs[modelidx]["srcField"]])
+    generatedIndex().record(note.id, diagramFingerprint(modelidx), srcTxt)
+
+
+# Add a colorized kanji to a Diagram whenever leaving a Kanji field.
+# Rendering and writing media happen in the background; the fields are
+# filled in on the main thread when that is done, unless the note has
+# been changed again by then.
+
+editors = weakref.WeakSet()
+
+
+def onLoadNote(editor):
+    editors.add(editor)
+
+
+def onFocusLost(flag, note, currentFieldIndex):
+    if worker is None:
+        return addKanji(note, flag, currentFieldIndex)
+    plan = diagramPlan(note, currentFieldIndex)
+    if plan is not None:
+        worker.submit(note.id or id(note),
+                      lambda: renderPlans([plan]),
+                      lambda images: onDiagramsRendered(note, plan, images))
+    return flag
+
+
+def onDiagramsRendered(note, plan, images):
+    srcField = configs[plan['modelidx']]["srcField"]
+    if note[srcField] != plan['src']:
+        return  # edited again; a newer job will fill it in
+    if applyDiagrams(note, plan, images):
+        if note.id != 0:
+            note.flush()
+        for editor in list(editors):
+            if editor.note is note:
+                if hasattr(editor, 'loadNoteKeepingFocus'):
+                    editor.loadNoteKeepingFocus()
+                else:
+                    editor.loadNote()
+
+
+if hasattr(mw, 'taskman'):
+    worker = DebouncedWorker(mw.taskman.run_on_main)
+else:  # older Anki; work in the editor hook
+    worker = None
 
 addHook('editFocusLost', onFocusLost)
 
+try:
+    from aqt import gui_hooks
+    gui_hooks.add_cards_did_add_note.append(onNoteAdded)
+    gui_hooks.profile_will_close.append(saveGeneratedIndexes)
+    gui_hooks.editor_did_load_note.append(onLoadNote)
+except (ImportError, AttributeError):  # older Anki
+    addHook('unloadProfile', saveGeneratedIndexes)
+
 
 # menu item to regenerate all
 
@@ -241,11 +681,38 @@ def regenerate_all():
         return
     models = [m for m in mw.col.models.all() if getModelType(m) is not None]
     # Find the notes in those models and give them kanji
-    for model in models:
-        for nid in mw.col.models.nids(model):
-            addKanji(mw.col.getNote(nid))
+    bulkAddKanji(fetchNoteFields(
+        nid for model in models for nid in mw.col.models.nids(model)))
+    saveGeneratedIndexes()
     showInfo("Done regenerating colorized kanji diagrams!")
 
+def regenerate_stale():
+    '''
+    Regenerates diagrams only for notes whose diagrams were made with
+    different settings or source text than they would be now; notes
+    from before this was tracked count as stale
+    '''
+    index = generatedIndex()
+    # model id -> (fingerprint, source field)
+    models = {}
+    nids = []
+    for model in mw.col.models.all():
+        modelidx = getModelType(model)
+        if modelidx is None:
+            continue
+        models[model['id']] = (diagramFingerprint(modelidx),
+                               configs[modelidx]["srcField"])
+        nids.extend(mw.col.models.nids(model))
+    stale = []
+    for note in fetchNoteFields(nids):
+        fingerprint, srcField = models[note.model()['id']]
+        srcTxt = mw.col.media.strip(note[srcField])
+        if index.isStale(note.id, fingerprint, srcTxt):
+            stale.append(note)
+    bulkAddKanji(stale)
+    saveGeneratedIndexes()
+    showInfo("Regenerated diagrams for %d out of date note(s)." % len(stale))
+
 def generate_for_new():
     if not askUser("This option will generate diagrams for notes with "
                    "empty destination field(s) only."
@@ -274,8 +741,8 @@ def generate_for_new():
     search_str = " or ".join(parts)
 
     # Find the notes
-    for note_id in mw.col.findNotes(search_str):
-        addKanji(mw.col.getNote(note_id))
+    bulkAddKanji(fetchNoteFields(mw.col.findNotes(search_str)))
+    saveGeneratedIndexes()
     showInfo("Done generating colorized kanji diagrams!")
 
 # add menu items
@@ -288,3 +755,7 @@ submenu.addAction(do_generate_new)
 do_regenerate_all = QAction("(re)generate all", mw)
 do_regenerate_all.triggered.connect(regenerate_all)
 submenu.addAction(do_regenerate_all)
+
+do_regenerate_stale = QAction("regenerate stale", mw)
+do_regenerate_stale.triggered.connect(regenerate_stale)
+submenu.addAction(do_regenerate_stale)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# bulk_generate.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+# Times the add-on's bulk generation for many notes that share a few
+# characters, comparing addKanji note by note with bulkAddKanji, which
+# renders and writes each distinct character once and reads and saves
+# notes in batches, and counts the database round trips each makes.
+# Uses the same stand-ins for Anki as focus_lost_latency.py.
+#
+# Usage: python3 benchmarks/bulk_generate.py [--notes 2000]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from kanjicolorizer.tests.fakeanki import (  # noqa: E402
+    FakeCollection, FakeMedia, MainThread, load_addon, make_note)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time bulk diagram generation in the add-on')
+    parser.add_argument('--characters', default='漢字',
+                        help='characters the notes are made from')
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help="the add-on's note-batch-size")
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        media = FakeMedia(directory)
+        dst_fields = ['Diagram']
+        addon = load_addon(media, MainThread(), dst_fields)
+        addon.addon_config['render-threads'] = args.threads
+        addon.addon_config['note-batch-size'] = args.batch_size
+        words = [args.characters[i % len(args.characters):] +
+                 args.characters[:i % len(args.characters)]
+                 for i in range(args.notes)]
+        print('method        seconds  diagrams written  round trips')
+        for name in ['addKanji', 'bulkAddKanji']:
+            col = addon.mw.col = FakeCollection(media)
+            for word in words:
+                col.add(make_note(word, dst_fields))
+            addon.kc.renderer()._cache.clear()
+            writes = media.writes
+            start = time.perf_counter()
+            if name == 'addKanji':
+                for nid in col.findNotes(''):
+                    addon.addKanji(col.getNote(nid))
+            else:
+                addon.bulkAddKanji(addon.fetchNoteFields(col.findNotes('')))
+            print('%-12s %8.3f %17d %12d' % (
+                name, time.perf_counter() - start, media.writes - writes,
+                col.round_trips))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
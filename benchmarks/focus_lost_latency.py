@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# focus_lost_latency.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+# Measures how long the Anki add-on's editFocusLost hook blocks the
+# editor, with diagrams rendered in the hook and with them rendered by
+# the background worker, and how long the diagrams then take to show
+# up.  Anki isn't needed: the add-on is loaded with stand-ins for the
+# parts of Anki it uses, a note with a multi-kanji field and several
+# destination fields, and a media folder in a temporary directory.
+#
+# Usage: python3 benchmarks/focus_lost_latency.py [--characters 漢字...]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from kanjicolorizer.tests.fakeanki import (  # noqa: E402
+    FakeMedia, MainThread, load_addon, make_note)
+
+
+def measure(addon, main, characters, dst_fields, blurs, background):
+    worker = addon.worker
+    if not background:
+        addon.worker = None
+    hook_times = []
+    done_times = []
+    for i in range(blurs):
+        note = make_note(characters, dst_fields)
+        note.id = i + 1
+        addon.last_render.clear()
+        # each blur is for a new character, as far as the cache knows
+        addon.kc.renderer()._cache.clear()
+        start = time.perf_counter()
+        addon.onFocusLost(False, note, 0)
+        hook_times.append(time.perf_counter() - start)
+        while note[dst_fields[0]] == '':
+            main.run_pending()
+            time.sleep(0.001)
+        done_times.append(time.perf_counter() - start)
+    worker.wait()
+    addon.worker = worker
+    return hook_times, done_times
+
+
+def burst_writes(addon, main, media, characters, dst_fields, blurs):
+    '''
+    How many diagrams are written when the field is left blurs times
+    in quick succession
+    '''
+    note = make_note(characters, dst_fields)
+    writes = media.writes
+    for i in range(blurs):
+        addon.last_render.clear()
+        addon.onFocusLost(False, note, 0)
+    while not addon.worker.wait(0.01):
+        main.run_pending()
+    return media.writes - writes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the add-on's editFocusLost hook latency")
+    parser.add_argument('--characters', default='漢字',
+                        help='what to put in the source field')
+    parser.add_argument('--dst-fields', type=int, default=3,
+                        help='how many destination fields the model has')
+    parser.add_argument('--blurs', type=int, default=20,
+                        help='how many times to leave the field')
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        main_thread = MainThread()
+        dst_fields = ['Diagram%d' % (i + 1) for i in range(args.dst_fields)]
+        media = FakeMedia(directory)
+        addon = load_addon(media, main_thread, dst_fields)
+        print('mode         hook ms (median / max)   diagrams shown ms')
+        for background in [False, True]:
+            hooks, done = measure(addon, main_thread, args.characters,
+                                  dst_fields, args.blurs, background)
+            hooks.sort()
+            done.sort()
+            print('%-12s %8.2f / %8.2f %16.2f' % (
+                'background' if background else 'in hook',
+                1000 * hooks[len(hooks) // 2], 1000 * hooks[-1],
+                1000 * done[len(done) // 2]))
+        print('diagrams written for a burst of %d blurs: %d'
+              % (args.blurs, burst_writes(addon, main_thread, media,
+                                          args.characters, dst_fields,
+                                          args.blurs)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
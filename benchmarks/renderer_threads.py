@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# renderer_threads.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+# Measures how many diagrams per second a shared Renderer serves to a
+# thread pool, for bursts of requests where each character is asked for
+# several times at once (like many students opening the same lesson).
+#
+# Usage: python3 benchmarks/renderer_threads.py [--characters 漢字...]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from kanjicolorizer.colorizer import Renderer  # noqa: E402
+
+
+def run(characters, threads, repeat):
+    renderer = Renderer()
+    requests = [c for c in characters for i in range(repeat)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for svg in pool.map(renderer.render, requests):
+            pass
+    return len(requests) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark a shared Renderer across thread counts')
+    parser.add_argument('--characters', default='一右雨円王音下火花貝学気九'
+                        '休玉金空月犬見五口校左三山子四糸字耳七車手十出女小上')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='requests for each character in a burst')
+    parser.add_argument('--threads', default='1,2,4,8,16')
+    args = parser.parse_args()
+    print('threads  diagrams/s')
+    for threads in [int(t) for t in args.threads.split(',')]:
+        rate = run(args.characters, threads, args.repeat)
+        print('%7d  %10.0f' % (threads, rate))
+
+
+if __name__ == '__main__':
+    main()
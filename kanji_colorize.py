@@ -25,4 +25,14 @@ from kanjicolorizer.colorizer import KanjiColorizer
 if __name__ == "__main__":
     kc = KanjiColorizer()
     kc.read_cl_args()
-    kc.write_all()
+    if kc.settings.merge_shards:
+        kc.merge_shards()
+    elif kc.settings.diff:
+        kc.diff_manifests()
+    elif kc.settings.stylesheet_only:
+        kc.write_stylesheet()
+    elif kc.settings.prewarm:
+        kc.prewarming.wait()
+        print('prewarmed %d diagram(s)' % kc.prewarming.warmed)
+    else:
+        kc.write_all()
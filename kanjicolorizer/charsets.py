@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# charsets.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Named sets of characters for --charset, so that a known subset (a
+school grade, a JIS level, a Unicode block) can be written without
+listing it.  Sets are resolved against the index of the KanjiVG data
+(see kanjicolorizer.index), so only characters there is data for are
+read and rendered.
+
+Each bundled set has a version, the edition of the standard it comes
+from; a name can be given as NAME@VERSION to make sure a script gets
+the set it was written for.  Codepoint ranges can be given as well, as
+U+XXXX-U+YYYY (or a single U+XXXX).
+'''
+
+import collections
+import re
+
+Charset = collections.namedtuple('Charset', ['name', 'version',
+                                             'description', 'members'])
+
+
+def _jis_rows(first, last):
+    '''
+    Returns a function giving the characters in rows first to last of
+    JIS X 0208, in JIS order
+    '''
+    def members():
+        characters = []
+        for row in range(first, last + 1):
+            for cell in range(1, 95):
+                try:
+                    characters.append(
+                        bytes([0xa0 + row, 0xa0 + cell]).decode('euc_jp'))
+                except UnicodeDecodeError:
+                    pass  # unassigned
+        return characters
+    return members
+
+
+def _codepoints(first, last):
+    '''
+    Returns a function giving the characters from first to last
+    '''
+    return lambda: [chr(c) for c in range(first, last + 1)]
+
+
+# kanji taught in the first year of elementary school
+_GRADE_1 = ('一右雨円王音下火花貝学気九休玉金空月犬見五口校左三山子四糸字'
+            '耳七車手十出女小上森人水正生青夕石赤千川先早草足村大男竹中虫'
+            '町天田土二日入年白八百文木本名目立力林六')
+
+# kanji taught in the second year of elementary school
+_GRADE_2 = ('引羽雲園遠何科夏家歌画回会海絵外角楽活間丸岩顔汽記帰弓牛魚京'
+            '強教近兄形計元言原戸古午後語工公広交光考行高黄合谷国黒今才細'
+            '作算止市矢姉思紙寺自時室社弱首秋週春書少場色食心新親図数西声'
+            '星晴切雪船線前組走多太体台地池知茶昼長鳥朝直通弟店点電刀冬当'
+            '東答頭同道読内南肉馬売買麦半番父風分聞米歩母方北毎妹万明鳴毛'
+            '門夜野友用曜来里理話')
+
+# kanji taught in the third year of elementary school
+_GRADE_3 = ('悪安暗医委意育員院飲運泳駅央横屋温化荷界開階寒感漢館岸起期客'
+            '究急級宮球去橋業曲局銀区苦具君係軽血決研県庫湖向幸港号根祭皿'
+            '仕死使始指歯詩次事持式実写者主守取酒受州拾終習集住重宿所暑助'
+            '昭消商章勝乗植申身神真深進世整昔全相送想息速族他打対待代第題'
+            '炭短談着注柱丁帳調追定庭笛鉄転都度投豆島湯登等動童農波配倍箱'
+            '畑発反坂板皮悲美鼻筆氷表秒病品負部服福物平返勉放味命面問役薬'
+            '由油有遊予羊洋葉陽様落流旅両緑礼列練路和')
+
+# kanji taught in the fourth year of elementary school
+_GRADE_4 = ('愛案以衣位茨印英栄媛塩岡億加果貨課芽賀改械害街各覚潟完官管関'
+            '観願岐希季旗器機議求泣給挙漁共協鏡競極熊訓軍郡群径景芸欠結建'
+            '健験固功好香候康佐差菜最埼材崎昨札刷察参産散残氏司試児治滋辞'
+            '鹿失借種周祝順初松笑唱焼照城縄臣信井成省清静席積折節説浅戦選'
+            '然争倉巣束側続卒孫帯隊達単置仲沖兆低底的典伝徒努灯働特徳栃奈'
+            '梨熱念敗梅博阪飯飛必票標不夫付府阜富副兵別辺変便包法望牧末満'
+            '未民無約勇要養浴利陸良料量輪類令冷例連老労録')
+
+# kanji taught in the fifth year of elementary school
+_GRADE_5 = ('圧囲移因永営衛易益液演応往桜可仮価河過快解格確額刊幹慣眼紀基'
+            '寄規喜技義逆久旧救居許境均禁句型経潔件険検限現減故個護効厚耕'
+            '航鉱構興講告混査再災妻採際在財罪殺雑酸賛士支史志枝師資飼示似'
+            '識質舎謝授修述術準序招証象賞条状常情織職制性政勢精製税責績接'
+            '設絶祖素総造像増則測属率損貸態団断築貯張停提程適統堂銅導得毒'
+            '独任燃能破犯判版比肥非費備評貧布婦武復複仏粉編弁保墓報豊防貿'
+            '暴脈務夢迷綿輸余容略留領歴')
+
+# kanji taught in the sixth year of elementary school
+_GRADE_6 = ('胃異遺域宇映延沿恩我灰拡革閣割株干巻看簡危机揮貴疑吸供胸郷勤'
+            '筋系敬警劇激穴券絹権憲源厳己呼誤后孝皇紅降鋼刻穀骨困砂座済裁'
+            '策冊蚕至私姿視詞誌磁射捨尺若樹収宗就衆従縦縮熟純処署諸除承将'
+            '傷障蒸針仁垂推寸盛聖誠舌宣専泉洗染銭善奏窓創装層操蔵臓存尊退'
+            '宅担探誕段暖値宙忠著庁頂腸潮賃痛敵展討党糖届難乳認納脳派拝背'
+            '肺俳班晩否批秘俵腹奮並陛閉片補暮宝訪亡忘棒枚幕密盟模訳郵優預'
+            '幼欲翌乱卵覧裏律臨朗論')
+
+# the jōyō kanji table of 2010, in its order; 𠮟, 塡, 剝 and 頰 are
+# given in their JIS X 0208 forms 叱, 填, 剥 and 頬, which are the ones
+# most text uses
+_JOYO = ('亜哀挨愛曖悪握圧扱宛嵐安案暗以衣位囲医依委威為畏胃尉異移萎偉'
+         '椅彙意違維慰遺緯域育一壱逸茨芋引印因咽姻員院淫陰飲隠韻右宇羽'
+         '雨唄鬱畝浦運雲永泳英映栄営詠影鋭衛易疫益液駅悦越謁閲円延沿炎'
+         '怨宴媛援園煙猿遠鉛塩演縁艶汚王凹央応往押旺欧殴桜翁奥横岡屋億'
+         '憶臆虞乙俺卸音恩温穏下化火加可仮何花佳価果河苛科架夏家荷華菓'
+         '貨渦過嫁暇禍靴寡歌箇稼課蚊牙瓦我画芽賀雅餓介回灰会快戒改怪拐'
+         '悔海界皆械絵開階塊楷解潰壊懐諧貝外劾害崖涯街慨蓋該概骸垣柿各'
+         '角拡革格核殻郭覚較隔閣確獲嚇穫学岳楽額顎掛潟括活喝渇割葛滑褐'
+         '轄且株釜鎌刈干刊甘汗缶完肝官冠巻看陥乾勘患貫寒喚堪換敢棺款間'
+         '閑勧寛幹感漢慣管関歓監緩憾還館環簡観韓艦鑑丸含岸岩玩眼頑顔願'
+         '企伎危机気岐希忌汽奇祈季紀軌既記起飢鬼帰基寄規亀喜幾揮期棋貴'
+         '棄毀旗器畿輝機騎技宜偽欺義疑儀戯擬犠議菊吉喫詰却客脚逆虐九久'
+         '及弓丘旧休吸朽臼求究泣急級糾宮救球給嗅窮牛去巨居拒拠挙虚許距'
+         '魚御漁凶共叫狂京享供協況峡挟狭恐恭胸脅強教郷境橋矯鏡競響驚仰'
+         '暁業凝曲局極玉巾斤均近金菌勤琴筋僅禁緊錦謹襟吟銀区句苦駆具惧'
+         '愚空偶遇隅串屈掘窟熊繰君訓勲薫軍郡群兄刑形系径茎係型契計恵啓'
+         '掲渓経蛍敬景軽傾携継詣慶憬稽憩警鶏芸迎鯨隙劇撃激桁欠穴血決結'
+         '傑潔月犬件見券肩建研県倹兼剣拳軒健険圏堅検嫌献絹遣権憲賢謙鍵'
+         '繭顕験懸元幻玄言弦限原現舷減源厳己戸古呼固股虎孤弧故枯個庫湖'
+         '雇誇鼓錮顧五互午呉後娯悟碁語誤護口工公勾孔功巧広甲交光向后好'
+         '江考行坑孝抗攻更効幸拘肯侯厚恒洪皇紅荒郊香候校耕航貢降高康控'
+         '梗黄喉慌港硬絞項溝鉱構綱酵稿興衡鋼講購乞号合拷剛傲豪克告谷刻'
+         '国黒穀酷獄骨駒込頃今困昆恨根婚混痕紺魂墾懇左佐沙査砂唆差詐鎖'
+         '座挫才再災妻采砕宰栽彩採済祭斎細菜最裁債催塞歳載際埼在材剤財'
+         '罪崎作削昨柵索策酢搾錯咲冊札刷刹拶殺察撮擦雑皿三山参桟蚕惨産'
+         '傘散算酸賛残斬暫士子支止氏仕史司四市矢旨死糸至伺志私使刺始姉'
+         '枝祉肢姿思指施師恣紙脂視紫詞歯嗣試詩資飼誌雌摯賜諮示字寺次耳'
+         '自似児事侍治持時滋慈辞磁餌璽鹿式識軸七叱失室疾執湿嫉漆質実芝'
+         '写社車舎者射捨赦斜煮遮謝邪蛇尺借酌釈爵若弱寂手主守朱取狩首殊'
+         '珠酒腫種趣寿受呪授需儒樹収囚州舟秀周宗拾秋臭修袖終羞習週就衆'
+         '集愁酬醜蹴襲十汁充住柔重従渋銃獣縦叔祝宿淑粛縮塾熟出述術俊春'
+         '瞬旬巡盾准殉純循順準潤遵処初所書庶暑署緒諸女如助序叙徐除小升'
+         '少召匠床抄肖尚招承昇松沼昭宵将消症祥称笑唱商渉章紹訟勝掌晶焼'
+         '焦硝粧詔証象傷奨照詳彰障憧衝賞償礁鐘上丈冗条状乗城浄剰常情場'
+         '畳蒸縄壌嬢錠譲醸色拭食植殖飾触嘱織職辱尻心申伸臣芯身辛侵信津'
+         '神唇娠振浸真針深紳進森診寝慎新審震薪親人刃仁尽迅甚陣尋腎須図'
+         '水吹垂炊帥粋衰推酔遂睡穂随髄枢崇数据杉裾寸瀬是井世正生成西声'
+         '制姓征性青斉政星牲省凄逝清盛婿晴勢聖誠精製誓静請整醒税夕斥石'
+         '赤昔析席脊隻惜戚責跡積績籍切折拙窃接設雪摂節説舌絶千川仙占先'
+         '宣専泉浅洗染扇栓旋船戦煎羨腺詮践箋銭潜線遷選薦繊鮮全前善然禅'
+         '漸膳繕狙阻祖租素措粗組疎訴塑遡礎双壮早争走奏相荘草送倉捜挿桑'
+         '巣掃曹曽爽窓創喪痩葬装僧想層総遭槽踪操燥霜騒藻造像増憎蔵贈臓'
+         '即束足促則息捉速側測俗族属賊続卒率存村孫尊損遜他多汰打妥唾堕'
+         '惰駄太対体耐待怠胎退帯泰堆袋逮替貸隊滞態戴大代台第題滝宅択沢'
+         '卓拓託濯諾濁但達脱奪棚誰丹旦担単炭胆探淡短嘆端綻誕鍛団男段断'
+         '弾暖談壇地池知値恥致遅痴稚置緻竹畜逐蓄築秩窒茶着嫡中仲虫沖宙'
+         '忠抽注昼柱衷酎鋳駐著貯丁弔庁兆町長挑帳張彫眺釣頂鳥朝貼超腸跳'
+         '徴嘲潮澄調聴懲直勅捗沈珍朕陳賃鎮追椎墜通痛塚漬坪爪鶴低呈廷弟'
+         '定底抵邸亭貞帝訂庭逓停偵堤提程艇締諦泥的笛摘滴適敵溺迭哲鉄徹'
+         '撤天典店点展添転填田伝殿電斗吐妬徒途都渡塗賭土奴努度怒刀冬灯'
+         '当投豆東到逃倒凍唐島桃討透党悼盗陶塔搭棟湯痘登答等筒統稲踏糖'
+         '頭謄藤闘騰同洞胴動堂童道働銅導瞳峠匿特得督徳篤毒独読栃凸突届'
+         '屯豚頓貪鈍曇丼那奈内梨謎鍋南軟難二尼弐匂肉虹日入乳尿任妊忍認'
+         '寧熱年念捻粘燃悩納能脳農濃把波派破覇馬婆罵拝杯背肺俳配排敗廃'
+         '輩売倍梅培陪媒買賠白伯拍泊迫剥舶博薄麦漠縛爆箱箸畑肌八鉢発髪'
+         '伐抜罰閥反半氾犯帆汎伴判坂阪板版班畔般販斑飯搬煩頒範繁藩晩番'
+         '蛮盤比皮妃否批彼披肥非卑飛疲秘被悲扉費碑罷避尾眉美備微鼻膝肘'
+         '匹必泌筆姫百氷表俵票評漂標苗秒病描猫品浜貧賓頻敏瓶不夫父付布'
+         '扶府怖阜附訃負赴浮婦符富普腐敷膚賦譜侮武部舞封風伏服副幅復福'
+         '腹複覆払沸仏物粉紛雰噴墳憤奮分文聞丙平兵併並柄陛閉塀幣弊蔽餅'
+         '米壁璧癖別蔑片辺返変偏遍編弁便勉歩保哺捕補舗母募墓慕暮簿方包'
+         '芳邦奉宝抱放法泡胞俸倣峰砲崩訪報蜂豊飽褒縫亡乏忙坊妨忘防房肪'
+         '某冒剖紡望傍帽棒貿貌暴膨謀頬北木朴牧睦僕墨撲没勃堀本奔翻凡盆'
+         '麻摩磨魔毎妹枚昧埋幕膜枕又末抹万満慢漫未味魅岬密蜜脈妙民眠矛'
+         '務無夢霧娘名命明迷冥盟銘鳴滅免面綿麺茂模毛妄盲耗猛網目黙門紋'
+         '問冶夜野弥厄役約訳薬躍闇由油喩愉諭輸癒唯友有勇幽悠郵湧猶裕遊'
+         '雄誘憂融優与予余誉預幼用羊妖洋要容庸揚揺葉陽溶腰様瘍踊窯養擁'
+         '謡曜抑沃浴欲翌翼拉裸羅来雷頼絡落酪辣乱卵覧濫藍欄吏利里理痢裏'
+         '履璃離陸立律慄略柳流留竜粒隆硫侶旅虜慮了両良料涼猟陵量僚領寮'
+         '療瞭糧力緑林厘倫輪隣臨瑠涙累塁類令礼冷励戻例鈴零霊隷齢麗暦歴'
+         '列劣烈裂恋連廉練錬呂炉賂路露老労弄郎朗浪廊楼漏籠六録麓論和話'
+         '賄脇惑枠湾腕')
+
+CHARSETS = collections.OrderedDict((charset.name, charset) for charset in [
+    Charset('joyo', '2010', 'the 2136 jōyō kanji, the official list of '
+            'kanji for general use', lambda: list(_JOYO)),
+    Charset('grade1', '2017', 'the 80 kanji taught in the first grade of '
+            'Japanese elementary school', lambda: list(_GRADE_1)),
+    Charset('grade2', '2017', 'the 160 kanji taught in the second grade of '
+            'Japanese elementary school', lambda: list(_GRADE_2)),
+    Charset('grade3', '2017', 'the 200 kanji taught in the third grade of '
+            'Japanese elementary school', lambda: list(_GRADE_3)),
+    Charset('grade4', '2017', 'the 202 kanji taught in the fourth grade of '
+            'Japanese elementary school', lambda: list(_GRADE_4)),
+    Charset('grade5', '2017', 'the 193 kanji taught in the fifth grade of '
+            'Japanese elementary school', lambda: list(_GRADE_5)),
+    Charset('grade6', '2017', 'the 191 kanji taught in the sixth grade of '
+            'Japanese elementary school', lambda: list(_GRADE_6)),
+    Charset('jis1', '1997', 'the 2965 level 1 kanji of JIS X 0208',
+            _jis_rows(16, 47)),
+    Charset('jis2', '1997', 'the 3390 level 2 kanji of JIS X 0208',
+            _jis_rows(48, 84)),
+    Charset('hiragana', 'unicode', 'the Unicode Hiragana block',
+            _codepoints(0x3040, 0x309f)),
+    Charset('katakana', 'unicode', 'the Unicode Katakana block',
+            _codepoints(0x30a0, 0x30ff)),
+    Charset('cjk', 'unicode', 'the Unicode CJK Unified Ideographs block',
+            _codepoints(0x4e00, 0x9fff)),
+    Charset('cjk-ext-a', 'unicode', 'the Unicode CJK Unified Ideographs '
+            'Extension A block', _codepoints(0x3400, 0x4dbf)),
+])
+
+_range_re = re.compile(r'^U\+([0-9A-F]{1,6})(?:-(?:U\+)?([0-9A-F]{1,6}))?$',
+                       re.IGNORECASE)
+
+
+def parse_charsets(spec):
+    '''
+    Parses a --charset value: names of sets and codepoint ranges,
+    separated by commas.  Returns a list of Charsets.
+
+    >>> [c.name for c in parse_charsets('grade1,jis1@1997')]
+    ['grade1', 'jis1']
+    >>> charset, = parse_charsets('U+3041-U+3043')
+    >>> charset.members()
+    ['ぁ', 'あ', 'ぃ']
+    >>> parse_charsets('jis1@1978')
+    Traceback (most recent call last):
+        ...
+    ValueError: jis1 is version 1997, not 1978
+    >>> parse_charsets('grade7')
+    Traceback (most recent call last):
+        ...
+    ValueError: unknown charset: grade7
+    '''
+    charsets = []
+    for part in spec.split(','):
+        part = part.strip()
+        m = _range_re.match(part)
+        if m:
+            first = int(m.group(1), 16)
+            last = int(m.group(2) or m.group(1), 16)
+            if first > last or last > 0x10ffff:
+                raise ValueError('invalid codepoint range: %s' % part)
+            charsets.append(Charset(part, 'unicode', 'codepoints ' + part,
+                                    _codepoints(first, last)))
+            continue
+        name, _, version = part.partition('@')
+        if name not in CHARSETS:
+            raise ValueError('unknown charset: %s' % name)
+        charset = CHARSETS[name]
+        if version and version != charset.version:
+            raise ValueError('%s is version %s, not %s'
+                             % (name, charset.version, version))
+        charsets.append(charset)
+    return charsets
+
+
+def resolve(charsets, index):
+    '''
+    Returns (available, missing): the (character, variant) pairs of the
+    characters in charsets that index has data for, in the order of the
+    sets, and the characters it doesn't.  Variants aren't included, as
+    with --characters.  A block or range is mostly characters there is
+    no data for, so those aren't counted as missing.
+
+    >>> from kanjicolorizer.index import KanjiVGIndex, IndexEntry
+    >>> index = KanjiVGIndex([IndexEntry('一', '', 1, [], []),
+    ...                       IndexEntry('右', '', 5, [], []),
+    ...                       IndexEntry('右', 'Kaisho', 5, [], [])])
+    >>> available, missing = resolve(parse_charsets('grade1'), index)
+    >>> available
+    [('一', ''), ('右', '')]
+    >>> len(missing)
+    78
+    '''
+    available = []
+    missing = []
+    for charset in charsets:
+        for character in charset.members():
+            if (character, '') in index:
+                available.append((character, ''))
+            elif charset.version != 'unicode':
+                missing.append(character)
+    return available, missing
+
+
+def describe():
+    '''
+    The bundled sets, for --help
+
+    >>> describe().split('; ')[1]
+    'grade1@2017 (the 80 kanji taught in the first grade of Japanese elementary school)'
+    '''
+    return '; '.join('%s@%s (%s)' % (c.name, c.version, c.description)
+                     for c in CHARSETS.values())
@@ -25,24 +25,39 @@
 
 # Note: this module is in the middle of being refactored.
 
+import collections
 import os
 import re
 from errno import ENOENT as FILE_NOT_FOUND
 import sys
+import threading
+import time
 
-# Anki add-on compatibility
-try:
-    import colorsys
-except ModuleNotFoundError:
-    from . import colorsys  # Anki add-on
-try:
-    import argparse
-except ModuleNotFoundError:
-    from . import argparse  # Anki add-on
+from .stats import RunStats
 
 
-# Function that I want to have after refactoring, currently implemented using
-# existing interface
+# Modules that only some uses need are imported the first time they're
+# needed, so that importing this module and rendering with a Renderer
+# stay quick
+
+def _colorsys():
+    try:
+        import colorsys
+    except ModuleNotFoundError:
+        from . import colorsys  # Anki add-on
+    return colorsys
+
+
+def _argparse():
+    try:
+        import argparse
+    except ModuleNotFoundError:
+        from . import argparse  # Anki add-on
+    return argparse
+
+
+# Function that I want to have after refactoring, implemented with a
+# Renderer so that it doesn't need the command line parser
 
 def colorize(character, mode="spectrum", saturation=0.95, value=0.75,
              image_size=327):
@@ -55,17 +70,247 @@ def colorize(character, mode="spectrum", saturation=0.95, value=0.75,
     True
 
     """
-    arg_fmt = '--mode {} --saturation {} --value {} --image-size {}'
-    arg_string = arg_fmt.format(mode, saturation, value, image_size)
-    colorizer = KanjiColorizer(arg_string)
+    settings = RenderSettings(mode=mode, saturation=float(saturation),
+                              value=float(value), image_size=int(image_size))
+    return Renderer(settings, cache_size=0).render(character)
+
+
+def colorize_many(characters, settings=None, ordered=True, threads=1,
+                  stop=None, renderer=None, as_bytes=False):
+    """
+    Colorizes many characters with one Renderer, yielding a (key,
+    result) pair for each as soon as it is ready, where key is a
+    (character, variant) pair and result is either the svg or the
+    exception that prevented making it; usually InvalidCharacterError,
+    whose args are the character and variant.
+
+    characters can be a string, or any iterable of characters and
+    (character, variant) pairs; it is read as results are needed.
+    settings is a RenderSettings (the defaults if not given); pass
+    renderer instead to share a Renderer, and its cache, between
+    batches.
+
+    >>> for key, svg in colorize_many(['a', ('Л', '')]):
+    ...     print(key, 'has been modified' in str(svg))
+    ('a', '') True
+    ('Л', '') False
+
+    With threads > 1 the characters are rendered in a thread pool; if
+    ordered is false the results come in the order they finish rather
+    than the order of characters.  Stop early by setting the stop
+    event or by closing the generator (or leaving a for loop over it);
+    characters that haven't been started then never are.  as_bytes
+    gives the svgs as UTF-8 bytes.
+    """
+    if renderer is None:
+        renderer = Renderer(settings)
+    render = renderer.render_bytes if as_bytes else renderer.render
+    keys = (_as_key(key) for key in characters)
+
+    def attempt(key):
+        try:
+            return render(*key)
+        except Exception as e:
+            return e
+
+    if threads <= 1:
+        for key in keys:
+            if stop is not None and stop.is_set():
+                return
+            yield key, attempt(key)
+        return
+
+    from concurrent.futures import (ThreadPoolExecutor, FIRST_COMPLETED,
+                                    wait)
+    pool = ThreadPoolExecutor(threads)
+    # submitted futures and their keys, in the order of characters;
+    # only a few per thread are submitted ahead of being yielded
+    pending = collections.OrderedDict()
+    window = 4 * threads
+    try:
+        while True:
+            while len(pending) < window:
+                key = next(keys, None)
+                if key is None:
+                    break
+                pending[pool.submit(attempt, key)] = key
+            if not pending or (stop is not None and stop.is_set()):
+                return
+            if ordered:
+                done = [next(iter(pending))]
+            else:
+                finished = wait(pending, return_when=FIRST_COMPLETED).done
+                done = [future for future in pending if future in finished]
+            for future in done:
+                key = pending.pop(future)
+                yield key, future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def _as_key(key):
+    """
+    Turns a character or a (character, variant) pair into a pair
+
+    >>> _as_key('漢'), _as_key(('字', 'Kaisho'))
+    (('漢', ''), ('字', 'Kaisho'))
+    """
+    if isinstance(key, str):
+        return (key, '')
+    character, variant = key
+    return (character, variant or '')
+
+
+def _split_characters(text):
+    """
+    Splits a --characters value (or a line of a --characters-file) into
+    (character, variant) pairs.
+
+    Without commas, each character is its own entry:
+
+    >>> _split_characters('漢字')
+    [('漢', ''), ('字', '')]
+
+    Commas separate entries, which may include a variant; so may a
+    single entry on its own:
+
+    >>> _split_characters('字-Kaisho,漢')
+    [('字', 'Kaisho'), ('漢', '')]
+    >>> _split_characters('字-Kaisho')
+    [('字', 'Kaisho')]
+
+    Blank entries are left out:
+
+    >>> _split_characters('')
+    []
+    """
+    if ',' in text and len(text) > 1:
+        entries = text.split(',')
+    elif '-' in text and len(text) > 1:
+        entries = [text]
+    else:
+        entries = list(text)
+    pairs = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry:
+            continue
+        character, _, variant = entry.partition('-')
+        pairs.append((character, variant))
+    return pairs
+
+
+def _parse_charsets(spec):
+    """
+    argparse type for --charset; see kanjicolorizer.charsets
+    """
+    from .charsets import parse_charsets
+    try:
+        return parse_charsets(spec)
+    except ValueError as e:
+        raise _argparse().ArgumentTypeError(str(e))
+
+
+def _parse_shard(spec):
+    """
+    argparse type for --shard; see kanjicolorizer.shards.parse_shard
+    """
+    from .shards import parse_shard
+    try:
+        return parse_shard(spec)
+    except ValueError as e:
+        raise _argparse().ArgumentTypeError(str(e))
+
 
-    return colorizer.get_colored_svg(character)
+def _existing_path(path):
+    """
+    argparse type for --source: a file or directory that exists
+    """
+    if not os.path.exists(path):
+        raise _argparse().ArgumentTypeError(
+            "can't read KanjiVG data from %s: no such file or directory"
+            % path)
+    return path
 
 
 # Setup
 
-source_directory = os.path.join(os.path.dirname(__file__),
-                                'data', 'kanjivg', 'kanji')
+# Change this when the same settings start producing different diagrams,
+# so that settings_fingerprint changes too
+RENDER_VERSION = '1'
+
+source_directory = _bundled_directory = os.path.join(
+    os.path.dirname(__file__), 'data', 'kanjivg', 'kanji')
+
+# a kanjivg.xml file to read instead of source_directory, if set
+source_file = None
+
+# a corpus.ResidentCorpus to read from instead of either, if set
+resident_corpus = None
+
+
+def use_source(path):
+    """
+    Makes KanjiVG read its data from path: either a directory of
+    KanjiVG svgs like the bundled one, or a kanjivg.xml file (see
+    kanjicolorizer.xmlsource).  Like source_directory, this applies to
+    everything in the process that isn't given a source of its own
+    (KanjiColorizer's --source only applies to that KanjiColorizer).
+    """
+    global source_directory, source_file, resident_corpus
+    if os.path.isdir(path):
+        source_directory = path
+        source_file = None
+    else:
+        source_file = path
+    resident_corpus = None
+
+
+def _source_paths(source=None):
+    """
+    Returns the (directory, file, corpus) to read KanjiVG data from for
+    source, a path like use_source takes; without one, the ones set for
+    the whole process
+
+    >>> _source_paths(__file__)[1] == __file__
+    True
+    """
+    if source is None:
+        return source_directory, source_file, resident_corpus
+    if os.path.isdir(source):
+        return source, None, None
+    return None, source, None
+
+
+def _data_path(source=None):
+    """
+    The directory or kanjivg.xml file that data for source is read from
+    (see _source_paths)
+    """
+    directory, file, corpus = _source_paths(source)
+    return file or directory
+
+
+def use_resident_corpus(enable=True):
+    """
+    Reads all of the data from the current source into memory (see
+    kanjicolorizer.corpus) so that KanjiVG doesn't have to read files
+    any more, or with enable false goes back to reading files.  Returns
+    the ResidentCorpus, or None.
+
+    >>> corpus = use_resident_corpus()
+    >>> KanjiVG('漢').data == corpus.get_data('漢')
+    True
+    >>> use_resident_corpus(False)
+    """
+    global resident_corpus
+    resident_corpus = None
+    if enable:
+        from .corpus import ResidentCorpus
+        resident_corpus = ResidentCorpus()
+    return resident_corpus
 
 
 # Classes
@@ -75,7 +320,7 @@ class KanjiVG(object):
     Class to create kanji objects containing KanjiVG data and some more
     basic qualities of the character
     '''
-    def __init__(self, character, variant=''):
+    def __init__(self, character, variant='', source=None):
         '''
         Create a new KanjiVG object
 
@@ -96,6 +341,9 @@ class KanjiVG(object):
         >>> k2.variant
         'Kaisho'
 
+        The data is read from source, a directory or kanjivg.xml file,
+        if given, and otherwise from the one set with use_source.
+
         Raises InvalidCharacterError if the character and variant don't
         correspond to known data
 
@@ -109,10 +357,19 @@ class KanjiVG(object):
         self.variant = variant
         if self.variant is None:
             self.variant = ''
+        self._svg = self._data = None
+        directory, file, corpus = _source_paths(source)
+        if corpus is not None:
+            self._data = corpus.get_data(character, self.variant)
+            return
+        if file:
+            from .xmlsource import get_source
+            self._svg = get_source(file).get_svg(character, self.variant)
+            return
         try:
-            with open(os.path.join(source_directory, self.ascii_filename),
-                      'r', encoding='utf-8') as f:
-                self.svg = f.read()
+            with open(os.path.join(directory, self.ascii_filename),
+                      'rb') as f:
+                self._data = f.read()
         except IOError as e:  # file not found
             if e.errno == FILE_NOT_FOUND:
                 raise InvalidCharacterError(character, variant) from e
@@ -132,6 +389,49 @@ class KanjiVG(object):
         m = re.match('^([0-9a-f]*)-?(.*?).svg$', filename)
         return cls(chr(int(m.group(1), 16)), m.group(2))
 
+    @classmethod
+    def _create_from_svg(cls, character, variant, svg):
+        '''
+        Alternate constructor for data that has already been read; used
+        by iter_all() with a kanjivg.xml source.
+
+        >>> k = KanjiVG._create_from_svg('a', '', '<svg />')
+        >>> k.character, k.svg
+        ('a', '<svg />')
+        '''
+        kanji = cls.__new__(cls)
+        kanji.character = character
+        kanji.variant = variant
+        kanji._svg = svg
+        kanji._data = None
+        return kanji
+
+    @property
+    def svg(self):
+        '''
+        The KanjiVG data as a string
+
+        >>> KanjiVG('a').svg.startswith('<?xml')
+        True
+        '''
+        if self._svg is None:
+            self._svg = self._data.decode('utf-8')
+        return self._svg
+
+    @property
+    def data(self):
+        '''
+        The KanjiVG data as UTF-8 bytes, as they were read from the
+        file; this is what rendering to bytes starts from, so that
+        nothing is decoded or encoded more than once
+
+        >>> KanjiVG('a').data.startswith(b'<?xml')
+        True
+        '''
+        if self._data is None:
+            self._data = self._svg.encode('utf-8')
+        return self._data
+
     @property
     def ascii_filename(self):
         '''
@@ -178,221 +478,109 @@ class KanjiVG(object):
         >>> kanji_list[0].__class__.__name__
         'KanjiVG'
         '''
-        kanji = []
-        for file in os.listdir(source_directory):
-            kanji.append(cls._create_from_filename(file))
-        return kanji
-
-
-class KanjiColorizer:
-    """
-    Class that creates colored stroke order diagrams out of kanjivg
-    data, and writes them to file.
-
-    Initialize with no arguments to take the command line settings, or
-    an empty string to use default settings
-
-    Settings can set by initializing with a string in the same format as
-    the command line.
-    >>> test_output_dir = os.path.join('test', 'colorized-kanji')
-    >>> my_args = ' '.join(['--characters', 'aあ漢',
-    ...                     '--output', test_output_dir])
-    >>> kc = KanjiColorizer(my_args)
-
-    To get an svg for a single character
-    >>> colored_svg = kc.get_colored_svg('a')
-
-    To create a set of diagrams:
-    >>> kc.write_all()
+        return list(cls.iter_all())
 
-    Note: This class is in the middle of having stuff that shouldn't be
-    included factored out.  Some things have already been moved to the
-    KanjiVG class; more stuff will move.
-    """
-
-    def __init__(self, argstring=''):
+    @classmethod
+    def iter_all(cls, include=None, source=None):
         '''
-        Creates a new instance of KanjiColorizer, which stores settings
-        and provides various methods to produce colored kanji SVGs.
-
-        Takes an option alrgument of with an argument string; see
-        read_arg_string documentation for information on how this is
-        used.
+        Like get_all, but yields the KanjiVG objects one at a time.  If
+        include is given, it is called with each (character, variant)
+        pair and only the files it returns true for are read.  source
+        is as for KanjiVG().
+
+        >>> kanji = KanjiVG.iter_all(lambda c, v: c == 'a')
+        >>> [k.character for k in kanji]
+        ['a']
         '''
-        self._init_parser()
-        self.read_arg_string(argstring)
-
-    def _init_parser(self):
-        r"""
-        Initializes argparse.ArgumentParser self._parser
-
-        >>> kc = KanjiColorizer()
-
-        To show that it really is creating it:
-        >>> kc._parser = None
+        directory, file, corpus = _source_paths(source)
+        if corpus is not None:
+            for character, variant in list(corpus.keys()):
+                if include is None or include(character, variant):
+                    yield cls(character, variant)
+            return
+        if file:
+            from .xmlsource import get_source
+            for character, variant, svg in get_source(file).iter_svgs(
+                    include):
+                yield cls._create_from_svg(character, variant, svg)
+            return
+        for filename in os.listdir(directory):
+            m = re.match('^([0-9a-f]*)-?(.*?).svg$', filename)
+            character, variant = chr(int(m.group(1), 16)), m.group(2)
+            if include is None or include(character, variant):
+                yield cls(character, variant, source)
+
+    # Queries answered from the metadata index, without reading svgs
 
-        Then when this method is run:
-        >>> kc._init_parser()
-        >>> type(kc._parser)
-        <class 'argparse.ArgumentParser'>
-
-        >>> kc._parser.get_default('mode')
-        'spectrum'
+    @classmethod
+    def with_stroke_count(cls, count):
+        '''
+        Returns a list of (character, variant) pairs for everything
+        drawn with count strokes
 
-        """
-        self._parser = argparse.ArgumentParser(description='Create a set of '
-                                             'colored stroke order svgs')
-        self._parser.add_argument('--mode', default='spectrum',
-                    choices=['spectrum', 'contrast'],
-                    help='spectrum: color progresses evenly through the'
-                        ' spectrum; nice for seeing the way the kanji is'
-                        ' put together at a glance, but has the disadvantage'
-                        ' of using similar colors for consecutive strokes '
-                        'which can make it less clear which number goes '
-                        'with which stroke.  contrast: maximizes contrast '
-                        'among any group of consecutive strokes, using the '
-                        'golden ratio; also provides consistency by using '
-                        'the same sequence for every kanji.  (default: '
-                        '%(default)s)')
-        self._parser.add_argument('--saturation', default=0.95, type=float,
-                    help='a decimal indicating saturation where 0 is '
-                        'white/gray/black and 1 is completely  colorful '
-                        '(default: %(default)s)')
-        self._parser.add_argument('--group-mode', action='store_true',
-                    help='Color kanji groups instead of stroke by stroke '
-                        '(default: %(default)s)')
-        self._parser.add_argument('--value', default=0.75, type=float,
-                    help='a decimal indicating value where 0 is black '
-                        'and 1 is colored or white '
-                        '(default: %(default)s)')
-        self._parser.add_argument('--image-size', default=327, type=int,
-                    help="image size in pixels; they're square so this "
-                        'will be both height and width '
-                        '(default: %(default)s)')
-        self._parser.add_argument('--characters', type=str,
-                    help='a list of characters to include, without '
-                         'spaces; if this option is used, no variants '
-                         'will be included; if this option is not '
-                         'used, all characters will be included, '
-                         'including variants')
-        self._parser.add_argument('--filename-mode', default='character',
-                    choices=['character', 'code'],
-                    help='character: rename the files to use the '
-                        'unicode character as a filename.  code: leave it '
-                        'as the code.  '
-                        '(default: %(default)s)')
-        self._parser.add_argument('-o', '--output-directory',
-                    default='colorized-kanji')
-        self._parser.add_argument('--grid', default='none', type=str,
-                    choices=['none', '2x2', '4x4', 'diag', '2x2diag', '4x4diag'],
-                    help='none: no grid is drawn. 2x2: a 2x2 grid is drawn. '
-                        '4x4: a 4x4 grid is drawn. diag: diagonals are drawn. '
-                        '2x2diag: a 2x2 grid with diagonals is drawn. '
-                        '4x4diag: a 4x4 grid with diagonals is drawn. '
-                        '(default: ' '%(default)s)')
+        >>> ('a', '') in KanjiVG.with_stroke_count(2)
+        True
+        '''
+        from .index import get_index
+        return get_index().with_stroke_count(count)
 
-    # Public methods
+    @classmethod
+    def containing_element(cls, element):
+        '''
+        Returns a list of (character, variant) pairs for everything
+        that has element as one of its parts
 
-    def read_cl_args(self):
-        """
-        Sets the settings to what's indicated in command line arguments
+        >>> ('漢', '') in KanjiVG.containing_element('口')
+        True
+        '''
+        from .index import get_index
+        return get_index().containing_element(element)
 
-        >>> kc = KanjiColorizer()
-        >>> kc.settings.mode
-        'spectrum'
-        >>> sys.argv = ['this.py', '--mode', 'contrast']
-        >>> kc.read_cl_args()
-        >>> kc.settings.mode
-        'contrast'
-        """
-        self.settings = self._parser.parse_args()
+    @classmethod
+    def variants_of(cls, character):
+        '''
+        Returns a list of the variants there is data for, not including
+        the plain form of the character
 
-    def read_arg_string(self, argstring):
-        """
-        >>> kc = KanjiColorizer()
-        >>> kc.settings.mode
-        'spectrum'
-        >>> kc.read_arg_string('--mode contrast')
-        >>> kc.settings.mode
-        'contrast'
-        """
-        self.settings = self._parser.parse_args(argstring.split())
+        >>> KanjiVG.variants_of('字')
+        ['Kaisho']
+        '''
+        from .index import get_index
+        return get_index().variants(character)
 
-    def get_colored_svg(self, character):
-        """
-        Returns a string containing a colored stroke order diagram svg
-        for character.
 
-        >>> kc = KanjiColorizer()
-        >>> svg = kc.get_colored_svg('a')
-        >>> svg.splitlines()[0]
-        '<?xml version="1.0" encoding="UTF-8"?>'
-        >>> svg.find('00061')
-        1795
-        >>> svg.find('has been modified')
-        54
+class _SVGModifier(object):
+    '''
+    Methods for modifying KanjiVG svgs according to self.settings;
+    shared by KanjiColorizer and Renderer
+    '''
 
-        """
-        svg = KanjiVG(character).svg
-        svg = self._modify_svg(svg)
-        return svg
+    # settings that affect the diagrams themselves
+    _rendering_settings = ('mode', 'saturation', 'value', 'image_size',
+                           'grid', 'group_mode', 'color_output', 'stylesheet')
 
-    def write_all(self):
+    def settings_fingerprint(self):
         """
-        Converts all svgs (or only those specified with the --characters
-        option) and prints them to files in the destination directory.
-
-        Silently ignores invalid characters.
-
-        >>> test_output_dir = os.path.join('test', 'colorized-kanji')
-        >>> kc = KanjiColorizer(' '.join(['--characters', 'aあ漢',
-        ...                               '--output', test_output_dir]))
-        >>> kc.write_all()
+        Returns a short string identifying the settings that change how
+        diagrams look, so that diagrams made with other settings can be
+        recognized as out of date.
 
-        These should be the correct files:
-        >>> import difflib
-        >>> for file in os.listdir(test_output_dir):
-        ...     our_svg = open(
-        ...         os.path.join(test_output_dir, file),
-        ...         'r', encoding='utf-8').read()
-        ...     desired_svg = open(
-        ...         os.path.join('test', 'default_results',
-        ...             'kanji-colorize-spectrum',  file),
-        ...             'r', encoding='utf-8').read()
-        ...     for line in difflib.context_diff(our_svg.splitlines(1),
-        ...            desired_svg.splitlines(1)):
-        ...         print(line)
-        ...
+        >>> default = KanjiColorizer('').settings_fingerprint()
+        >>> KanjiColorizer('--mode contrast').settings_fingerprint() == default
+        False
 
-        Clean up doctest
-        >>> import shutil
-        >>> shutil.rmtree(test_output_dir)
+        Settings that only say what to write and where don't count:
 
+        >>> KanjiColorizer('--characters a -o x').settings_fingerprint() == default
+        True
         """
-        self._setup_dst_dir()
-        if not self.settings.characters:
-            characters = KanjiVG.get_all()
-        else:
-            characters = []
-            if ',' in self.settings.characters \
-                    and len(self.settings.characters) > 1:
-                self.settings.characters = self.settings.characters.split(',')
-            for c in self.settings.characters:
-                var = ''
-                if '-' in c:
-                    varsplit = c.split('-')
-                    c = varsplit[0]
-                    var = '-'.join(varsplit[1:])
-                try:
-                    characters.append(KanjiVG(c, var))
-                except InvalidCharacterError:
-                    pass
-        for kanji in characters:
-            svg = self._modify_svg(kanji.svg)
-            dst_file_path = os.path.join(self.settings.output_directory,
-                self._get_dst_filename(kanji))
-            with open(dst_file_path, 'w', encoding='utf-8') as f:
-                f.write(svg)
+        import hashlib
+        values = [RENDER_VERSION] + [
+            repr(self._stylesheet_href() if name == 'stylesheet'
+                 else getattr(self.settings, name))
+            for name in self._rendering_settings]
+        digest = hashlib.sha1('\n'.join(values).encode('utf-8'))
+        return digest.hexdigest()[:16]
 
     def _modify_svg(self, svg):
         """
@@ -414,6 +602,7 @@ class KanjiColorizer:
         ...     print(line)
         ...
         """
+        stroke_count = self._stroke_count(svg)
         svg = self._color_svg(svg)
 
         if self.settings.group_mode:
@@ -423,60 +612,100 @@ class KanjiColorizer:
             svg = self._add_grid(svg)
 
         svg = self._resize_svg(svg)
+        if self.settings.color_output == 'class':
+            svg = self._style_svg(svg, stroke_count)
         svg = self._comment_copyright(svg)
         return svg
 
-    def _remove_strokes(self, svg):
-        return re.sub("<text.*?</text>", "", svg)
-
-    # Private methods for working with files and directories
+    def _render_kanji(self, kanji):
+        """
+        Returns the diagram for a KanjiVG object as UTF-8 bytes, ready
+        to be written out: its data is decoded once and the result
+        encoded once
 
-    def _setup_dst_dir(self):
-        """
-        Creates the destination directory args.output_directory if
-        necessary
-
-        (Set up the doctest environment)
-        >>> current_directory = os.path.abspath(os.path.curdir)
-        >>> os.mkdir(os.path.join('test', 'doctest-tmp'))
-        >>> os.chdir(os.path.join('test', 'doctest-tmp'))
         >>> kc = KanjiColorizer('')
-
-        This creates the directory
-        >>> kc._setup_dst_dir()
-        >>> os.listdir(os.path.curdir)
-        ['colorized-kanji']
-
-        But doesn't do anything or throw an error if it already exists
-        >>> kc._setup_dst_dir()
-        >>> os.listdir(os.path.curdir)
-        ['colorized-kanji']
-
-        (done; reseting environment for other doctests)
-        >>> os.rmdir(kc.settings.output_directory)
-        >>> os.chdir(os.path.pardir)
-        >>> os.rmdir('doctest-tmp')
-        >>> os.chdir(current_directory)
+        >>> kc._render_kanji(KanjiVG('a')).startswith(b'<?xml')
+        True
         """
-        if not (os.path.exists(self.settings.output_directory)):
-            os.mkdir(self.settings.output_directory)
+        return self._modify_svg(kanji.svg).encode('utf-8')
 
-    def _get_dst_filename(self, kanji):
+    def _compose_svgs(self, svgs):
         """
-        Return the correct filename, based on args.filename-mode
-
-        >>> kc = KanjiColorizer('--filename-mode code')
-        >>> kc._get_dst_filename(KanjiVG('a'))
-        '00061.svg'
-        >>> kc = KanjiColorizer('--filename-mode character')
-        >>> kc._get_dst_filename(KanjiVG('a'))
-        'a.svg'
-
+        Lays out rendered diagrams (as UTF-8 bytes) side by side in one
+        svg: the first one's prolog (copyright notice, DOCTYPE and any
+        stylesheet link), then each diagram's svg element moved into
+        place with a transform
+
+        >>> kc = KanjiColorizer('--image-size 10')
+        >>> svg = b'<!-- notice -->\\n<svg width="10">\\n</svg>\\n'
+        >>> print(kc._compose_svgs([svg, svg]).decode('utf-8'), end='')
+        <!-- notice -->
+        <svg xmlns="http://www.w3.org/2000/svg" width="20" height="10" viewBox="0 0 20 10">
+        <g transform="translate(0,0)">
+        <svg width="10">
+        </svg>
+        </g>
+        <g transform="translate(10,0)">
+        <svg width="10">
+        </svg>
+        </g>
+        </svg>
         """
-        if (self.settings.filename_mode == 'character'):
-            return kanji.character_filename
+        size = self.settings.image_size
+        width = size * len(svgs)
+        parts = [svgs[0][:svgs[0].index(b'<svg ')],
+                 b'<svg xmlns="http://www.w3.org/2000/svg" width="%d" '
+                 b'height="%d" viewBox="0 0 %d %d">\n'
+                 % (width, size, width, size)]
+        for i, svg in enumerate(svgs):
+            parts.append(b'<g transform="translate(%d,0)">\n' % (i * size))
+            parts.append(svg[svg.index(b'<svg '):].rstrip())
+            parts.append(b'\n</g>\n')
+        parts.append(b'</svg>\n')
+        return b''.join(parts)
+
+    def stylesheet(self, stroke_counts):
+        """
+        Returns the CSS that colors diagrams made with --color-output
+        class, for characters with any of the given stroke counts.
+
+        In spectrum mode the colors depend on how many strokes the
+        character has, so the rules only apply inside an svg of the
+        matching n<count> class:
+
+        >>> kc = KanjiColorizer('--color-output class')
+        >>> print(kc.stylesheet([2]), end='')
+        .n2 .s1 { stroke: #bf0909; }
+        .n2 text.s1 { fill: #bf0909; stroke: none; }
+        .n2 .s2 { stroke: #09bfbf; }
+        .n2 text.s2 { fill: #09bfbf; stroke: none; }
+
+        Contrast mode uses the same sequence of colors for everything:
+
+        >>> kc = KanjiColorizer('--color-output class --mode contrast')
+        >>> print(kc.stylesheet([1, 2]), end='')
+        .s1 { stroke: #bf0909; }
+        text.s1 { fill: #bf0909; stroke: none; }
+        .s2 { stroke: #093ebf; }
+        text.s2 { fill: #093ebf; stroke: none; }
+        """
+        stroke_counts = sorted(set(stroke_counts))
+        if self.settings.mode == 'contrast':
+            scopes = [('', stroke_counts[-1])] if stroke_counts else []
         else:
-            return kanji.ascii_filename
+            scopes = [('.n%d ' % n, n) for n in stroke_counts]
+        rules = []
+        for scope, n in scopes:
+            colors = self._color_generator(n)
+            for i in range(1, n + 1):
+                color = next(colors)
+                rules.append('%s.s%d { stroke: %s; }\n' % (scope, i, color))
+                rules.append('%stext.s%d { fill: %s; stroke: none; }\n'
+                             % (scope, i, color))
+        return ''.join(rules)
+
+    def _remove_strokes(self, svg):
+        return re.sub("<text.*?</text>", "", svg)
 
     # private methods for modifying svgs
 
@@ -496,7 +725,17 @@ class KanjiColorizer:
         >>> svg = "<svg><path /><path /></svg>"
         >>> kc._color_svg(svg)
         '<svg><path style="stroke: #bf0909;" /><path style="stroke: #09bfbf;" /></svg>'
+
+        With --color-output class, the colors are left to a stylesheet
+        and the elements are numbered instead:
+
+        >>> svg = "<svg><path /><path /><text >1</text><text >2</text></svg>"
+        >>> kc = KanjiColorizer('--color-output class')
+        >>> kc._color_svg(svg)
+        '<svg><path class="s1" /><path class="s2" /><text class="s1" >1</text><text class="s2" >2</text></svg>'
         """
+        if self.settings.color_output == 'class':
+            return self._class_svg(svg)
         color_iterator = self._color_generator(self._stroke_count(svg))
 
         def path_match(match_object):
@@ -514,35 +753,102 @@ class KanjiColorizer:
         if not self.settings.group_mode:
             svg = re.sub('<path ', path_match, svg)
             return re.sub('<text ', text_match, svg)
+        return self._color_svg_groups(svg, path_match)
+
+    def _color_svg_groups(self, svg, group_match):
+        """
+        Applies group_match to the opening tag of each outermost
+        group with a kvg:element, for group mode
+        """
+        found = False
+        depth = 0
+        iopen = 0
+        lines = svg.split('\n')
+
+        # collected in a list and joined once: adding each line to a
+        # string copies everything so far, which is quadratic for big
+        # files
+        nsvg = []
+        for line in lines:
+            if line.find('<g ') != -1 or line.find('</g>') != -1:
+                if not found:
+                    if line.find("<g ") != -1 and line.find('kvg:element') != -1:
+                        found = True
+                        #print "first element tag found"
+                else:
+                    if line.find("</g>") != -1:
+                        if iopen != 0 and iopen == depth:
+                            iopen = 0
+                            #print 'color group closed'
+                        depth-=1
+
+                    if line.find("<g ") != -1:
+                        depth+=1
+                        if iopen == 0 and line.find('kvg:element') != -1:
+                            iopen = depth
+                            line = re.sub('<g ', group_match, line)
+                            #print 'color group opened'
+
+            nsvg.append(line)
+        nsvg.append('')
+        return '\n'.join(nsvg)
+
+    def _class_svg(self, svg):
+        """
+        Like _color_svg, but gives each stroke (or group, in group mode)
+        and stroke number the class s<stroke number>
+        """
+        n = self._stroke_count(svg)
+        classes = iter(2 * ['s%d' % i for i in range(1, n + 1)])
+
+        def class_match(match_object):
+            return (match_object.re.pattern +
+                    'class="' + next(classes) + '" ')
+
+        if not self.settings.group_mode:
+            svg = re.sub('<path ', class_match, svg)
+            return re.sub('<text ', class_match, svg)
+        return self._color_svg_groups(svg, class_match)
+
+    def _style_svg(self, svg, stroke_count):
+        """
+        For --color-output class, marks the svg with its stroke count
+        and adds the stylesheet its classes need: either a reference to
+        the shared --stylesheet or an embedded style element
+
+        >>> svg = '<?xml version="1.0"?>\\n<svg width="1">\\n</svg>\\n'
+        >>> kc = KanjiColorizer('--color-output class')
+        >>> print(kc._style_svg(svg, 1), end='')
+        <?xml version="1.0"?>
+        <svg width="1" class="n1">
+        <style type="text/css">
+        .n1 .s1 { stroke: #bf0909; }
+        .n1 text.s1 { fill: #bf0909; stroke: none; }
+        </style>
+        </svg>
+        >>> kc = KanjiColorizer('--color-output class --stylesheet k.css')
+        >>> print(kc._style_svg(svg, 1), end='')
+        <?xml version="1.0"?>
+        <?xml-stylesheet type="text/css" href="k.css"?>
+        <svg width="1" class="n1">
+        </svg>
+        """
+        if self.settings.stylesheet:
+            style = ''
+            svg = svg.replace(
+                '?>\n',
+                '?>\n<?xml-stylesheet type="text/css" href="%s"?>\n'
+                % self._stylesheet_href(), 1)
         else:
-            found = False
-            depth = 0
-            iopen = 0
-            lines = svg.split('\n')
-
-            nsvg=''
-            for line in lines:
-                if line.find('<g ') != -1 or line.find('</g>') != -1:
-                    if not found:
-                        if line.find("<g ") != -1 and line.find('kvg:element') != -1:
-                            found = True
-                            #print "first element tag found"
-                    else:
-                        if line.find("</g>") != -1:
-                            if iopen != 0 and iopen == depth:
-                                iopen = 0
-                                #print 'color group closed'
-                            depth-=1
-
-                        if line.find("<g ") != -1:
-                            depth+=1
-                            if iopen == 0 and line.find('kvg:element') != -1:
-                                iopen = depth
-                                line = re.sub('<g ', path_match, line)
-                                #print 'color group opened'
-
-                nsvg+=line+"\n"
-            return nsvg
+            style = ('\n<style type="text/css">\n' +
+                     self.stylesheet([stroke_count]) + '</style>')
+        return re.sub(
+            '(<svg [^>]*)>',
+            lambda m: '%s class="n%d">%s' % (m.group(1), stroke_count, style),
+            svg, count=1)
+
+    def _stylesheet_href(self):
+        return self.settings.stylesheet
 
     def _add_grid(self, svg):
         """
@@ -667,7 +973,7 @@ The original SVG has the following copyright:
         >>> kc._hsv_to_rgbhexcode(0.5, 0.95, 0.75)
         '#09bfbf'
         """
-        color = colorsys.hsv_to_rgb(h, s, v)
+        color = _colorsys().hsv_to_rgb(h, s, v)
         return '#%02x%02x%02x' % tuple([int(i * 255) for i in color])
 
     def _color_generator(self, n):
@@ -696,6 +1002,1099 @@ The original SVG has the following copyright:
                     self.settings.saturation, self.settings.value)
 
 
+class KanjiColorizer(_SVGModifier):
+    """
+    Class that creates colored stroke order diagrams out of kanjivg
+    data, and writes them to file.
+
+    Initialize with no arguments to take the command line settings, or
+    an empty string to use default settings
+
+    Settings can set by initializing with a string in the same format as
+    the command line.
+    >>> test_output_dir = os.path.join('test', 'colorized-kanji')
+    >>> my_args = ' '.join(['--characters', 'aあ漢',
+    ...                     '--output', test_output_dir])
+    >>> kc = KanjiColorizer(my_args)
+
+    To get an svg for a single character
+    >>> colored_svg = kc.get_colored_svg('a')
+
+    To create a set of diagrams:
+    >>> kc.write_all()
+
+    Note: This class is in the middle of having stuff that shouldn't be
+    included factored out.  Some things have already been moved to the
+    KanjiVG class; more stuff will move.
+    """
+
+    def __init__(self, argstring=''):
+        '''
+        Creates a new instance of KanjiColorizer, which stores settings
+        and provides various methods to produce colored kanji SVGs.
+
+        Takes an option alrgument of with an argument string; see
+        read_arg_string documentation for information on how this is
+        used.
+        '''
+        self._renderer = None
+        self.stats = None
+        self.prewarming = None
+        self._init_parser()
+        self.read_arg_string(argstring)
+
+    def _init_parser(self):
+        r"""
+        Initializes argparse.ArgumentParser self._parser
+
+        >>> kc = KanjiColorizer()
+
+        To show that it really is creating it:
+        >>> kc._parser = None
+
+        Then when this method is run:
+        >>> kc._init_parser()
+        >>> type(kc._parser)
+        <class 'argparse.ArgumentParser'>
+
+        >>> kc._parser.get_default('mode')
+        'spectrum'
+
+        """
+        self._parser = _argparse().ArgumentParser(description='Create a set of '
+                                             'colored stroke order svgs')
+        self._parser.add_argument('--mode', default='spectrum',
+                    choices=['spectrum', 'contrast'],
+                    help='spectrum: color progresses evenly through the'
+                        ' spectrum; nice for seeing the way the kanji is'
+                        ' put together at a glance, but has the disadvantage'
+                        ' of using similar colors for consecutive strokes '
+                        'which can make it less clear which number goes '
+                        'with which stroke.  contrast: maximizes contrast '
+                        'among any group of consecutive strokes, using the '
+                        'golden ratio; also provides consistency by using '
+                        'the same sequence for every kanji.  (default: '
+                        '%(default)s)')
+        self._parser.add_argument('--saturation', default=0.95, type=float,
+                    help='a decimal indicating saturation where 0 is '
+                        'white/gray/black and 1 is completely  colorful '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--group-mode', action='store_true',
+                    help='Color kanji groups instead of stroke by stroke '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--value', default=0.75, type=float,
+                    help='a decimal indicating value where 0 is black '
+                        'and 1 is colored or white '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--image-size', default=327, type=int,
+                    help="image size in pixels; they're square so this "
+                        'will be both height and width '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--characters', type=str,
+                    help='a list of characters to include, without '
+                         'spaces; if this option is used, no variants '
+                         'will be included; if this option is not '
+                         'used, all characters will be included, '
+                         'including variants')
+        self._parser.add_argument('--characters-file', type=str,
+                    metavar='PATH',
+                    help='a file to read characters to include from, '
+                         'one per line, or - to read standard input; '
+                         'a line may also be a character followed by '
+                         'a variant, like 字-Kaisho.  Can be combined '
+                         'with --characters; duplicates are only '
+                         'written once')
+        from .charsets import describe
+        self._parser.add_argument('--charset', type=_parse_charsets,
+                    metavar='NAME[,NAME]',
+                    help='write the characters of named sets, found in '
+                        'the index of the data so that only they are '
+                        'read: ' + describe().replace('%', '%%') + '.  '
+                        'A name can be followed by @VERSION to require '
+                        'that version of the set, and codepoint ranges '
+                        'like U+3040-U+309F can be given too.  No variants '
+                        'are included.  Can be combined with '
+                        '--characters and --characters-file')
+        self._parser.add_argument('--filename-mode', default='character',
+                    choices=['character', 'code'],
+                    help='character: rename the files to use the '
+                        'unicode character as a filename.  code: leave it '
+                        'as the code.  '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--output-layout', default='flat',
+                    choices=['flat', 'sharded'],
+                    help='flat: write every file to the output directory '
+                        'itself.  sharded: spread the files over '
+                        'subdirectories and write index.json mapping each '
+                        'character to its file (default: %(default)s)')
+        self._parser.add_argument('--layout-key', default='hash',
+                    choices=['hash', 'codepoint'],
+                    help='with --output-layout sharded, choose '
+                        'subdirectories by a hash of the character, which '
+                        'spreads files evenly, or by its codepoint, which '
+                        'keeps neighboring characters together '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--fan-out', default=256, type=int,
+                    metavar='N',
+                    help='with --output-layout sharded, how many '
+                        'subdirectories each directory can have '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--depth', default=1, type=int,
+                    metavar='N',
+                    help='with --output-layout sharded, how many levels '
+                        'of subdirectories to use (default: %(default)s)')
+        self._parser.add_argument('--source', metavar='PATH',
+                    type=_existing_path,
+                    help='read the KanjiVG data from PATH, either a '
+                        'kanjivg.xml file or a directory of KanjiVG svgs, '
+                        'instead of the bundled data.  Diagrams made from '
+                        'kanjivg.xml have no stroke numbers, because it '
+                        "doesn't include them")
+        self._parser.add_argument('--cache-dir', dest='cache_directory',
+                    metavar='DIR',
+                    help='keep rendered diagrams in DIR as well as in '
+                        'memory, so that they are still there after a '
+                        'restart.  Only diagrams asked for one at a time '
+                        '(by --prewarm, or through the module, as the '
+                        'Anki add-on does) are cached; writing a set of '
+                        'diagrams always renders them')
+        self._parser.add_argument('--prerendered', metavar='PATH',
+                    help='copy diagrams from PATH, a store made with '
+                        'kanjicolorizer.prerendered.build_store, instead '
+                        'of rendering them, if it was made with the same '
+                        'settings; it is ignored otherwise')
+        self._parser.add_argument('--prewarm', metavar='PATH',
+                    help='render the characters listed in PATH, one per '
+                        'line with the most important first, in the '
+                        'background so that they are cached before '
+                        'they are asked for.  On the command line it '
+                        'fills the --cache-dir cache, which it needs, and '
+                        'nothing else is done, so it can\'t be given '
+                        'characters to write')
+        self._parser.add_argument('--prewarm-top', type=int, metavar='N',
+                    help='only prewarm the first N characters of the '
+                        '--prewarm list')
+        self._parser.add_argument('--prewarm-budget', type=float,
+                    metavar='SECONDS',
+                    help='stop prewarming after this many seconds')
+        # --output is spelled out so that it isn't taken as ambiguous
+        # between --output-directory and --output-layout
+        self._parser.add_argument('-o', '--output-directory', '--output',
+                    default='colorized-kanji')
+        self._parser.add_argument('--pipeline', action='store_true',
+                    help='read, render and write in separate threads so '
+                        'that disk access and rendering overlap, and '
+                        'report how long each stage waited on the others '
+                        '(default: %(default)s)')
+        self._parser.add_argument('--read-ahead', default=16, type=int,
+                    metavar='N',
+                    help='with --pipeline, how many source files to read '
+                        'ahead of rendering (default: %(default)s)')
+        self._parser.add_argument('--write-behind', default=16, type=int,
+                    metavar='N',
+                    help='with --pipeline, how many rendered diagrams can '
+                        'wait to be written (default: %(default)s)')
+        self._parser.add_argument('--stats-json', metavar='PATH',
+                    help='write statistics about the run (characters '
+                        'rendered and skipped, bytes read and written, '
+                        'timings) to PATH as JSON')
+        self._parser.add_argument('--manifest', metavar='PATH',
+                    help='write a manifest of every file written, with its '
+                        'path, size, SHA-256 and the settings fingerprint, '
+                        'to PATH; as CSV if PATH ends in .csv, otherwise '
+                        'as JSON')
+        self._parser.add_argument('--diff', nargs=2,
+                    metavar=('OLD', 'NEW'),
+                    help='instead of writing diagrams, compare two '
+                        '--manifest files and list the files that were '
+                        'added (A), changed (M) and removed (D)')
+        self._parser.add_argument('--shard', type=_parse_shard,
+                    metavar='I/N',
+                    help='split the characters into N parts that stay the '
+                        'same as characters are added, and write only '
+                        'part I (counting from 1), along with a manifest '
+                        'of what was written; for spreading a run across '
+                        'machines')
+        self._parser.add_argument('--merge-shards', nargs='+',
+                    metavar='DIR',
+                    help='instead of writing diagrams, check the shard '
+                        'manifests in these directories and combine all '
+                        'the shards into the output directory')
+        self._parser.add_argument('--color-output', default='inline',
+                    choices=['inline', 'class'],
+                    help='inline: give every stroke and stroke number its '
+                        'color in a style attribute.  class: give them '
+                        'classes (s1, s2, ...) and put the colors in a '
+                        'stylesheet, embedded in each file unless '
+                        '--stylesheet is used (default: %(default)s)')
+        self._parser.add_argument('--stylesheet', metavar='NAME',
+                    help='with --color-output class, write the colors to '
+                        'the stylesheet NAME in the output directory and '
+                        'link to it from each file, so that it is shared '
+                        'and can be changed without rewriting the '
+                        'diagrams')
+        self._parser.add_argument('--stylesheet-only', action='store_true',
+                    help='only write the --stylesheet, for changing the '
+                        'colors of diagrams that have already been '
+                        'written')
+        self._parser.add_argument('--grid', default='none', type=str,
+                    choices=['none', '2x2', '4x4', 'diag', '2x2diag', '4x4diag'],
+                    help='none: no grid is drawn. 2x2: a 2x2 grid is drawn. '
+                        '4x4: a 4x4 grid is drawn. diag: diagonals are drawn. '
+                        '2x2diag: a 2x2 grid with diagonals is drawn. '
+                        '4x4diag: a 4x4 grid with diagonals is drawn. '
+                        '(default: ' '%(default)s)')
+
+    # Public methods
+
+    def read_cl_args(self):
+        """
+        Sets the settings to what's indicated in command line arguments
+
+        >>> kc = KanjiColorizer()
+        >>> kc.settings.mode
+        'spectrum'
+        >>> sys.argv = ['this.py', '--mode', 'contrast']
+        >>> kc.read_cl_args()
+        >>> kc.settings.mode
+        'contrast'
+        """
+        self.settings = self._parser.parse_args()
+        self._check_cl_prewarm()
+        self._start_prewarm()
+
+    def read_arg_string(self, argstring):
+        """
+        >>> kc = KanjiColorizer()
+        >>> kc.settings.mode
+        'spectrum'
+        >>> kc.read_arg_string('--mode contrast')
+        >>> kc.settings.mode
+        'contrast'
+        """
+        self.settings = self._parser.parse_args(argstring.split())
+        self._start_prewarm()
+
+    def _check_cl_prewarm(self):
+        """
+        Exits with a usage error if --prewarm was given on the command
+        line with options that would be silently ignored: there it only
+        prewarms, and only the on-disk cache outlives it
+        """
+        if not self.settings.prewarm:
+            return
+        if not self.settings.cache_directory:
+            self._parser.error('--prewarm needs --cache-dir, or the '
+                               'diagrams are lost when it exits')
+        if (self.settings.characters or self.settings.characters_file or
+                self.settings.charset):
+            self._parser.error("--prewarm writes no diagrams, so it can't "
+                               'be used with --characters, '
+                               '--characters-file or --charset')
+
+    def _start_prewarm(self):
+        """
+        Starts prewarming in the background if --prewarm was given; the
+        Prewarm is kept in self.prewarming
+        """
+        if self.settings.prewarm:
+            self.prewarming = self.prewarm()
+
+    def get_colored_svg(self, character):
+        """
+        Returns a string containing a colored stroke order diagram svg
+        for character.
+
+        >>> kc = KanjiColorizer()
+        >>> svg = kc.get_colored_svg('a')
+        >>> svg.splitlines()[0]
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        >>> svg.find('00061')
+        1795
+        >>> svg.find('has been modified')
+        54
+
+        """
+        return self.renderer().render(character)
+
+    def get_colored_svg_bytes(self, character):
+        """
+        Like get_colored_svg, but returns the diagram as UTF-8 bytes,
+        ready to be written to a file without encoding it again
+
+        >>> kc = KanjiColorizer()
+        >>> kc.get_colored_svg_bytes('a').find(b'00061')
+        1795
+        """
+        return self.renderer().render_bytes(character)
+
+    def get_compound_svg(self, characters):
+        """
+        Returns a string containing one svg with colored stroke order
+        diagrams for each of characters side by side
+
+        >>> kc = KanjiColorizer('')
+        >>> kc.get_compound_svg('漢字').count('kvg:StrokePaths_')
+        2
+        """
+        return self.renderer().render_compound(characters)
+
+    def renderer(self):
+        """
+        Returns a Renderer for the current settings.  The same one is
+        returned until the settings change, so its cache is reused.
+
+        >>> kc = KanjiColorizer('')
+        >>> kc.renderer() is kc.renderer()
+        True
+        >>> r = kc.renderer()
+        >>> kc.read_arg_string('--mode contrast')
+        >>> kc.renderer() is r
+        False
+        """
+        settings = RenderSettings.from_namespace(self.settings)
+        cache_directory = self.settings.cache_directory
+        prerendered = self.settings.prerendered
+        source = self.settings.source
+        if (self._renderer is None or self._renderer.settings != settings or
+                self._renderer.cache_directory != cache_directory or
+                self._renderer.prerendered_path != prerendered or
+                self._renderer.source != source or
+                self._renderer.data_path != _data_path(source)):
+            self._renderer = Renderer(settings,
+                                      cache_directory=cache_directory,
+                                      prerendered=prerendered,
+                                      source=source)
+        return self._renderer
+
+    def prewarm(self, characters=None, top=None, budget=None,
+                background=True):
+        """
+        Fills the renderer's caches with the first top characters of a
+        ranked list (by default the --prewarm file, --prewarm-top and
+        --prewarm-budget settings), in the background unless told
+        otherwise; see kanjicolorizer.prewarm.
+
+        Returns a Prewarm that can be waited for, or with background
+        false, the number of characters rendered.
+
+        >>> kc = KanjiColorizer('')
+        >>> kc.prewarm(['a', '漢'], background=False)
+        2
+        """
+        from .prewarm import Prewarm, prewarm, read_character_list
+        if characters is None:
+            characters = read_character_list(self.settings.prewarm)
+        if top is None:
+            top = self.settings.prewarm_top
+        if budget is None:
+            budget = self.settings.prewarm_budget
+        if background:
+            return Prewarm(self.renderer(), characters, top, budget)
+        return prewarm(self.renderer(), characters, top, budget)
+
+    def write_all(self):
+        """
+        Converts all svgs (or only those specified with the --characters,
+        --characters-file or --charset options) and prints them to files
+        in the destination directory.
+
+        Characters are rendered as they are read, so a long
+        --characters-file starts producing output right away.  Invalid
+        characters and duplicates are skipped and a count of them is
+        printed to standard error.
+
+        >>> test_output_dir = os.path.join('test', 'colorized-kanji')
+        >>> kc = KanjiColorizer(' '.join(['--characters', 'aあ漢',
+        ...                               '--output', test_output_dir]))
+        >>> kc.write_all()
+
+        These should be the correct files:
+        >>> import difflib
+        >>> for file in os.listdir(test_output_dir):
+        ...     our_svg = open(
+        ...         os.path.join(test_output_dir, file),
+        ...         'r', encoding='utf-8').read()
+        ...     desired_svg = open(
+        ...         os.path.join('test', 'default_results',
+        ...             'kanji-colorize-spectrum',  file),
+        ...             'r', encoding='utf-8').read()
+        ...     for line in difflib.context_diff(our_svg.splitlines(1),
+        ...            desired_svg.splitlines(1)):
+        ...         print(line)
+        ...
+
+        Clean up doctest
+        >>> import shutil
+        >>> shutil.rmtree(test_output_dir)
+
+        """
+        self._setup_dst_dir()
+        stats = self.stats = RunStats()
+        from .layout import local_path, write_index
+        layout = self.output_layout()
+        indexed = []
+        manifest = None
+        if self.settings.shard or self.settings.manifest:
+            from .manifest import Manifest
+            manifest = Manifest(self.settings_fingerprint(),
+                                self.settings.shard)
+
+        prerendered = None
+        if self.settings.prerendered:
+            from .prerendered import open_matching
+            prerendered = open_matching(self.settings.prerendered, self)
+
+        def render(kanji):
+            start = time.perf_counter()
+            key = (kanji.character, kanji.variant)
+            if prerendered is not None and key in prerendered:
+                svg = prerendered.get(*key)
+                stats.count('prerendered_hits')
+            else:
+                svg = self._render_kanji(kanji)
+                stats.count('rendered')
+            stats.count('bytes_read', len(kanji.data))
+            return kanji, svg, time.perf_counter() - start
+
+        def write(rendered):
+            kanji, svg, render_time = rendered
+            start = time.perf_counter()
+            dst_filename = layout.path(kanji.character, kanji.variant,
+                                       self._get_dst_filename(kanji))
+            dst_file_path = local_path(self.settings.output_directory,
+                                       dst_filename)
+            if layout.sharded:
+                os.makedirs(os.path.dirname(dst_file_path), exist_ok=True)
+                indexed.append((kanji.character, kanji.variant,
+                                dst_filename))
+            with open(dst_file_path, 'wb') as f:
+                f.write(svg)
+            if manifest is not None:
+                manifest.add(dst_filename, kanji.character, kanji.variant,
+                             svg)
+            stats.count('bytes_written', len(svg))
+            stats.observe_latency(render_time + time.perf_counter() - start)
+
+        characters = self._get_characters_to_write(stats)
+        if self.settings.pipeline:
+            from . import pipeline
+            stats.stages = pipeline.run(characters, render, write,
+                                        self.settings.read_ahead,
+                                        self.settings.write_behind)
+            self._report_stages(stats.stages)
+        else:
+            for kanji in characters:
+                write(render(kanji))
+        if self.settings.stylesheet:
+            self.write_stylesheet()
+        if layout.sharded:
+            write_index(self.settings.output_directory, indexed)
+        if manifest is not None:
+            self._add_other_files(manifest, layout)
+        if self.settings.shard:
+            from .shards import manifest_filename
+            manifest.save(os.path.join(self.settings.output_directory,
+                                       manifest_filename(manifest.shard)))
+        if self.settings.manifest:
+            manifest.save(self.settings.manifest)
+        stats.stop()
+        self._report_skipped(stats)
+        if self.settings.stats_json:
+            stats.save_json(self.settings.stats_json)
+
+    def _add_other_files(self, manifest, layout):
+        """
+        Adds the files write_all writes besides the diagrams (the
+        stylesheet and the sharded layout's index) to manifest, so that
+        they are published along with the diagrams that need them
+        """
+        from .layout import INDEX_FILENAME, local_path
+        paths = []
+        if self.settings.stylesheet:
+            paths.append(self.settings.stylesheet)
+        if layout.sharded:
+            paths.append(INDEX_FILENAME)
+        for path in paths:
+            with open(local_path(self.settings.output_directory, path),
+                      'rb') as f:
+                manifest.add_file(path, f.read())
+
+    def write_stylesheet(self, stroke_counts=None):
+        """
+        Writes the --stylesheet used by --color-output class diagrams
+        to the output directory, with rules for characters with the
+        given stroke counts, or for every stroke count in the data if
+        they aren't given.  write_all does this itself, for every stroke
+        count, so that diagrams written into the same directory by other
+        runs keep their colors; calling it with only some stroke counts
+        takes the colors away from the others.
+
+        >>> import tempfile, shutil
+        >>> output = tempfile.mkdtemp()
+        >>> kc = KanjiColorizer('--color-output class --stylesheet k.css '
+        ...                     '-o ' + output)
+        >>> kc.write_stylesheet([1])
+        >>> print(open(os.path.join(output, 'k.css')).read(), end='')
+        .n1 .s1 { stroke: #bf0909; }
+        .n1 text.s1 { fill: #bf0909; stroke: none; }
+        >>> shutil.rmtree(output)
+        """
+        if stroke_counts is None:
+            from .index import get_index
+            stroke_counts = set(entry.strokes for entry in
+                                get_index(self.settings.source))
+        self._setup_dst_dir()
+        path = os.path.join(self.settings.output_directory,
+                            self.settings.stylesheet)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.stylesheet(stroke_counts))
+
+    def merge_shards(self):
+        """
+        Combines the output of write_all runs with --shard, from the
+        directories given with --merge-shards, into the output
+        directory; see kanjicolorizer.shards.merge_shards
+        """
+        from .shards import merge_shards
+        merge_shards(self.settings.merge_shards,
+                     self.settings.output_directory)
+
+    def diff_manifests(self):
+        """
+        Prints the files that differ between the two manifests given
+        with --diff, one per line after A (added), M (changed) or D
+        (removed), and returns the ManifestDiff
+
+        >>> import tempfile, shutil
+        >>> tmp = tempfile.mkdtemp()
+        >>> old, new = [os.path.join(tmp, name)
+        ...             for name in ['old.json', 'new.csv']]
+        >>> KanjiColorizer('--characters aあ -o %s --manifest %s'
+        ...                % (tmp, old)).write_all()
+        >>> KanjiColorizer('--characters a漢 -o %s --manifest %s'
+        ...                % (tmp, new)).write_all()
+        >>> _ = KanjiColorizer('--diff %s %s' % (old, new)).diff_manifests()
+        A 漢.svg
+        D あ.svg
+        >>> shutil.rmtree(tmp)
+        """
+        from .manifest import Manifest
+        old, new = [Manifest.load(path) for path in self.settings.diff]
+        diff = old.diff(new)
+        for status, paths in zip('AMD', diff):
+            for path in paths:
+                print(status, path)
+        return diff
+
+    def _get_characters_to_write(self, stats):
+        """
+        Yields KanjiVG objects for everything write_all should write:
+        all of the data if no characters were given, otherwise each
+        valid character from --characters, then --characters-file, then
+        --charset.  Duplicates and invalid characters are counted in
+        stats instead.
+
+        >>> kc = KanjiColorizer('--characters 漢aЛ漢')
+        >>> stats = RunStats()
+        >>> [k.character for k in kc._get_characters_to_write(stats)]
+        ['漢', 'a']
+        >>> stats.skipped, stats.invalid_characters
+        (1, [('Л', '')])
+        """
+        include = self._shard_filter()
+        if not (self.settings.characters or self.settings.characters_file or
+                self.settings.charset):
+            for kanji in KanjiVG.iter_all(include, self.settings.source):
+                yield kanji
+            return
+        seen = set()
+        for character, variant in self._get_character_tokens(stats):
+            if include is not None and not include(character, variant):
+                continue
+            if (character, variant) in seen:
+                stats.count('skipped')
+                continue
+            seen.add((character, variant))
+            try:
+                kanji = KanjiVG(character, variant, self.settings.source)
+            except InvalidCharacterError:
+                stats.add_invalid(character, variant)
+                continue
+            yield kanji
+
+    def _shard_filter(self):
+        """
+        Returns a function telling whether a (character, variant) pair
+        belongs to the --shard being written, or None if all of them do
+
+        >>> kc = KanjiColorizer('--shard 1/4')
+        >>> include = kc._shard_filter()
+        >>> include('漢', ''), include('a', '')
+        (True, False)
+        >>> KanjiColorizer('')._shard_filter() is None
+        True
+        """
+        if not self.settings.shard:
+            return None
+        from .shards import shard_of
+        shard, count = self.settings.shard
+        return lambda character, variant: (
+            shard_of(character, variant, count) == shard)
+
+    def _get_character_tokens(self, stats=None):
+        """
+        Yields (character, variant) pairs from the --characters,
+        --characters-file and --charset settings, reading the file a
+        line at a time.  Characters of a --charset that there is no
+        data for aren't yielded, but are counted in stats if it is
+        given.
+
+        >>> from kanjicolorizer.tests.synthetic import SyntheticCorpus
+        >>> stats = RunStats()
+        >>> with SyntheticCorpus():
+        ...     kc = KanjiColorizer('--characters 漢 --charset grade1')
+        ...     tokens = list(kc._get_character_tokens(stats))
+        >>> tokens
+        [('漢', ''), ('休', ''), ('字', ''), ('木', '')]
+        >>> stats.invalid
+        77
+        """
+        if self.settings.characters:
+            for token in _split_characters(self.settings.characters):
+                yield token
+        characters_file = self.settings.characters_file
+        if characters_file:
+            if characters_file == '-':
+                lines = sys.stdin
+            else:
+                lines = open(characters_file, 'r', encoding='utf-8')
+            try:
+                for line in lines:
+                    for token in _split_characters(line.strip()):
+                        yield token
+            finally:
+                if lines is not sys.stdin:
+                    lines.close()
+        if self.settings.charset:
+            from .charsets import resolve
+            from .index import get_index
+            available, missing = resolve(self.settings.charset,
+                                         get_index(self.settings.source))
+            if stats is not None:
+                for character in missing:
+                    stats.add_invalid(character, '')
+            for token in available:
+                yield token
+
+    def _report_stages(self, stages):
+        """
+        Prints how long each --pipeline stage worked and waited to
+        standard error
+        """
+        for stage in stages:
+            print('%-9s %6d items, busy %.2fs, stalled %.2fs'
+                  % (stage.name, stage.items, stage.busy, stage.stall),
+                  file=sys.stderr)
+
+    def _report_skipped(self, stats):
+        """
+        Prints a summary of skipped characters to standard error, if
+        there were any
+        """
+        if stats.skipped:
+            print('skipped %d duplicate character(s)' % stats.skipped,
+                  file=sys.stderr)
+        if stats.invalid:
+            invalid = stats.invalid_characters
+            examples = ', '.join(
+                '-'.join(filter(None, key)) or repr('') for key in invalid[:10])
+            if stats.invalid > 10:
+                examples += ', ...'
+            print('skipped %d invalid character(s): %s'
+                  % (stats.invalid, examples), file=sys.stderr)
+
+    # Private methods for working with files and directories
+
+    def _setup_dst_dir(self):
+        """
+        Creates the destination directory args.output_directory if
+        necessary
+
+        (Set up the doctest environment)
+        >>> current_directory = os.path.abspath(os.path.curdir)
+        >>> os.mkdir(os.path.join('test', 'doctest-tmp'))
+        >>> os.chdir(os.path.join('test', 'doctest-tmp'))
+        >>> kc = KanjiColorizer('')
+
+        This creates the directory
+        >>> kc._setup_dst_dir()
+        >>> os.listdir(os.path.curdir)
+        ['colorized-kanji']
+
+        But doesn't do anything or throw an error if it already exists
+        >>> kc._setup_dst_dir()
+        >>> os.listdir(os.path.curdir)
+        ['colorized-kanji']
+
+        (done; reseting environment for other doctests)
+        >>> os.rmdir(kc.settings.output_directory)
+        >>> os.chdir(os.path.pardir)
+        >>> os.rmdir('doctest-tmp')
+        >>> os.chdir(current_directory)
+        """
+        if not (os.path.exists(self.settings.output_directory)):
+            os.mkdir(self.settings.output_directory)
+
+    def _get_dst_filename(self, kanji):
+        """
+        Return the correct filename, based on args.filename-mode
+
+        >>> kc = KanjiColorizer('--filename-mode code')
+        >>> kc._get_dst_filename(KanjiVG('a'))
+        '00061.svg'
+        >>> kc = KanjiColorizer('--filename-mode character')
+        >>> kc._get_dst_filename(KanjiVG('a'))
+        'a.svg'
+
+        """
+        if (self.settings.filename_mode == 'character'):
+            return kanji.character_filename
+        else:
+            return kanji.ascii_filename
+
+    def output_layout(self):
+        """
+        Returns the OutputLayout for the --output-layout options
+
+        >>> kc = KanjiColorizer('--output-layout sharded '
+        ...                     '--layout-key codepoint')
+        >>> kc.output_layout().path('漢', '', '漢.svg')
+        '6f/漢.svg'
+        """
+        from .layout import OutputLayout
+        return OutputLayout.from_settings(self.settings)
+
+    def _stylesheet_href(self):
+        """
+        The --stylesheet as seen from the directory a diagram is in
+
+        >>> kc = KanjiColorizer('--stylesheet k.css --output-layout '
+        ...                     'sharded --depth 2')
+        >>> kc._stylesheet_href()
+        '../../k.css'
+        """
+        href = self.settings.stylesheet
+        if href and self.settings.output_layout == 'sharded':
+            href = '../' * self.settings.depth + href
+        return href
+
+
+class RenderSettings(collections.namedtuple(
+        'RenderSettings', _SVGModifier._rendering_settings)):
+    """
+    The settings that affect how diagrams look, as an immutable tuple;
+    defaults are the same as KanjiColorizer's
+
+    >>> RenderSettings(mode='contrast')
+    RenderSettings(mode='contrast', saturation=0.95, value=0.75, image_size=327, grid='none', group_mode=False, color_output='inline', stylesheet=None)
+    """
+    __slots__ = ()
+
+    def __new__(cls, mode='spectrum', saturation=0.95, value=0.75,
+                image_size=327, grid='none', group_mode=False,
+                color_output='inline', stylesheet=None):
+        return super(RenderSettings, cls).__new__(
+            cls, mode, saturation, value, image_size, grid, group_mode,
+            color_output, stylesheet)
+
+    @classmethod
+    def from_namespace(cls, namespace):
+        """
+        Takes the rendering settings from KanjiColorizer settings
+
+        >>> kc = KanjiColorizer('--image-size 100')
+        >>> RenderSettings.from_namespace(kc.settings).image_size
+        100
+        """
+        return cls(*[getattr(namespace, name) for name in cls._fields])
+
+
+class Renderer(_SVGModifier):
+    """
+    Renders colored stroke order diagrams with fixed settings.
+
+    A Renderer can't be changed once it is created, so one instance can
+    be shared by any number of threads.  Rendered diagrams are kept in
+    a cache of up to cache_size entries, and when several threads ask
+    for the same diagram at once only one of them renders it while the
+    others wait for its result.  Statistics about everything it has
+    done are kept in self.stats (see kanjicolorizer.stats).
+
+    >>> renderer = Renderer(RenderSettings(mode='contrast'))
+    >>> renderer.settings.mode
+    'contrast'
+    >>> svg = renderer.render_bytes('a')
+    >>> renderer.render_bytes('a') is svg
+    True
+
+    Diagrams are rendered and cached as UTF-8 bytes, which is what gets
+    written to files; render decodes them for callers that want a string.
+
+    If cache_directory is given, diagrams are also kept there, in a
+    subdirectory for the settings and data, so that they survive
+    restarts.
+
+    source is a directory or kanjivg.xml file to read KanjiVG data from
+    (see use_source); without it, the data the process was using when
+    the Renderer was made is read, which is data_path.  Diagrams from
+    different data are never cached together.
+
+    prerendered is the path of a store of diagrams made ahead of time
+    (see kanjicolorizer.prerendered); diagrams in it are copied from it
+    instead of being rendered, unless it was made with other settings,
+    in which case it isn't used at all.
+    """
+
+    def __init__(self, settings=None, cache_size=1024, cache_directory=None,
+                 prerendered=None, source=None):
+        self._settings = settings or RenderSettings()
+        self._cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self.source = source
+        self.data_path = _data_path(source)
+        self._disk_cache = None
+        if cache_directory:
+            self._disk_cache = os.path.join(cache_directory,
+                                            self._disk_cache_name())
+        self.prerendered_path = prerendered
+        self._prerendered = None
+        if prerendered:
+            from .prerendered import open_matching
+            self._prerendered = open_matching(prerendered, self)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = RunStats()
+
+    @property
+    def settings(self):
+        return self._settings
+
+    @property
+    def cache_directory(self):
+        if self._disk_cache is None:
+            return None
+        return os.path.dirname(self._disk_cache)
+
+    def render(self, character, variant=''):
+        """
+        Returns a string containing the colored svg for character (and
+        variant, if given)
+
+        Raises InvalidCharacterError if there is no data for it
+        """
+        return self.render_bytes(character, variant).decode('utf-8')
+
+    def render_bytes(self, character, variant=''):
+        """
+        Like render, but returns the svg as UTF-8 bytes; the same bytes
+        object each time while it stays in the cache
+        """
+        key = (character, variant or '')
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats.count('cache_hits')
+                return self._cache[key]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+        if not leader:
+            self.stats.count('coalesced')
+            return call.wait()
+        self.stats.count('cache_misses')
+        start = time.perf_counter()
+        try:
+            call.result = self._read_prerendered(key)
+            if call.result is None:
+                call.result = self._read_disk_cache(key)
+            if call.result is None:
+                kanji = KanjiVG(*key, source=self.source)
+                call.result = self._render_kanji(kanji)
+                self.stats.count('bytes_read', len(kanji.data))
+                self.stats.count('rendered')
+                self._write_disk_cache(key, call.result)
+            self.stats.observe_latency(time.perf_counter() - start)
+        except InvalidCharacterError as e:
+            self.stats.add_invalid(*key)
+            call.error = e
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None:
+                    self._store(key, call.result)
+            call.done.set()
+        return call.result
+
+    def render_compound(self, characters):
+        """
+        Returns a string containing one svg with the diagrams for all of
+        characters side by side, as for a whole word; see
+        render_compound_bytes
+        """
+        return self.render_compound_bytes(characters).decode('utf-8')
+
+    def render_compound_bytes(self, characters):
+        """
+        Like render_compound, but returns UTF-8 bytes.  characters can
+        be a string or a sequence of characters or (character, variant)
+        pairs.  Each diagram comes from the cache if it is there and is
+        cached if not; the composed svg itself isn't cached.
+
+        >>> renderer = Renderer(RenderSettings(image_size=100))
+        >>> svg = renderer.render_compound_bytes('漢字')
+        >>> svg.count(b'<svg ')
+        3
+        >>> b'viewBox="0 0 200 100"' in svg
+        True
+
+        Raises InvalidCharacterError if there is no data for any of the
+        characters, or if there are none
+        """
+        keys = [_as_key(key) for key in characters]
+        if not keys:
+            raise InvalidCharacterError('', '')
+        return self._compose_svgs([self.render_bytes(*key) for key in keys])
+
+    def _disk_cache_name(self):
+        """
+        The name of the subdirectory of the cache directory for these
+        settings and data; just the settings fingerprint for the bundled
+        data
+
+        >>> default = Renderer()._disk_cache_name()
+        >>> default == Renderer().settings_fingerprint()
+        True
+        >>> Renderer(source=__file__)._disk_cache_name().startswith(default)
+        True
+        >>> Renderer(source=__file__)._disk_cache_name() == default
+        False
+        """
+        import hashlib
+        name = self.settings_fingerprint()
+        data_path = os.path.abspath(self.data_path)
+        if data_path != os.path.abspath(_bundled_directory):
+            digest = hashlib.sha1(data_path.encode('utf-8'))
+            name += '-' + digest.hexdigest()[:8]
+        return name
+
+    def _read_prerendered(self, key):
+        """
+        Returns the diagram for key from the prerendered store, or None
+        if it isn't there (or no store is being used)
+        """
+        if self._prerendered is None or key not in self._prerendered:
+            return None
+        svg = self._prerendered.get(*key)
+        self.stats.count('prerendered_hits')
+        return svg
+
+    def _disk_cache_path(self, key):
+        """
+        Where the diagram for key is kept in the on-disk cache
+
+        Raises InvalidCharacterError for keys that can't be a KanjiVG
+        character and variant (which KanjiVG would also reject), so
+        that they don't make a path outside the cache
+
+        >>> renderer = Renderer(cache_directory='cache')
+        >>> os.path.basename(renderer._disk_cache_path(('字', 'Kaisho')))
+        '05b57-Kaisho.svg'
+        >>> renderer._disk_cache_path(('ab', ''))
+        Traceback (most recent call last):
+            ...
+        kanjicolorizer.colorizer.InvalidCharacterError: ('ab', '')
+        >>> renderer._disk_cache_path(('a', '../x'))
+        Traceback (most recent call last):
+            ...
+        kanjicolorizer.colorizer.InvalidCharacterError: ('a', '../x')
+        """
+        character, variant = key
+        if len(character) != 1 or not _variant_re.match(variant):
+            raise InvalidCharacterError(character, variant)
+        code = '%05x' % ord(character)
+        if variant:
+            code += '-' + variant
+        return os.path.join(self._disk_cache, code + '.svg')
+
+    def _read_disk_cache(self, key):
+        """
+        Returns the diagram for key from the on-disk cache, or None if
+        it isn't there (or there is no on-disk cache)
+        """
+        if self._disk_cache is None:
+            return None
+        try:
+            with open(self._disk_cache_path(key), 'rb') as f:
+                svg = f.read()
+        except IOError:
+            return None
+        self.stats.count('disk_cache_hits')
+        return svg
+
+    def _write_disk_cache(self, key, svg):
+        """
+        Saves a rendered diagram in the on-disk cache, if there is one;
+        written under a temporary name first so that other processes
+        never see part of a file
+        """
+        if self._disk_cache is None:
+            return
+        os.makedirs(self._disk_cache, exist_ok=True)
+        path = self._disk_cache_path(key)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(),
+                                     threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(svg)
+        os.replace(tmp_path, path)
+
+    def _store(self, key, svg):
+        """
+        Adds svg to the cache, dropping the least recently used entry if
+        it is full; called with self._lock held
+        """
+        if self._cache_size <= 0:
+            return
+        self._cache[key] = svg
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+
+_variant_re = re.compile(r'^\w*$', re.ASCII)
+
+
+class _Call(object):
+    """
+    A render in progress that other threads can wait for
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
 # Exceptions
 
 class Error(Exception):
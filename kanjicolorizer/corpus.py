@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# corpus.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Keeping all of the KanjiVG data in memory, compactly, for long-running
+processes that would rather not read files for every character.
+
+Every KanjiVG file starts with the same prolog (the XML declaration,
+the license comment and the DOCTYPE), which is about a third of it, so
+each distinct prolog is kept once.  The rest of each file is kept as
+UTF-8 in one shared buffer (as a str it would take two bytes a
+character, since the kvg:element attributes aren't ASCII), and each
+character only has a small record of where its data is.
+'''
+
+import sys
+
+from .colorizer import InvalidCharacterError, KanjiVG
+
+
+class _Entry(object):
+    '''
+    Where one character's data is: the index of its prolog and the
+    start and end of the rest in the buffer
+    '''
+    __slots__ = ('prolog', 'start', 'end')
+
+    def __init__(self, prolog, start, end):
+        self.prolog = prolog
+        self.start = start
+        self.end = end
+
+
+class ResidentCorpus(object):
+    '''
+    The KanjiVG data for everything in kanji (KanjiVG objects; all of
+    the data there is if not given), held in memory
+
+    >>> corpus = ResidentCorpus()
+    >>> corpus.get_data('漢') == KanjiVG('漢').data
+    True
+    >>> ('漢', '') in corpus
+    True
+    >>> corpus.get_svg('Л')
+    Traceback (most recent call last):
+        ...
+    kanjicolorizer.colorizer.InvalidCharacterError: ('\\u041b', '')
+    '''
+
+    def __init__(self, kanji=None):
+        if kanji is None:
+            kanji = KanjiVG.iter_all()
+        self._prologs = []
+        prolog_indexes = {}
+        self._entries = {}
+        self._buffer = bytearray()
+        for k in kanji:
+            data = k.data
+            split = max(data.find(b'<svg '), 0)
+            prolog = data[:split]
+            if prolog not in prolog_indexes:
+                prolog_indexes[prolog] = len(self._prologs)
+                self._prologs.append(prolog)
+            start = len(self._buffer)
+            self._buffer += memoryview(data)[split:]
+            self._entries[(k.character, k.variant)] = _Entry(
+                prolog_indexes[prolog], start, len(self._buffer))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        '''
+        The (character, variant) pairs there is data for
+        '''
+        return self._entries.keys()
+
+    def get_data(self, character, variant=''):
+        '''
+        Returns the data for character and variant as UTF-8 bytes, the
+        same as the file it came from
+
+        Raises InvalidCharacterError if there is no data for them
+        '''
+        try:
+            entry = self._entries[(character, variant or '')]
+        except KeyError:
+            raise InvalidCharacterError(character, variant) from None
+        return (self._prologs[entry.prolog] +
+                self._buffer[entry.start:entry.end])
+
+    def get_svg(self, character, variant=''):
+        '''
+        Like get_data, but returns a string
+        '''
+        return self.get_data(character, variant).decode('utf-8')
+
+    def memory_usage(self):
+        '''
+        Roughly how many bytes the corpus takes up
+
+        >>> corpus = ResidentCorpus()
+        >>> corpus.memory_usage() > len(corpus._buffer)
+        True
+        '''
+        total = sys.getsizeof(self._buffer) + sys.getsizeof(self._entries)
+        total += sum(sys.getsizeof(prolog) for prolog in self._prologs)
+        total += sys.getsizeof(self._prologs)
+        for (character, variant), entry in self._entries.items():
+            total += (sys.getsizeof((character, variant)) +
+                      sys.getsizeof(character) + sys.getsizeof(variant) +
+                      sys.getsizeof(entry) + sys.getsizeof(entry.start) +
+                      sys.getsizeof(entry.end))
+        return total
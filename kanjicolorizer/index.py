@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# index.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+A precomputed index of KanjiVG metadata (stroke counts, components,
+variants) so that sets of characters can be chosen without reading
+every SVG.
+
+The index is stored as JSON next to the KanjiVG data.  It is created
+by the build (see pavement.py), or the first time it is needed if it
+is missing, and records a stamp of the data it was built from (which
+files there are) so that it is rebuilt when KanjiVG characters are
+added or removed.  Changes to the files themselves aren't noticed; the
+build makes a new index whenever it packages the data.
+'''
+
+import collections
+import hashlib
+import json
+import os
+import re
+
+from . import colorizer
+
+INDEX_VERSION = 2
+
+index_path = os.path.join(os.path.dirname(__file__),
+                          'data', 'kanjivg-index.json')
+
+_bundled_directory = colorizer.source_directory
+
+IndexEntry = collections.namedtuple(
+    'IndexEntry', ['character', 'variant', 'strokes', 'components',
+                   'elements'])
+
+_group_re = re.compile(r'<g\b([^>]*)>|</g>')
+_element_re = re.compile(r'kvg:element="([^"]*)"')
+_filename_re = re.compile('^([0-9a-f]+)-?(.*?).svg$')
+
+
+def read_metadata(svg):
+    '''
+    Returns a (strokes, components, elements) tuple for a KanjiVG svg.
+
+    components are the outermost named groups inside the character;
+    elements are all the named groups it contains.
+
+    >>> svg = """<svg>
+    ... <g id="kvg:StrokePaths_05b57">
+    ... <g id="kvg:05b57" kvg:element="字">
+    ...     <g id="kvg:05b57-g1" kvg:element="宀">
+    ...         <path /><path /><path />
+    ...     </g>
+    ...     <g id="kvg:05b57-g2">
+    ...         <g id="kvg:05b57-g3" kvg:element="子">
+    ...             <g id="kvg:05b57-g4" kvg:element="一">
+    ...                 <path />
+    ...             </g>
+    ...             <path /><path />
+    ...         </g>
+    ...     </g>
+    ... </g>
+    ... </g>
+    ... </svg>"""
+    >>> read_metadata(svg)
+    (6, ['宀', '子'], ['宀', '子', '一'])
+    '''
+    strokes = len(re.findall('<path ', svg))
+    components = []
+    elements = []
+    depth = 0
+    component_depth = None
+    for m in _group_re.finditer(svg):
+        if m.group(1) is None:  # </g>
+            if depth == component_depth:
+                component_depth = None
+            depth -= 1
+            continue
+        depth += 1
+        element = _element_re.search(m.group(1))
+        # depth 1 is the StrokePaths group and 2 is the character itself
+        if depth < 3 or element is None:
+            continue
+        element = element.group(1)
+        if element not in elements:
+            elements.append(element)
+        if component_depth is None:
+            components.append(element)
+            component_depth = depth
+    return strokes, components, elements
+
+
+class KanjiVGIndex(object):
+    '''
+    Metadata for every character (and variant) in the KanjiVG data
+
+    >>> index = KanjiVGIndex([
+    ...     IndexEntry('字', '', 6, ['宀', '子'], ['宀', '子']),
+    ...     IndexEntry('字', 'Kaisho', 6, ['宀', '子'], ['宀', '子']),
+    ...     IndexEntry('子', '', 3, [], [])])
+    >>> index.with_stroke_count(6)
+    [('字', ''), ('字', 'Kaisho')]
+    >>> index.containing_element('子')
+    [('字', ''), ('字', 'Kaisho')]
+    >>> index.variants('字')
+    ['Kaisho']
+    >>> index.get('子').strokes
+    3
+    '''
+
+    def __init__(self, entries=(), stamp=None):
+        self.stamp = stamp
+        self._entries = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        self._entries[(entry.character, entry.variant)] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        '''
+        Iterates over entries in codepoint order, with each character
+        before its variants
+        '''
+        for key in sorted(self._entries, key=_sort_key):
+            yield self._entries[key]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, character, variant=''):
+        '''
+        Returns the IndexEntry for character and variant
+
+        Raises InvalidCharacterError if there isn't one
+        '''
+        try:
+            return self._entries[(character, variant or '')]
+        except KeyError:
+            raise colorizer.InvalidCharacterError(character, variant)
+
+    def keys(self):
+        return [(e.character, e.variant) for e in self]
+
+    def variants(self, character):
+        '''
+        Returns the names of the variants there is data for; the plain
+        form of a character isn't counted as a variant
+        '''
+        return [e.variant for e in self
+                if e.character == character and e.variant]
+
+    def with_stroke_count(self, count):
+        return [(e.character, e.variant) for e in self if e.strokes == count]
+
+    def containing_element(self, element):
+        return [(e.character, e.variant) for e in self
+                if element in e.elements]
+
+    # Reading and writing
+
+    def to_json(self):
+        kanji = collections.OrderedDict()
+        for e in self:
+            kanji[_code(e.character, e.variant)] = {
+                'strokes': e.strokes,
+                'components': e.components,
+                'elements': e.elements}
+        return {'version': INDEX_VERSION, 'stamp': self.stamp,
+                'kanji': kanji}
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError('unsupported index version: %r'
+                             % data.get('version'))
+        index = cls(stamp=data.get('stamp'))
+        for code, fields in data['kanji'].items():
+            character, variant = _parse_code(code)
+            index.add(IndexEntry(character, variant, fields['strokes'],
+                                 fields['components'], fields['elements']))
+        return index
+
+    def save(self, path=None):
+        '''
+        Writes the index to path (index_path if not given), under a
+        temporary name first so that other processes never read part
+        of it
+        '''
+        path = path or index_path
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=0)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None):
+        with open(path or index_path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+
+def build_index(directory=None):
+    '''
+    Reads every SVG in directory (by default the KanjiVG data) and
+    returns a KanjiVGIndex
+    '''
+    if directory is None and colorizer.source_file:
+        return _build_xml_index(colorizer.source_file)
+    directory = directory or colorizer.source_directory
+    index = KanjiVGIndex(stamp=data_stamp(directory))
+    for filename in os.listdir(directory):
+        m = _filename_re.match(filename)
+        if not m:
+            continue
+        with open(os.path.join(directory, filename),
+                  'r', encoding='utf-8') as f:
+            strokes, components, elements = read_metadata(f.read())
+        character, variant = _parse_code(filename[:-len('.svg')])
+        index.add(IndexEntry(character, variant, strokes, components,
+                             elements))
+    return index
+
+
+def data_stamp(directory):
+    '''
+    Identifies the KanjiVG files in directory from the directory listing
+    alone, without reading or even statting them: [number of files, a
+    hash of their names].  Unlike modification times, this survives
+    being packaged and installed.
+    '''
+    names = sorted(name for name in os.listdir(directory)
+                   if _filename_re.match(name))
+    digest = hashlib.sha1('\n'.join(names).encode('utf-8'))
+    return [len(names), digest.hexdigest()[:16]]
+
+
+def _build_xml_index(path):
+    '''
+    Like build_index, for a kanjivg.xml file
+    '''
+    from .xmlsource import get_source
+    index = KanjiVGIndex()
+    for character, variant, svg in get_source(path):
+        strokes, components, elements = read_metadata(svg)
+        index.add(IndexEntry(character, variant, strokes, components,
+                             elements))
+    return index
+
+
+_indexes = {}
+
+
+def get_index(source=None):
+    '''
+    Returns the index for the KanjiVG data in source (a directory or
+    kanjivg.xml file, by default the one set with use_source), kept for
+    the life of the process.  For the bundled data it is loaded from
+    index_path if that was built from the data as it is now, and
+    otherwise built and saved there (if it can be) for next time; for
+    other data it is built.
+    '''
+    directory, file, corpus = colorizer._source_paths(source)
+    if file:
+        if file not in _indexes:
+            _indexes[file] = _build_xml_index(file)
+        return _indexes[file]
+    if directory not in _indexes:
+        if directory == _bundled_directory:
+            _indexes[directory] = _load_or_build(directory)
+        else:
+            _indexes[directory] = build_index(directory)
+    return _indexes[directory]
+
+
+def _load_or_build(directory):
+    '''
+    The saved index for directory if it is up to date, otherwise a new
+    one, which is saved
+    '''
+    try:
+        saved = KanjiVGIndex.load(index_path)
+    except (IOError, ValueError, KeyError, TypeError):
+        saved = None
+    if saved is not None and saved.stamp == data_stamp(directory):
+        return saved
+    index = build_index(directory)
+    try:
+        index.save(index_path)
+    except IOError:
+        pass  # a read-only installation; build it again next time
+    return index
+
+
+def _code(character, variant):
+    '''
+    >>> _code('字', 'Kaisho')
+    '05b57-Kaisho'
+    '''
+    code = '%05x' % ord(character)
+    return code + '-' + variant if variant else code
+
+
+def _parse_code(code):
+    '''
+    >>> _parse_code('05b57-Kaisho')
+    ('字', 'Kaisho')
+    >>> _parse_code('00061')
+    ('a', '')
+    '''
+    hex_code, _, variant = code.partition('-')
+    return chr(int(hex_code, 16)), variant
+
+
+def _sort_key(key):
+    character, variant = key
+    return (ord(character), variant)
+
+
+if __name__ == "__main__":
+    build_index().save()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# layout.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Where write_all puts each file in the output directory: either all in
+the directory itself (flat) or spread over subdirectories (sharded),
+so that no one directory has to hold thousands of files.  With the
+sharded layout an index file maps each character to its path.
+'''
+
+import collections
+import hashlib
+import json
+import os
+
+INDEX_FILENAME = 'index.json'
+
+
+class OutputLayout(object):
+    '''
+    Places files in the output directory.  Paths are relative to it
+    and always use / as the separator.
+
+    >>> OutputLayout().path('漢', '', '漢.svg')
+    '漢.svg'
+
+    The sharded layout puts files depth subdirectories down, with
+    fan_out possible subdirectories at each level, chosen either by a
+    hash of the character and variant (which spreads them evenly) or
+    by the character's codepoint (which keeps neighboring characters
+    together):
+
+    >>> OutputLayout('sharded', 'codepoint', 256, 1).path(
+    ...     '漢', '', '06f22.svg')
+    '6f/06f22.svg'
+    >>> OutputLayout('sharded', 'codepoint', 16, 2).path(
+    ...     '漢', '', '漢.svg')
+    'f/2/漢.svg'
+    >>> OutputLayout('sharded', 'hash', 256, 2).path('漢', '', '漢.svg')
+    'c5/a5/漢.svg'
+    '''
+
+    def __init__(self, kind='flat', key='hash', fan_out=256, depth=1):
+        if kind not in ('flat', 'sharded'):
+            raise ValueError('unknown output layout: %r' % kind)
+        if key not in ('hash', 'codepoint'):
+            raise ValueError('unknown layout key: %r' % key)
+        if fan_out < 2 or depth < 1:
+            raise ValueError('fan-out must be at least 2 and depth at '
+                             'least 1')
+        self.kind = kind
+        self.key = key
+        self.fan_out = fan_out
+        self.depth = depth
+        self._width = len('%x' % (fan_out - 1))
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.output_layout, settings.layout_key,
+                   settings.fan_out, settings.depth)
+
+    @property
+    def sharded(self):
+        return self.kind == 'sharded'
+
+    def directories(self, character, variant):
+        '''
+        The subdirectories, outermost first, that the file for
+        character and variant goes in
+
+        >>> OutputLayout('sharded', 'codepoint', 256, 2).directories(
+        ...     '漢', '')
+        ['00', '6f']
+        '''
+        if not self.sharded:
+            return []
+        if self.key == 'codepoint':
+            number = ord(character) // self.fan_out
+        else:
+            key = character + '-' + variant if variant else character
+            number = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16)
+        levels = []
+        for level in range(self.depth):
+            levels.append('%0*x' % (self._width, number % self.fan_out))
+            number //= self.fan_out
+        if self.key == 'codepoint':
+            levels.reverse()
+        return levels
+
+    def path(self, character, variant, filename):
+        return '/'.join(self.directories(character, variant) + [filename])
+
+
+def local_path(directory, path):
+    '''
+    Turns a path from a layout or manifest into one for this system,
+    inside directory
+    '''
+    return os.path.join(directory, *path.split('/'))
+
+
+def write_index(directory, files):
+    '''
+    Writes the index for a sharded layout to directory: a JSON object
+    mapping each character (followed by -variant for variants) to its
+    path.  files is a sequence of (character, variant, path).
+    '''
+    index = collections.OrderedDict(
+        (character + '-' + variant if variant else character, path)
+        for character, variant, path in sorted(files))
+    with open(os.path.join(directory, INDEX_FILENAME), 'w',
+              encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=0)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# manifest.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Manifests list the files a run of write_all produced, with enough
+information (size and SHA-256) to check them later, or to find out
+which files changed between two runs.
+'''
+
+import collections
+import csv
+import hashlib
+import json
+import os
+
+from .colorizer import Error
+
+MANIFEST_VERSION = 1
+
+CSV_FIELDS = ('path', 'character', 'variant', 'size', 'sha256',
+              'fingerprint')
+
+ManifestDiff = collections.namedtuple('ManifestDiff',
+                                      'added changed removed')
+
+
+class Manifest(object):
+    '''
+    The files written by one run, keyed by path relative to the output
+    directory
+
+    >>> m = Manifest('0123456789abcdef')
+    >>> m.add('a.svg', 'a', '', b'<svg/>')
+    >>> m.files['a.svg']['size']
+    6
+    >>> Manifest.from_json(m.to_json()).files == m.files
+    True
+    '''
+
+    def __init__(self, fingerprint, shard=None, files=None):
+        self.fingerprint = fingerprint
+        self.shard = tuple(shard) if shard else None
+        self.files = files if files is not None else {}
+
+    def add(self, path, character, variant, data):
+        '''
+        Records the file at path (relative to the output directory) as
+        containing data, the diagram for character and variant
+        '''
+        self.files[path] = {
+            'character': character,
+            'variant': variant,
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest()}
+
+    def add_file(self, path, data):
+        '''
+        Records a file that isn't a diagram, like the stylesheet or the
+        index of a sharded layout; its character and variant are empty
+
+        >>> m = Manifest('0123456789abcdef')
+        >>> m.add_file('k.css', b'.s1 {}')
+        >>> m.is_diagram('k.css')
+        False
+        '''
+        self.add(path, '', '', data)
+
+    def is_diagram(self, path):
+        '''
+        Whether the file at path is a diagram rather than one added
+        with add_file
+        '''
+        return bool(self.files[path]['character'])
+
+    def verify(self, directory):
+        '''
+        Raises ManifestError if any file in the manifest is missing from
+        directory or doesn't match its recorded size and hash
+        '''
+        for path, entry in self.files.items():
+            full_path = os.path.join(directory, path)
+            try:
+                with open(full_path, 'rb') as f:
+                    data = f.read()
+            except IOError as e:
+                raise ManifestError('missing file: %s' % full_path) from e
+            if (len(data) != entry['size'] or
+                    hashlib.sha256(data).hexdigest() != entry['sha256']):
+                raise ManifestError('file does not match manifest: %s'
+                                    % full_path)
+
+    def to_json(self):
+        return collections.OrderedDict([
+            ('version', MANIFEST_VERSION),
+            ('fingerprint', self.fingerprint),
+            ('shard', list(self.shard) if self.shard else None),
+            ('files', collections.OrderedDict(sorted(self.files.items())))])
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get('version') != MANIFEST_VERSION:
+            raise ManifestError('unsupported manifest version: %r'
+                                % data.get('version'))
+        return cls(data['fingerprint'], data.get('shard'), data['files'])
+
+    def diff(self, new):
+        '''
+        Compares this manifest with a newer one, returning the paths
+        that were added, whose contents changed, and that were removed,
+        each sorted.  Files are compared by size and hash only, so a
+        file that came out the same is unchanged even if the settings
+        fingerprint is different.
+
+        >>> old = Manifest('0123456789abcdef')
+        >>> old.add('a.svg', 'a', '', b'<svg/>')
+        >>> old.add('b.svg', 'b', '', b'<svg/>')
+        >>> new = Manifest('fedcba9876543210')
+        >>> new.add('a.svg', 'a', '', b'<svg />')
+        >>> new.add('c.svg', 'c', '', b'<svg/>')
+        >>> old.diff(new)
+        ManifestDiff(added=['c.svg'], changed=['a.svg'], removed=['b.svg'])
+        '''
+        added = sorted(set(new.files) - set(self.files))
+        removed = sorted(set(self.files) - set(new.files))
+        changed = sorted(
+            path for path in set(self.files) & set(new.files)
+            if (self.files[path]['size'], self.files[path]['sha256']) !=
+               (new.files[path]['size'], new.files[path]['sha256']))
+        return ManifestDiff(added, changed, removed)
+
+    def save(self, path):
+        '''
+        Writes the manifest to path, as CSV if path ends in .csv and
+        as JSON otherwise.  A CSV manifest has one row per file, with
+        the fingerprint repeated on every row.
+        '''
+        if path.endswith('.csv'):
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_FIELDS)
+                for name, entry in sorted(self.files.items()):
+                    writer.writerow([name, entry['character'],
+                                     entry['variant'], entry['size'],
+                                     entry['sha256'], self.fingerprint])
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            try:
+                if path.endswith('.csv'):
+                    return cls._from_csv(f)
+                return cls.from_json(json.load(f))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ManifestError('not a valid manifest: %s' % path) from e
+
+    @classmethod
+    def _from_csv(cls, f):
+        reader = csv.DictReader(f)
+        if tuple(reader.fieldnames or ()) != CSV_FIELDS:
+            raise ValueError('wrong columns')
+        fingerprints = set()
+        files = {}
+        for row in reader:
+            fingerprints.add(row['fingerprint'])
+            files[row['path']] = {
+                'character': row['character'],
+                'variant': row['variant'],
+                'size': int(row['size']),
+                'sha256': row['sha256']}
+        if len(fingerprints) > 1:
+            raise ValueError('more than one fingerprint')
+        return cls(fingerprints.pop() if fingerprints else None, None, files)
+
+
+class ManifestError(Error):
+    '''
+    Exception thrown when a manifest can't be read or the files it
+    describes don't match it
+    '''
+    pass
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# pipeline.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+A three stage read/transform/write pipeline used by write_all
+--pipeline, so that reading source files, rendering, and writing
+results can overlap instead of taking turns.
+'''
+
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StageStats(object):
+    '''
+    How much work a stage did (busy) and how long it spent waiting on
+    its neighbors (stall), in seconds
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.stall = 0.0
+
+    def __repr__(self):
+        return ('<StageStats %s: %d items, busy %.3fs, stalled %.3fs>'
+                % (self.name, self.items, self.busy, self.stall))
+
+
+class _Stopped(Exception):
+    pass
+
+
+def run(source, transform, sink, read_ahead=16, write_behind=16):
+    '''
+    Reads items from the iterable source in one thread, passes them
+    through transform in another, and gives the results to sink in the
+    calling thread.  read_ahead and write_behind are the sizes of the
+    queues between the stages.
+
+    Returns a list of StageStats for the read, transform and write
+    stages.  If any stage raises an exception, the others stop and it
+    is raised again here.
+
+    >>> written = []
+    >>> stats = run(range(5), lambda n: n * n, written.append)
+    >>> written
+    [0, 1, 4, 9, 16]
+    >>> [(s.name, s.items) for s in stats]
+    [('read', 5), ('transform', 5), ('write', 5)]
+    '''
+    read_stats = StageStats('read')
+    transform_stats = StageStats('transform')
+    write_stats = StageStats('write')
+    to_transform = queue.Queue(max(read_ahead, 1))
+    to_write = queue.Queue(max(write_behind, 1))
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item, stats):
+        start = time.perf_counter()
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                q.put(item, timeout=0.05)
+                break
+            except queue.Full:
+                pass
+        stats.stall += time.perf_counter() - start
+
+    def get(q, stats):
+        start = time.perf_counter()
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                item = q.get(timeout=0.05)
+                break
+            except queue.Empty:
+                pass
+        stats.stall += time.perf_counter() - start
+        return item
+
+    def read():
+        items = iter(source)
+        while True:
+            start = time.perf_counter()
+            item = next(items, _DONE)
+            read_stats.busy += time.perf_counter() - start
+            put(to_transform, item, read_stats)
+            if item is _DONE:
+                return
+            read_stats.items += 1
+
+    def transform_all():
+        while True:
+            item = get(to_transform, transform_stats)
+            if item is not _DONE:
+                start = time.perf_counter()
+                item = transform(item)
+                transform_stats.busy += time.perf_counter() - start
+                transform_stats.items += 1
+            put(to_write, item, transform_stats)
+            if item is _DONE:
+                return
+
+    def in_thread(target):
+        def run_target():
+            try:
+                target()
+            except _Stopped:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+        thread = threading.Thread(target=run_target, daemon=True)
+        thread.start()
+        return thread
+
+    threads = [in_thread(read), in_thread(transform_all)]
+    try:
+        while True:
+            item = get(to_write, write_stats)
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            sink(item)
+            write_stats.busy += time.perf_counter() - start
+            write_stats.items += 1
+    except _Stopped:
+        pass
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return [read_stats, transform_stats, write_stats]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# prerendered.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Diagrams rendered ahead of time with one set of settings and kept
+compactly in a single file, so that something that usually uses those
+settings (like the Anki add-on, whose build can include the diagrams
+for its default config) copies them instead of rendering them.
+
+A Renderer given a store only uses it if it was made with the same
+settings and version of kanjicolorizer, so its diagrams are exactly
+what the Renderer would make from the same KanjiVG data.
+
+Each diagram is compressed on its own, so any one of them can be read
+without the rest, with the first one as a preset dictionary: diagrams
+made with the same settings have most of their markup in common, so
+this makes even short ones compress well.
+'''
+
+import json
+import zlib
+
+from .colorizer import InvalidCharacterError, KanjiVG, Renderer
+
+MAGIC = b'kanjicolorizer prerendered 1\n'
+
+
+def _store_key(character, variant):
+    return character + '-' + variant if variant else character
+
+
+class PrerenderedStore(object):
+    '''
+    A file written by build_store.  Only its header is read when it is
+    opened; each diagram is read from the file when it is asked for.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'prerendered.bin')
+    >>> build_store(path, Renderer(), [KanjiVG('a'), KanjiVG('漢')])
+    2
+    >>> store = PrerenderedStore(path)
+    >>> store.get('漢') == Renderer().render_bytes('漢')
+    True
+    >>> store.fingerprint == Renderer().settings_fingerprint()
+    True
+    >>> ('漢', '') in store, ('字', '') in store
+    (True, False)
+    >>> os.remove(path)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.readline() != MAGIC:
+                raise ValueError('%s is not a prerendered store' % path)
+            header = json.loads(f.readline().decode('utf-8'))
+            self._body_start = f.tell()
+        self.fingerprint = header['fingerprint']
+        self._entries = dict((key, tuple(value)) for key, value
+                             in header['entries'].items())
+        self._dictionary = self._read(*header['dictionary'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return _store_key(*key) in self._entries
+
+    def get(self, character, variant=''):
+        '''
+        Returns the diagram for character and variant as UTF-8 bytes
+
+        Raises InvalidCharacterError if it isn't in the store
+        '''
+        try:
+            offset, length = self._entries[_store_key(character, variant)]
+        except KeyError:
+            raise InvalidCharacterError(character, variant) from None
+        decompressor = zlib.decompressobj(zdict=self._dictionary)
+        svg = decompressor.decompress(self._read(offset, length))
+        return svg + decompressor.flush()
+
+    def _read(self, offset, length):
+        # opened for each read, so that nothing is kept open (which
+        # would stop the file being replaced on some systems) and
+        # threads don't share a position in it
+        with open(self.path, 'rb') as f:
+            f.seek(self._body_start + offset)
+            return f.read(length)
+
+
+def open_matching(path, modifier):
+    '''
+    Opens the store at path if it was made with the same settings as
+    modifier (a Renderer or KanjiColorizer), so that its diagrams are
+    the ones modifier would make; returns None if it wasn't
+    '''
+    store = PrerenderedStore(path)
+    if store.fingerprint != modifier.settings_fingerprint():
+        return None
+    return store
+
+
+def build_store(path, renderer=None, kanji=None):
+    '''
+    Renders kanji (KanjiVG objects; all of the data there is if not
+    given) with renderer (default settings if not given) and writes
+    them to a new store at path.  Returns how many diagrams it holds.
+    '''
+    if renderer is None:
+        renderer = Renderer(cache_size=0)
+    if kanji is None:
+        kanji = KanjiVG.iter_all(source=renderer.source)
+    dictionary = b''
+    entries = {}
+    chunks = []
+    offset = 0
+    for k in kanji:
+        svg = renderer.render_bytes(k.character, k.variant)
+        if not chunks:
+            # zlib only uses the last 32K of a dictionary
+            dictionary = svg[-32768:]
+            chunks.append(dictionary)
+            offset = len(dictionary)
+        compressor = zlib.compressobj(9, zdict=dictionary)
+        data = compressor.compress(svg) + compressor.flush()
+        entries[_store_key(k.character, k.variant)] = (offset, len(data))
+        chunks.append(data)
+        offset += len(data)
+    header = {'fingerprint': renderer.settings_fingerprint(),
+              'dictionary': (0, len(dictionary)),
+              'entries': entries}
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(json.dumps(header, ensure_ascii=False,
+                           sort_keys=True).encode('utf-8'))
+        f.write(b'\n')
+        for chunk in chunks:
+            f.write(chunk)
+    return len(entries)
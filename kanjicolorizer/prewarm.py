@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# prewarm.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Filling a Renderer's caches ahead of time from a ranked list of
+characters (a frequency list, or a list of the characters taught
+first), so that the first diagrams asked for after a restart don't
+have to wait to be rendered.
+'''
+
+import threading
+import time
+
+from .colorizer import _split_characters
+
+
+def read_character_list(path):
+    '''
+    Reads a ranked character list: one character (or character-variant)
+    per line, most important first.  Anything after the first
+    whitespace on a line, like a frequency count, is ignored, as are
+    blank lines and lines starting with #.
+
+    >>> import tempfile, os
+    >>> path = tempfile.mktemp()
+    >>> with open(path, 'w', encoding='utf-8') as f:
+    ...     _ = f.write('# rank\\n日\\t12345\\n字-Kaisho 99\\n\\n日\\n')
+    >>> read_character_list(path)
+    [('日', ''), ('字', 'Kaisho')]
+    >>> os.remove(path)
+    '''
+    characters = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            characters.extend(_split_characters(fields[0]))
+    return list(dict.fromkeys(characters))
+
+
+def prewarm(renderer, characters, top=None, budget=None, stop=None):
+    '''
+    Renders the first top of characters (all of them if top is None)
+    with renderer, so that they are in its caches, stopping early once
+    budget seconds have passed or the stop event is set.  characters
+    are (character, variant) pairs or single characters; ones there is
+    no data for, or that can't be rendered for any other reason (such
+    as the on-disk cache not being writable), are skipped.  Returns how
+    many were rendered.
+
+    >>> from kanjicolorizer.colorizer import Renderer
+    >>> renderer = Renderer()
+    >>> prewarm(renderer, ['a', '漢', 'Л', ('ab', 'x')])
+    2
+    >>> renderer.stats.cache_misses
+    4
+    >>> _ = renderer.render('漢')
+    >>> renderer.stats.cache_hits
+    1
+    '''
+    deadline = None
+    if budget is not None:
+        deadline = time.monotonic() + budget
+    warmed = 0
+    for key in list(characters)[:top]:
+        if stop is not None and stop.is_set():
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        if isinstance(key, str):
+            key = (key, '')
+        try:
+            renderer.render_bytes(*key)
+        except Exception:
+            # InvalidCharacterError, usually; warming the cache is only
+            # an optimization, so nothing stops it
+            continue
+        warmed += 1
+    return warmed
+
+
+class Prewarm(object):
+    '''
+    prewarm running in a background thread
+
+    >>> from kanjicolorizer.colorizer import Renderer
+    >>> job = Prewarm(Renderer(), ['a', '漢'])
+    >>> job.wait(10)
+    True
+    >>> job.warmed
+    2
+    '''
+
+    def __init__(self, renderer, characters, top=None, budget=None):
+        self.warmed = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(renderer, characters, top, budget),
+            daemon=True)
+        self._thread.start()
+
+    def _run(self, renderer, characters, top, budget):
+        try:
+            self.warmed = prewarm(renderer, characters, top, budget,
+                                  self._stop)
+        finally:
+            # so that whoever waits for it always gets a count
+            if self.warmed is None:
+                self.warmed = 0
+
+    def cancel(self):
+        '''
+        Stops after the character being rendered now
+        '''
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        '''
+        Waits for prewarming to finish; returns False if timeout ran
+        out first
+        '''
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
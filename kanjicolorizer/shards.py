@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# shards.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Splitting write_all across machines with --shard I/N, and merging the
+results with --merge-shards.
+
+Each character is assigned to a shard by a hash of the character (and
+variant) alone, so a character stays in the same shard when others are
+added or removed.
+'''
+
+import glob
+import os
+import re
+import shutil
+import zlib
+
+from .layout import INDEX_FILENAME, local_path, write_index
+from .manifest import Manifest, ManifestError
+
+
+def parse_shard(spec):
+    '''
+    Parses an I/N shard specification; shards are numbered from 1
+
+    >>> parse_shard('2/4')
+    (2, 4)
+    >>> parse_shard('5/4')
+    Traceback (most recent call last):
+        ...
+    ValueError: shard must look like I/N with 1 <= I <= N: '5/4'
+    '''
+    m = re.match(r'^(\d+)/(\d+)$', spec)
+    if not m or not 1 <= int(m.group(1)) <= int(m.group(2)):
+        raise ValueError('shard must look like I/N with 1 <= I <= N: %r'
+                         % spec)
+    return int(m.group(1)), int(m.group(2))
+
+
+def shard_of(character, variant, count):
+    '''
+    Returns the shard (from 1 to count) that character and variant
+    belong to
+
+    >>> shard_of('漢', '', 4)
+    1
+    >>> shard_of('漢', '', 1)
+    1
+    '''
+    key = character + '-' + variant if variant else character
+    return zlib.crc32(key.encode('utf-8')) % count + 1
+
+
+def manifest_filename(shard):
+    '''
+    >>> manifest_filename((2, 4))
+    'manifest-shard-2-of-4.json'
+    '''
+    return 'manifest-shard-%d-of-%d.json' % shard
+
+
+def merge_shards(shard_directories, output_directory):
+    '''
+    Checks the shard manifests found in shard_directories, and copies
+    all of their diagrams (and the --stylesheet they share, if any)
+    into output_directory along with a manifest for the whole set (and
+    an index, if the shards used the sharded output layout).  Returns
+    that manifest.
+
+    Raises ManifestError if a shard is missing or duplicated, if shards
+    were made with different settings or wrote different stylesheets,
+    or if any file doesn't match its shard's manifest.
+    '''
+    shards = {}
+    for directory in shard_directories:
+        paths = glob.glob(os.path.join(directory, 'manifest-shard-*.json'))
+        if not paths:
+            raise ManifestError('no shard manifest in %s' % directory)
+        for path in paths:
+            manifest = Manifest.load(path)
+            if manifest.shard is None:
+                raise ManifestError('not a shard manifest: %s' % path)
+            if manifest.shard in shards:
+                raise ManifestError('shard %d/%d found twice'
+                                    % manifest.shard)
+            shards[manifest.shard] = (directory, manifest)
+
+    counts = set(n for i, n in shards)
+    if len(counts) != 1:
+        raise ManifestError('shards are from different splits: %s'
+                            % ', '.join('%d/%d' % s for s in sorted(shards)))
+    count = counts.pop()
+    missing = [i for i in range(1, count + 1) if (i, count) not in shards]
+    if missing:
+        raise ManifestError('missing shard(s): %s' % ', '.join(
+            '%d/%d' % (i, count) for i in missing))
+    fingerprints = set(m.fingerprint for d, m in shards.values())
+    if len(fingerprints) != 1:
+        raise ManifestError('shards were made with different settings')
+
+    merged = Manifest(fingerprints.pop())
+    for shard in sorted(shards):
+        directory, manifest = shards[shard]
+        manifest.verify(directory)
+        for path, entry in manifest.files.items():
+            if path == INDEX_FILENAME and not manifest.is_diagram(path):
+                # each shard's own index is replaced by one for them all
+                continue
+            if path not in merged.files:
+                merged.files[path] = entry
+            elif manifest.is_diagram(path):
+                raise ManifestError('%s is in more than one shard' % path)
+            elif merged.files[path]['sha256'] != entry['sha256']:
+                # every shard writes the same stylesheet
+                raise ManifestError('%s is different in different shards'
+                                    % path)
+
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+    for shard in sorted(shards):
+        directory, manifest = shards[shard]
+        for path in manifest.files:
+            if path not in merged.files:
+                continue
+            src = local_path(directory, path)
+            dst = local_path(output_directory, path)
+            if os.path.abspath(src) != os.path.abspath(dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(src, dst)
+    diagrams = [(entry['character'], entry['variant'], path)
+                for path, entry in merged.files.items()
+                if merged.is_diagram(path)]
+    if any('/' in path for character, variant, path in diagrams):
+        write_index(output_directory, diagrams)
+        with open(os.path.join(output_directory, INDEX_FILENAME), 'rb') as f:
+            merged.add_file(INDEX_FILENAME, f.read())
+    merged.save(os.path.join(output_directory, 'manifest.json'))
+    return merged
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# stats.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Statistics about rendering, for a single write_all run
+(KanjiColorizer.stats) or for everything a Renderer has done
+(Renderer.stats), as JSON or in the Prometheus text format.
+'''
+
+import bisect
+import collections
+import threading
+import time
+
+# upper bounds, in seconds, of the per-character latency histogram
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0)
+
+# how many invalid characters are kept for reporting
+MAX_INVALID_EXAMPLES = 100
+
+COUNTERS = collections.OrderedDict([
+    ('rendered', 'Diagrams rendered'),
+    ('skipped', 'Characters skipped because they were duplicates'),
+    ('invalid', 'Characters skipped because there is no data for them'),
+    ('bytes_read', 'Bytes of KanjiVG data read'),
+    ('bytes_written', 'Bytes of diagrams written'),
+    ('cache_hits', 'Diagrams served from a cache'),
+    ('cache_misses', 'Diagrams that had to be rendered, or read from '
+                     'the on-disk cache or a prerendered store'),
+    ('disk_cache_hits', 'Diagrams read from the on-disk cache'),
+    ('prerendered_hits', 'Diagrams copied from a prerendered store'),
+    ('coalesced', 'Requests that waited for the same diagram being '
+                  'rendered by another thread'),
+])
+
+
+class RunStats(object):
+    '''
+    Counters, a latency histogram and timings; safe to update from
+    several threads
+
+    >>> stats = RunStats()
+    >>> stats.count('rendered')
+    >>> stats.observe_latency(0.002)
+    >>> stats.rendered
+    1
+    >>> stats.to_json()['latency_seconds']['count']
+    1
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.invalid_characters = []
+        self.stages = []
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._stopped = None
+
+    def count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def observe_latency(self, seconds):
+        with self._lock:
+            self.latency_counts[
+                bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum += seconds
+
+    def add_invalid(self, character, variant):
+        '''
+        Counts an invalid character, remembering the first few of them
+        for reporting
+        '''
+        with self._lock:
+            self.invalid += 1
+            if len(self.invalid_characters) < MAX_INVALID_EXAMPLES:
+                self.invalid_characters.append((character, variant))
+
+    def stop(self):
+        '''
+        Fixes the wall and CPU times at their current values
+        '''
+        self._stopped = (self.wall_time, self.cpu_time)
+
+    @property
+    def wall_time(self):
+        if self._stopped:
+            return self._stopped[0]
+        return time.perf_counter() - self._wall_start
+
+    @property
+    def cpu_time(self):
+        if self._stopped:
+            return self._stopped[1]
+        return time.process_time() - self._cpu_start
+
+    @property
+    def cache_hit_rate(self):
+        '''
+        The fraction of requests served from a cache, or None if there
+        haven't been any
+
+        >>> stats = RunStats()
+        >>> stats.cache_hit_rate is None
+        True
+        >>> stats.count('cache_hits', 3)
+        >>> stats.count('cache_misses')
+        >>> stats.cache_hit_rate
+        0.75
+        '''
+        requests = self.cache_hits + self.cache_misses
+        if not requests:
+            return None
+        return self.cache_hits / requests
+
+    def _cumulative_latency(self):
+        '''
+        (upper bound, count of observations <= it) pairs, ending with
+        '+Inf'
+        '''
+        total = 0
+        buckets = []
+        for bound, n in zip(LATENCY_BUCKETS + ('+Inf',),
+                            self.latency_counts):
+            total += n
+            buckets.append((bound, total))
+        return buckets
+
+    def to_json(self):
+        data = collections.OrderedDict(
+            (name, getattr(self, name)) for name in COUNTERS)
+        data['cache_hit_rate'] = self.cache_hit_rate
+        data['latency_seconds'] = collections.OrderedDict([
+            ('buckets', collections.OrderedDict(
+                (str(bound), n) for bound, n in self._cumulative_latency())),
+            ('sum', self.latency_sum),
+            ('count', sum(self.latency_counts))])
+        data['wall_time_seconds'] = self.wall_time
+        data['cpu_time_seconds'] = self.cpu_time
+        data['stages'] = collections.OrderedDict(
+            (stage.name, collections.OrderedDict([
+                ('items', stage.items),
+                ('busy_seconds', stage.busy),
+                ('stall_seconds', stage.stall)]))
+            for stage in self.stages)
+        return data
+
+    def save_json(self, path):
+        import json
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=1)
+
+    def to_prometheus(self, prefix='kanjicolorizer'):
+        '''
+        Returns the statistics in the Prometheus text exposition format
+
+        >>> stats = RunStats()
+        >>> stats.count('rendered', 2)
+        >>> print(stats.to_prometheus())  # doctest: +ELLIPSIS
+        # HELP kanjicolorizer_rendered_total Diagrams rendered
+        # TYPE kanjicolorizer_rendered_total counter
+        kanjicolorizer_rendered_total 2
+        ...
+        '''
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                lines.append('%s_%s%s%s %s' % (
+                    prefix, name, suffix, labels, _format_value(value)))
+
+        for name, help_text in COUNTERS.items():
+            metric(name + '_total', 'counter', help_text,
+                   [('', '', getattr(self, name))])
+        metric('latency_seconds', 'histogram',
+               'Time to render and write each character',
+               [('_bucket', '{le="%s"}' % bound, n)
+                for bound, n in self._cumulative_latency()] +
+               [('_sum', '', self.latency_sum),
+                ('_count', '', sum(self.latency_counts))])
+        metric('wall_time_seconds', 'gauge', 'Elapsed time',
+               [('', '', self.wall_time)])
+        metric('cpu_time_seconds', 'gauge', 'Process CPU time used',
+               [('', '', self.cpu_time)])
+        if self.stages:
+            metric('stage_busy_seconds', 'gauge',
+                   'Time each pipeline stage spent working',
+                   [('', '{stage="%s"}' % s.name, s.busy)
+                    for s in self.stages])
+            metric('stage_stall_seconds', 'gauge',
+                   'Time each pipeline stage spent waiting on the others',
+                   [('', '{stage="%s"}' % s.name, s.stall)
+                    for s in self.stages])
+        return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    '''
+    >>> _format_value(3), _format_value(0.25)
+    ('3', '0.25')
+    '''
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
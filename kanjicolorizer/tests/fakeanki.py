@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# fakeanki.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Stand-ins for the parts of Anki that the add-on uses, so that it can
+be loaded and exercised by the tests and benchmarks without Anki.
+'''
+
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+class FakeMedia(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.writes = 0
+
+    def strip(self, text):
+        return text
+
+    def writeData(self, filename, data):
+        with open(os.path.join(self.directory, filename), 'wb') as f:
+            f.write(data)
+        self.writes += 1
+        return filename
+
+
+class FakeNote(object):
+
+    def __init__(self, model, fields, col=None):
+        self._model = model
+        self.fields = dict(fields)
+        self.id = 1
+        self.flushes = 0
+        self.col = col
+
+    def model(self):
+        return self._model
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def __setitem__(self, field, value):
+        self.fields[field] = value
+
+    def flush(self):
+        self.flushes += 1
+        if self.col is not None:
+            self.col.round_trips += 1
+            self.col.save(self)
+
+
+class FakeCollection(object):
+    '''
+    Stands in for mw.col, with its notes kept in memory.  Everything
+    that would be a round trip to the database adds one to
+    round_trips.
+    '''
+
+    def __init__(self, media):
+        self.media = media
+        self.models = FakeModels(self)
+        self.db = FakeDB(self)
+        self.notes = {}
+        self.round_trips = 0
+
+    def add(self, note):
+        '''
+        Adds a note (a FakeNote) to the collection without counting a
+        round trip, giving it the next id
+        '''
+        note.id = len(self.notes) + 1
+        note.col = self
+        self.models.models[note.model()['id']] = note.model()
+        self.save(note)
+        return note
+
+    def save(self, note):
+        self.notes[note.id] = (note.model(), dict(note.fields))
+
+    def getNote(self, nid):
+        self.round_trips += 1
+        model, fields = self.notes[nid]
+        note = FakeNote(model, fields.items(), self)
+        note.id = nid
+        return note
+
+    def update_notes(self, notes):
+        self.round_trips += 1
+        for note in notes:
+            self.save(note)
+
+    def findNotes(self, query):
+        self.round_trips += 1
+        return list(self.notes)
+
+
+class FakeModels(object):
+
+    def __init__(self, col):
+        self.col = col
+        self.models = {}
+
+    def fieldNames(self, model):
+        return [f['name'] for f in model['flds']]
+
+    def all(self):
+        return list(self.models.values())
+
+    def ids(self):
+        return list(self.models)
+
+    def get(self, mid):
+        return self.models.get(mid)
+
+    def nids(self, model):
+        self.col.round_trips += 1
+        return [nid for nid, (m, fields) in self.col.notes.items()
+                if m['id'] == model['id']]
+
+
+class FakeDB(object):
+    '''
+    Answers the one query the add-on makes of the notes table
+    '''
+
+    def __init__(self, col):
+        self.col = col
+
+    def all(self, sql, *args):
+        self.col.round_trips += 1
+        match = re.match(r'select id, mid, flds from notes '
+                         r'where id in \(([\d,]*)\)$', sql)
+        if match is None:
+            raise ValueError('unexpected query: %s' % sql)
+        rows = []
+        for nid in match.group(1).split(','):
+            if nid and int(nid) in self.col.notes:
+                model, fields = self.col.notes[int(nid)]
+                rows.append((int(nid), model['id'],
+                             '\x1f'.join(fields[name] for name in
+                                         self.col.models.fieldNames(model))))
+        return rows
+
+
+class MainThread(object):
+    '''
+    Stands in for mw.taskman: callbacks from the worker run when the
+    "event loop" gets to them
+    '''
+
+    def __init__(self):
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def run_on_main(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def run_pending(self):
+        with self.lock:
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def run_until_idle(self, worker):
+        while not worker.wait(0.01):
+            self.run_pending()
+
+
+class Anything(object):
+    '''
+    Accepts any attribute access or call; for Qt and menus
+    '''
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return Anything()
+
+    def __call__(self, *args, **kwargs):
+        return Anything()
+
+
+def load_addon(media, main, dst_fields):
+    '''
+    Imports the add-on with stand-in anki and aqt modules; its
+    collection is a FakeCollection, which can be replaced through the
+    add-on's mw, and the functions it adds to Anki's hooks are kept in
+    the lists of aqt.gui_hooks.  Only one copy can be loaded at a time;
+    unload_addon takes it and the stand-ins away again.
+    '''
+    global _saved
+    with open(os.path.join(ROOT, 'anki', 'config.json')) as f:
+        config = json.load(f)
+    config['dst-field'] = dst_fields
+    mw = types.SimpleNamespace(
+        addonManager=types.SimpleNamespace(
+            getConfig=lambda name: config,
+            setConfigUpdatedAction=lambda name, action: None,
+            addonsFolder=lambda name: os.path.join(
+                media.directory, 'addons21', name)),
+        col=FakeCollection(media),
+        pm=types.SimpleNamespace(name='benchmark'),
+        form=Anything(),
+        taskman=main)
+    hooks = types.ModuleType('anki.hooks')
+    hooks.addHook = lambda name, function: None
+    gui_hooks = types.ModuleType('aqt.gui_hooks')
+    gui_hooks.add_cards_did_add_note = []
+    gui_hooks.profile_will_close = []
+    gui_hooks.editor_did_load_note = []
+    aqt = types.ModuleType('aqt')
+    aqt.mw = mw
+    aqt.gui_hooks = gui_hooks
+    utils = types.ModuleType('aqt.utils')
+    utils.showInfo = utils.askUser = lambda *args: True
+    qt = types.ModuleType('aqt.qt')
+    qt.QAction = Anything
+    fakes = {'anki': types.ModuleType('anki'), 'anki.hooks': hooks,
+             'aqt': aqt, 'aqt.gui_hooks': gui_hooks, 'aqt.utils': utils,
+             'aqt.qt': qt}
+    _saved = (dict((name, sys.modules.get(name)) for name in fakes),
+              os.path.join(media.directory, 'addon'))
+    sys.modules.update(fakes)
+
+    # the add-on as Anki sees it: its files with kanjicolorizer inside
+    addon = os.path.join(media.directory, 'addon', 'kanji_colorize_addon')
+    os.makedirs(addon)
+    shutil.copy(os.path.join(ROOT, 'anki', 'kanji_colorizer.py'), addon)
+    os.symlink(os.path.join(ROOT, 'kanjicolorizer'),
+               os.path.join(addon, 'kanjicolorizer'))
+    open(os.path.join(addon, '__init__.py'), 'w').close()
+    sys.path.insert(0, os.path.dirname(addon))
+    from kanji_colorize_addon import kanji_colorizer
+    return kanji_colorizer
+
+
+_saved = None
+
+
+def unload_addon():
+    '''
+    Undoes load_addon: forgets the add-on's modules, puts back whatever
+    anki and aqt modules were there before, and takes the add-on's
+    directory off sys.path
+    '''
+    global _saved
+    if _saved is None:
+        return
+    modules, path = _saved
+    _saved = None
+    for name in list(sys.modules):
+        if name.split('.')[0] == 'kanji_colorize_addon':
+            del sys.modules[name]
+    for name, module in modules.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    if path in sys.path:
+        sys.path.remove(path)
+
+
+def make_note(characters, dst_fields):
+    model = {'id': 1, 'mod': 0, 'name': 'Japanese',
+             'flds': [{'name': name} for name in ['Kanji'] + dst_fields]}
+    return FakeNote(model, [('Kanji', characters)] +
+                    [(field, '') for field in dst_fields])
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# synthetic.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Helpers for tests that need KanjiVG-style data without depending on
+the kanjivg submodule being checked out.
+'''
+
+import os
+import shutil
+import tempfile
+from mock import patch
+from kanjicolorizer import colorizer
+
+HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<!--
+Copyright (C) 2009/2010/2011 Ulrich Apel.
+This work is distributed under the conditions of the Creative Commons
+Attribution-Share Alike 3.0 Licence.
+-->
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN" "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd" [
+<!ATTLIST g
+xmlns:kvg CDATA #FIXED "http://kanjivg.tagaini.net"
+kvg:element CDATA #IMPLIED >
+<!ATTLIST path
+xmlns:kvg CDATA #FIXED "http://kanjivg.tagaini.net"
+kvg:type CDATA #IMPLIED >
+]>
+<svg xmlns="http://www.w3.org/2000/svg" width="109" height="109" viewBox="0 0 109 109">
+'''
+
+XML_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<!--
+Copyright (C) 2009-2013 Ulrich Apel.
+This work is distributed under the conditions of the Creative Commons
+Attribution-Share Alike 3.0 Licence.
+-->
+<!DOCTYPE kanjivg [
+<!ELEMENT kanjivg (kanji*)>
+]>
+<kanjivg xmlns:kvg='http://kanjivg.tagaini.net'>
+'''
+
+
+def code_for(character, variant=''):
+    '''
+    The KanjiVG id used for a character
+
+    >>> code_for('漢')
+    '06f22'
+    >>> code_for('字', 'Kaisho')
+    '05b57-Kaisho'
+    '''
+    code = '%05x' % ord(character)
+    if variant:
+        code += '-' + variant
+    return code
+
+
+def make_svg(character, variant='', strokes=2, components=()):
+    '''
+    Returns an SVG in the KanjiVG format.  components is a sequence of
+    (element, stroke count) pairs, each of which becomes a group; if it
+    is empty the character has strokes ungrouped strokes.
+
+    >>> svg = make_svg('a')
+    >>> svg.count('<path ')
+    2
+    >>> svg = make_svg('休', components=[('亻', 2), ('木', 4)])
+    >>> svg.count('<path '), svg.count('<text ')
+    (6, 6)
+    >>> 'kvg:element="木"' in svg
+    True
+    '''
+    code = code_for(character, variant)
+    lines = [HEADER.rstrip('\n')]
+    lines.append(
+        '<g id="kvg:StrokePaths_%s" style="fill:none;stroke:#000000;'
+        'stroke-width:3;stroke-linecap:round;stroke-linejoin:round;">'
+        % code)
+    lines.append('<g id="kvg:%s" kvg:element="%s">' % (code, character))
+    groups = list(components) or [(None, strokes)]
+    n = 0
+    for g, (element, count) in enumerate(groups, 1):
+        indent = '\t'
+        if element is not None:
+            lines.append('\t<g id="kvg:%s-g%d" kvg:element="%s">'
+                         % (code, g, element))
+            indent = '\t\t'
+        for i in range(count):
+            n += 1
+            lines.append('%s<path id="kvg:%s-s%d" kvg:type="㇐" '
+                         'd="M%d,20c10,1,20,2,30,%d"/>'
+                         % (indent, code, n, 10 + n, n))
+        if element is not None:
+            lines.append('\t</g>')
+    lines.append('</g>')
+    lines.append('</g>')
+    lines.append('<g id="kvg:StrokeNumbers_%s" '
+                 'style="font-size:8;fill:#808080">' % code)
+    for i in range(1, n + 1):
+        lines.append('\t<text transform="matrix(1 0 0 1 %d.50 18.13)">'
+                     '%d</text>' % (i, i))
+    lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+
+def make_large_svg(strokes, depth=1, text_size=1):
+    '''
+    Returns an SVG in the KanjiVG format that is far bigger than any
+    real one, for checking how the transforms scale: strokes strokes,
+    each inside depth nested groups (every level of which has a
+    kvg:element), and stroke numbers text_size characters long.
+
+    >>> svg = make_large_svg(1000, depth=3, text_size=10)
+    >>> svg.count('<path '), svg.count('<text ')
+    (1000, 1000)
+    >>> svg.count('<g ') - 3
+    3000
+    '''
+    code = code_for('漢')
+    lines = [HEADER.rstrip('\n')]
+    lines.append(
+        '<g id="kvg:StrokePaths_%s" style="fill:none;stroke:#000000;'
+        'stroke-width:3;stroke-linecap:round;stroke-linejoin:round;">'
+        % code)
+    lines.append('<g id="kvg:%s" kvg:element="漢">' % code)
+    for n in range(1, strokes + 1):
+        for level in range(depth):
+            lines.append('\t' * (level + 1) +
+                         '<g id="kvg:%s-g%d-%d" kvg:element="口">'
+                         % (code, n, level))
+        lines.append('\t' * (depth + 1) +
+                     '<path id="kvg:%s-s%d" kvg:type="㇐" '
+                     'd="M%d,20c10,1,20,2,30,%d"/>' % (code, n, n % 100, n))
+        for level in reversed(range(depth)):
+            lines.append('\t' * (level + 1) + '</g>')
+    lines.append('</g>')
+    lines.append('</g>')
+    lines.append('<g id="kvg:StrokeNumbers_%s" '
+                 'style="font-size:8;fill:#808080">' % code)
+    number = '9' * text_size
+    for n in range(1, strokes + 1):
+        lines.append('\t<text transform="matrix(1 0 0 1 %d.50 18.13)">'
+                     '%s</text>' % (n % 100, number))
+    lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+
+DEFAULT_CORPUS = {
+    ('a', ''): {},
+    ('あ', ''): {'strokes': 3},
+    ('漢', ''): {'components': [('氵', 3), ('口', 3), ('夫', 4)]},
+    ('字', ''): {'components': [('宀', 3), ('子', 3)]},
+    ('字', 'Kaisho'): {'components': [('宀', 3), ('子', 3)]},
+    ('休', ''): {'components': [('亻', 2), ('木', 4)]},
+    ('木', ''): {'strokes': 4},
+}
+
+
+class SyntheticCorpus(object):
+    '''
+    Writes a small KanjiVG-style data directory to a temporary location
+    and points kanjicolorizer.colorizer.source_directory at it for as
+    long as it is in use as a context manager.  module is the colorizer
+    module to point at it instead, for another copy of the package like
+    the one inside the Anki add-on.
+
+    >>> with SyntheticCorpus() as corpus:
+    ...     colorizer.KanjiVG('漢').svg.count('<path ')
+    10
+    '''
+
+    def __init__(self, characters=None, module=None):
+        if characters is None:
+            characters = DEFAULT_CORPUS
+        self.characters = characters
+        self.module = module or colorizer
+
+    def __enter__(self):
+        self.root = tempfile.mkdtemp()
+        self.directory = os.path.join(self.root, 'kanji')
+        os.mkdir(self.directory)
+        for (character, variant), kwargs in self.characters.items():
+            self.write(character, variant, **kwargs)
+        self._patch = patch.object(self.module, 'source_directory',
+                                   self.directory)
+        self._patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._patch.stop()
+        shutil.rmtree(self.root)
+
+    def write_xml(self, path):
+        '''
+        Writes the corpus to path in the format of KanjiVG's single
+        kanjivg.xml file
+        '''
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(XML_HEADER)
+            for (character, variant), kwargs in self.characters.items():
+                svg = make_svg(character, variant, **kwargs)
+                code = code_for(character, variant)
+                start = svg.index('<g id="kvg:%s"' % code)
+                end = svg.index('\n</g>\n<g id="kvg:StrokeNumbers')
+                f.write('<kanji id="kvg:kanji_%s">\n%s\n</kanji>\n'
+                        % (code, svg[start:end]))
+            f.write('</kanjivg>\n')
+
+    def write(self, character, variant='', **kwargs):
+        path = os.path.join(self.directory,
+                            code_for(character, variant) + '.svg')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(make_svg(character, variant, **kwargs))
+        return path
+
+
+class SyntheticCorpusMixin(object):
+    '''
+    For TestCases whose tests all run against a SyntheticCorpus: setUp
+    starts one (of corpus_characters, if the class sets them) as
+    self.corpus, and it is removed again after each test.  Put it
+    before unittest.TestCase in the bases, and have setUp call the
+    superclass setUp first.
+    '''
+    corpus_characters = None
+
+    def setUp(self):
+        super(SyntheticCorpusMixin, self).setUp()
+        self.corpus = SyntheticCorpus(self.corpus_characters)
+        self.corpus.__enter__()
+        self.addCleanup(self.corpus.__exit__)
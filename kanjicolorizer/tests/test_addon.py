@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_addon.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Tests of the Anki add-on's bulk actions, with the stand-ins for Anki
+from fakeanki
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from mock import patch
+from kanjicolorizer.tests.fakeanki import (
+    FakeCollection, FakeMedia, MainThread, load_addon, make_note,
+    unload_addon)
+from kanjicolorizer.tests.synthetic import SyntheticCorpus
+
+DST_FIELDS = ['Diagram1', 'Diagram2']
+
+addon = None
+media = None
+main = None
+corpus = None
+
+
+def setUpModule():
+    global addon, media, main, corpus
+    media = FakeMedia(tempfile.mkdtemp())
+    main = MainThread()
+    addon = load_addon(media, main, DST_FIELDS)
+    # the add-on has its own copy of kanjicolorizer
+    corpus = SyntheticCorpus(
+        module=sys.modules[addon.KanjiColorizer.__module__])
+    corpus.__enter__()
+
+
+def tearDownModule():
+    corpus.__exit__()
+    unload_addon()
+    shutil.rmtree(media.directory)
+
+
+class BulkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.col = addon.mw.col = FakeCollection(media)
+        self.words = ['漢字', '字漢', 'a', '漢'] * 10
+        for word in self.words:
+            self.col.add(make_note(word, DST_FIELDS))
+        self.config = dict(addon.addon_config)
+        self.addCleanup(addon.load_config, self.config)
+        addon.addon_config['note-batch-size'] = 15
+        addon.generated_indexes.clear()
+        self.col.round_trips = 0
+
+    def bulk_add(self):
+        return addon.bulkAddKanji(addon.fetchNoteFields(list(self.col.notes)))
+
+    def test_fills_in_notes(self):
+        self.assertEqual(self.bulk_add(), len(self.words))
+        for nid, word in zip(self.col.notes, self.words):
+            model, fields = self.col.notes[nid]
+            for field, character in zip(DST_FIELDS, word):
+                self.assertIn('%05x' % ord(character), fields[field])
+
+    def test_round_trips(self):
+        self.bulk_add()
+        # a read and an update per batch of 15, and one fetch of each
+        # changed note to update it with
+        self.assertEqual(self.col.round_trips, 3 + 40 + 3)
+
+    def test_unchanged_notes_arent_written(self):
+        self.bulk_add()
+        self.col.round_trips = 0
+        self.assertEqual(self.bulk_add(), 0)
+        self.assertEqual(self.col.round_trips, 3)
+
+    def test_older_anki_flushes_once_per_note(self):
+        update_notes = FakeCollection.update_notes
+        del FakeCollection.update_notes
+        self.addCleanup(setattr, FakeCollection, 'update_notes',
+                        update_notes)
+        self.bulk_add()
+        self.assertEqual(self.col.round_trips, 3 + 40 + 40)
+
+    def test_regenerate_stale(self):
+        self.bulk_add()
+        self.col.round_trips = 0
+        addon.regenerate_stale()
+        # the notes of the model, then reading their fields
+        self.assertEqual(self.col.round_trips, 1 + 3)
+
+    def test_compound_clears_other_destinations(self):
+        self.bulk_add()
+        addon.addon_config['compound-diagram'] = True
+        self.bulk_add()
+        model, fields = self.col.notes[1]
+        self.assertIn('06f22_05b57', fields['Diagram1'])
+        self.assertEqual(fields['Diagram2'], '')
+
+    def test_compound_without_overwrite(self):
+        self.bulk_add()
+        addon.addon_config['compound-diagram'] = True
+        for config in addon.configs:
+            config['overwrite'] = False
+        self.bulk_add()
+        model, fields = self.col.notes[1]
+        self.assertNotIn('06f22_05b57', fields['Diagram1'])
+        self.assertIn('05b57', fields['Diagram2'])
+
+    def test_generated_index_in_addon_folder(self):
+        self.bulk_add()
+        addon.saveGeneratedIndexes()
+        self.assertIn('generated-benchmark.json',
+                      os.listdir(addon.user_files_path))
+        self.assertEqual(
+            os.path.dirname(addon.user_files_path),
+            os.path.dirname(addon.__file__))
+        self.assertFalse(os.path.exists(
+            os.path.join(media.directory, 'addons21')))
+
+    def test_cached_diagrams_dont_read_data(self):
+        addon.renderDiagrams('漢字')
+        real_open = open
+        with patch('builtins.open', side_effect=real_open) as mock_open:
+            images = addon.renderDiagrams('漢字')
+        self.assertEqual(len(images), 2)
+        self.assertFalse([c for c in mock_open.call_args_list
+                          if str(c[0][0]).startswith(corpus.directory)])
+
+    def test_add_kanji_flushes_once(self):
+        note = self.col.getNote(1)
+        addon.last_render.clear()
+        self.assertTrue(addon.addKanji(note))
+        self.assertEqual(note.flushes, 1)
+
+
+class PrewarmTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = dict(addon.addon_config)
+        self.addCleanup(addon.load_config, self.config)
+        os.makedirs(addon.user_files_path, exist_ok=True)
+        path = os.path.join(addon.user_files_path, 'frequent.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('漢\n字\n')
+        self.addCleanup(os.remove, path)
+        self.addCleanup(shutil.rmtree,
+                        os.path.join(addon.user_files_path, 'cache'), True)
+
+    def test_prewarms_list_from_user_files(self):
+        addon.load_config(dict(self.config, **{'prewarm-list':
+                                               'frequent.txt'}))
+        self.assertTrue(addon.prewarming.wait(10))
+        self.assertEqual(addon.prewarming.warmed, 2)
+        cache = addon.kc.renderer().cache_directory
+        self.assertEqual(cache, os.path.join(addon.user_files_path, 'cache'))
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(cache)),
+                         2)
+
+
+class FakeEditor(object):
+
+    def __init__(self, note):
+        self.note = note
+        self.reloads = 0
+
+    def loadNoteKeepingFocus(self):
+        self.reloads += 1
+
+
+class EditorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.col = addon.mw.col = FakeCollection(media)
+        self.note = self.col.add(make_note('漢字', DST_FIELDS))
+        self.editor = FakeEditor(self.note)
+        addon.last_render.clear()
+        for hook in sys.modules['aqt.gui_hooks'].editor_did_load_note:
+            hook(self.editor)
+
+    def test_hooks_registered(self):
+        gui_hooks = sys.modules['aqt.gui_hooks']
+        self.assertEqual(gui_hooks.editor_did_load_note, [addon.onLoadNote])
+        self.assertEqual(gui_hooks.profile_will_close,
+                         [addon.saveGeneratedIndexes])
+
+    def test_focus_lost_fills_in_in_background(self):
+        self.assertFalse(addon.onFocusLost(False, self.note, 0))
+        # nothing changes until the main thread gets the result
+        self.assertEqual(self.note['Diagram1'], '')
+        main.run_until_idle(addon.worker)
+        self.assertIn('06f22', self.note['Diagram1'])
+        self.assertIn('05b57', self.note['Diagram2'])
+        self.assertEqual(self.note.flushes, 1)
+        self.assertEqual(self.editor.reloads, 1)
+
+    def test_edited_again_before_rendered(self):
+        addon.onFocusLost(False, self.note, 0)
+        self.note['Kanji'] = '字'
+        main.run_until_idle(addon.worker)
+        self.assertEqual(self.note['Diagram1'], '')
+        self.assertEqual(self.editor.reloads, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
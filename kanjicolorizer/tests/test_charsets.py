@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_charsets.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+from kanjicolorizer import charsets
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class CharsetTest(unittest.TestCase):
+
+    def test_sizes(self):
+        for name, size in [('joyo', 2136), ('grade1', 80), ('grade2', 160),
+                           ('grade3', 200), ('grade4', 202),
+                           ('grade5', 193), ('grade6', 191),
+                           ('jis1', 2965), ('jis2', 3390),
+                           ('hiragana', 96)]:
+            members = charsets.CHARSETS[name].members()
+            self.assertEqual(len(members), size)
+            self.assertEqual(len(set(members)), size)
+
+    def test_jis_levels(self):
+        level1 = charsets.CHARSETS['jis1'].members()
+        level2 = charsets.CHARSETS['jis2'].members()
+        self.assertEqual(level1[0], '亜')
+        self.assertEqual(level2[-1], '熙')
+        self.assertFalse(set(level1) & set(level2))
+        self.assertLessEqual(set(charsets.CHARSETS['grade1'].members()),
+                             set(level1))
+
+    def test_grades_split_up_kyoiku_kanji(self):
+        joyo = set(charsets.CHARSETS['joyo'].members())
+        seen = set()
+        for grade in range(1, 7):
+            members = set(charsets.CHARSETS['grade%d' % grade].members())
+            self.assertFalse(members & seen)
+            self.assertLessEqual(members, joyo)
+            seen |= members
+        self.assertEqual(len(seen), 1026)
+
+    def test_joyo_in_jis(self):
+        jis = set(charsets.CHARSETS['jis1'].members() +
+                  charsets.CHARSETS['jis2'].members())
+        self.assertLessEqual(set(charsets.CHARSETS['joyo'].members()), jis)
+
+    def test_ranges(self):
+        charset, = charsets.parse_charsets('u+6f22')
+        self.assertEqual(charset.members(), ['漢'])
+        for spec in ['U+3043-U+3041', 'U+110000', 'U+', 'U+3041-']:
+            self.assertRaises(ValueError, charsets.parse_charsets, spec)
+
+
+class WriteCharsetTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(WriteCharsetTest, self).setUp()
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def write(self, args):
+        kc = KanjiColorizer('--filename-mode code -o %s %s'
+                            % (self.output, args))
+        kc.write_all()
+        return kc, sorted(os.listdir(self.output))
+
+    def test_only_the_set(self):
+        kc, files = self.write('--charset grade1')
+        # no variants, as with --characters
+        self.assertEqual(files, ['04f11.svg', '05b57.svg', '06728.svg'])
+        self.assertEqual(kc.stats.invalid, 77)
+
+    def test_several_and_characters(self):
+        kc, files = self.write('--characters 漢字 --charset grade1,hiragana')
+        self.assertEqual(files, ['03042.svg', '04f11.svg', '05b57.svg',
+                                 '06728.svg', '06f22.svg'])
+        self.assertEqual(kc.stats.skipped, 1)
+
+    def test_ranges_dont_count_missing(self):
+        kc, files = self.write('--charset U+3040-U+30FF')
+        self.assertEqual(files, ['03042.svg'])
+        self.assertEqual(kc.stats.invalid, 0)
+
+    def test_unknown_set(self):
+        with patch('sys.stderr'):
+            for spec in ['grade7', 'joyo@2017']:
+                self.assertRaises(SystemExit, KanjiColorizer,
+                                  '--charset ' + spec)
+
+
+if __name__ == "__main__":
+    unittest.main()
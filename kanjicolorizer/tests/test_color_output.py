@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_color_output.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.index import get_index
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+def css_colors(css):
+    '''
+    {(scope, class): stroke color} from a stylesheet
+    '''
+    return dict(((scope, name), color) for scope, name, color in re.findall(
+        r'^(\.n\d+ )?\.(s\d+) \{ stroke: (#[0-9a-f]{6}); \}$', css, re.M))
+
+
+class ClassOutputTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(ClassOutputTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def assertSameColors(self, args, character):
+        inline = KanjiColorizer(args).get_colored_svg(character)
+        classed = KanjiColorizer(
+            args + ' --color-output class').get_colored_svg(character)
+        stroke_count = re.search(r'class="(n\d+)"', classed).group(1)
+        colors = css_colors(classed)
+        inline_colors = re.findall(r'<path [^>]*stroke: (#[0-9a-f]{6})',
+                                   inline)
+        classes = re.findall(r'<path [^>]*class="(s\d+)"', classed)
+        scope = '' if 'contrast' in args else '.%s ' % stroke_count
+        self.assertEqual([colors[(scope, c)] for c in classes],
+                         inline_colors)
+
+    def test_same_colors_as_inline(self):
+        self.assertSameColors('', '漢')
+
+    def test_same_colors_as_inline_contrast(self):
+        self.assertSameColors('--mode contrast', '漢')
+
+    def test_no_inline_styles(self):
+        svg = KanjiColorizer('--color-output class').get_colored_svg('漢')
+        self.assertIsNone(re.search('<(path|text) [^>]*style=', svg))
+        self.assertEqual(svg.count('<style '), 1)
+        self.assertEqual(svg.count('class="s10"'), 2)
+
+    def test_group_mode(self):
+        svg = KanjiColorizer(
+            '--color-output class --group-mode').get_colored_svg('漢')
+        groups = re.findall(r'<g class="(s\d+)"', svg)
+        self.assertEqual(groups, ['s1', 's2', 's3'])
+
+    def test_shared_stylesheet(self):
+        output = os.path.join(self.tmp, 'out')
+        KanjiColorizer('--color-output class --stylesheet kc.css '
+                       '--characters 漢木a -o ' + output).write_all()
+        with open(os.path.join(output, 'kc.css'), encoding='utf-8') as f:
+            colors = css_colors(f.read())
+        scopes = set(scope for scope, _ in colors)
+        self.assertEqual(scopes, set('.n%d ' % entry.strokes
+                                     for entry in get_index()))
+        with open(os.path.join(output, '木.svg'), encoding='utf-8') as f:
+            svg = f.read()
+        self.assertIn('<?xml-stylesheet type="text/css" href="kc.css"?>',
+                      svg)
+        self.assertNotIn('<style', svg)
+
+    def test_batches_share_stylesheet(self):
+        output = os.path.join(self.tmp, 'out')
+        for characters in ['a', '漢']:
+            KanjiColorizer('--color-output class --stylesheet kc.css '
+                           '--characters %s -o %s' % (characters, output)
+                           ).write_all()
+        with open(os.path.join(output, 'kc.css'), encoding='utf-8') as f:
+            colors = css_colors(f.read())
+        self.assertIn(('.n2 ', 's2'), colors)
+        self.assertIn(('.n10 ', 's10'), colors)
+
+    def test_smaller_than_inline(self):
+        sizes = []
+        for args in ['', '--color-output class --stylesheet kc.css']:
+            svg = KanjiColorizer(args).get_colored_svg('漢')
+            sizes.append(len(svg))
+        self.assertLess(sizes[1], sizes[0])
+
+    def test_stylesheet_only(self):
+        output = os.path.join(self.tmp, 'out')
+        KanjiColorizer('--color-output class --stylesheet kc.css '
+                       '--stylesheet-only -o ' + output).write_stylesheet()
+        self.assertEqual(os.listdir(output), ['kc.css'])
+        with open(os.path.join(output, 'kc.css'), encoding='utf-8') as f:
+            self.assertIn('.n10 .s10 {', f.read())
+
+    def test_changes_fingerprint(self):
+        self.assertNotEqual(
+            KanjiColorizer('').settings_fingerprint(),
+            KanjiColorizer('--color-output class').settings_fingerprint())
+
+
+if __name__ == "__main__":
+    unittest.main()
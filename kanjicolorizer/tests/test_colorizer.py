@@ -22,9 +22,14 @@
 
 import unittest
 from mock import mock_open, patch
+import io
 import os
+import shutil
+import tempfile
 from kanjicolorizer import colorizer
 from kanjicolorizer.colorizer import KanjiVG, KanjiColorizer
+from kanjicolorizer.stats import RunStats
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
 
 TOTAL_NUMBER_CHARACTERS = 11656
 
@@ -203,8 +208,8 @@ class KanjiColorizerCharactersOptionTest(unittest.TestCase):
 
     def setUp(self):
         # replace the open function with a mock; reading any file will
-        # return ''
-        patch_open = patch('builtins.open', mock_open())
+        # return no data (KanjiVG files are read as bytes)
+        patch_open = patch('builtins.open', mock_open(read_data=b''))
         self.mock_open = patch_open.start()
         self.addCleanup(patch_open.stop)
 
@@ -313,5 +318,85 @@ class KanjiColorizerCharactersOptionTest(unittest.TestCase):
         self.assertOpenedFileForWriting('あ.svg')
 
 
+class KanjiColorizerCharactersFileTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(KanjiColorizerCharactersFileTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.output = os.path.join(self.tmp, 'out')
+
+    def write_characters_file(self, text):
+        path = os.path.join(self.tmp, 'characters.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def write_all(self, args):
+        kc = KanjiColorizer(args + ' -o ' + self.output)
+        stderr = io.StringIO()
+        with patch('sys.stderr', stderr):
+            kc.write_all()
+        return sorted(os.listdir(self.output)), stderr.getvalue()
+
+    def test_writes_characters_from_file(self):
+        path = self.write_characters_file('漢\nあ\n')
+        written, _ = self.write_all('--characters-file ' + path)
+        self.assertEqual(written, ['あ.svg', '漢.svg'])
+
+    def test_reads_variants(self):
+        path = self.write_characters_file('字-Kaisho\n')
+        written, _ = self.write_all('--characters-file ' + path)
+        self.assertEqual(written, ['字-Kaisho.svg'])
+
+    def test_reads_standard_input(self):
+        with patch('sys.stdin', io.StringIO('木\n休\n')):
+            written, _ = self.write_all('--characters-file -')
+        self.assertEqual(written, ['休.svg', '木.svg'])
+
+    def test_combines_with_characters_option(self):
+        path = self.write_characters_file('木\n')
+        written, _ = self.write_all('--characters a --characters-file ' + path)
+        self.assertEqual(written, ['a.svg', '木.svg'])
+
+    def test_duplicates_counted(self):
+        path = self.write_characters_file('木\n木\n\n木\n')
+        written, report = self.write_all('--characters-file ' + path)
+        self.assertEqual(written, ['木.svg'])
+        self.assertIn('skipped 2 duplicate', report)
+
+    def test_invalid_counted_and_named(self):
+        path = self.write_characters_file('Л\n木\n字-gobbledygook\n')
+        written, report = self.write_all('--characters-file ' + path)
+        self.assertEqual(written, ['木.svg'])
+        self.assertIn('skipped 2 invalid', report)
+        self.assertIn('Л', report)
+        self.assertIn('字-gobbledygook', report)
+
+    def test_nothing_reported_when_nothing_skipped(self):
+        path = self.write_characters_file('木\n')
+        _, report = self.write_all('--characters-file ' + path)
+        self.assertEqual(report, '')
+
+    def test_renders_before_file_is_read(self):
+        kc = KanjiColorizer()
+        lines_read = []
+
+        def lines():
+            for line in ['木\n', '休\n']:
+                lines_read.append(line)
+                yield line
+        kc.settings.characters_file = '-'
+        with patch('sys.stdin', lines()):
+            kanji = kc._get_characters_to_write(RunStats())
+            self.assertEqual(next(kanji).character, '木')
+            self.assertEqual(lines_read, ['木\n'])
+
+    def test_doesnt_change_characters_setting(self):
+        kc = KanjiColorizer('--characters 漢,a -o ' + self.output)
+        kc.write_all()
+        self.assertEqual(kc.settings.characters, '漢,a')
+
+
 if __name__ == "__main__":
     unittest.main()
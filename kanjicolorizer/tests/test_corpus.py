@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_corpus.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import gc
+import os
+import tracemalloc
+import unittest
+from kanjicolorizer import colorizer
+from kanjicolorizer.colorizer import KanjiColorizer, KanjiVG
+from kanjicolorizer.corpus import ResidentCorpus
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+from kanjicolorizer.tests.test_memory import corpus_of, source_bytes
+
+
+def held_memory(function):
+    '''
+    Calls function and returns (its result, bytes of memory still
+    allocated from the call while the result is kept)
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+class ResidentCorpusTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def test_same_data_as_files(self):
+        resident = ResidentCorpus()
+        self.assertEqual(len(resident), len(self.corpus.characters))
+        for character, variant in self.corpus.characters:
+            path = os.path.join(self.corpus.directory,
+                                KanjiVG(character, variant).ascii_filename)
+            with open(path, 'rb') as f:
+                self.assertEqual(resident.get_data(character, variant),
+                                 f.read())
+
+    def test_prolog_kept_once(self):
+        self.assertEqual(len(ResidentCorpus()._prologs), 1)
+
+    def test_invalid_character(self):
+        resident = ResidentCorpus()
+        self.assertRaises(colorizer.InvalidCharacterError,
+                          resident.get_data, '字', 'Gyosho')
+
+    def test_kanjivg_reads_from_it(self):
+        rendered = KanjiColorizer('').get_colored_svg('漢')
+        colorizer.use_resident_corpus()
+        self.addCleanup(colorizer.use_resident_corpus, False)
+        os.remove(self.corpus.write('漢'))
+        self.assertEqual(KanjiVG('漢').svg.count('<path '), 10)
+        self.assertEqual(KanjiColorizer('').get_colored_svg('漢'), rendered)
+        self.assertEqual(len(list(KanjiVG.iter_all())),
+                         len(self.corpus.characters))
+        self.assertRaises(colorizer.InvalidCharacterError, KanjiVG, 'Л')
+
+    def test_use_source_drops_it(self):
+        colorizer.use_resident_corpus()
+        self.addCleanup(colorizer.use_resident_corpus, False)
+        colorizer.use_source(self.corpus.directory)
+        self.assertIsNone(colorizer.resident_corpus)
+
+
+class ResidentCorpusMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        corpus = corpus_of(400)
+        corpus.__enter__()
+        self.addCleanup(corpus.__exit__)
+
+    def test_fraction_of_kanjivg_objects(self):
+        def load_strings():
+            kanji = KanjiVG.get_all()
+            for k in kanji:
+                k.svg
+                k._data = None
+            return kanji
+        kanji, strings = held_memory(load_strings)
+        resident, compact = held_memory(ResidentCorpus)
+        self.assertLess(compact, strings / 2)
+        # less than the files themselves, since the prolog is shared
+        self.assertLess(compact, source_bytes())
+
+    def test_memory_usage_is_accurate(self):
+        resident, held = held_memory(ResidentCorpus)
+        self.assertLess(abs(resident.memory_usage() - held), held / 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_index.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import unittest
+from mock import patch
+from kanjicolorizer import colorizer, index
+from kanjicolorizer.colorizer import KanjiVG
+from kanjicolorizer.index import KanjiVGIndex, build_index, get_index
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class BuildIndexTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(BuildIndexTest, self).setUp()
+        self.index = build_index()
+
+    def test_has_an_entry_per_file(self):
+        self.assertEqual(len(self.index), len(self.corpus.characters))
+
+    def test_stroke_count(self):
+        self.assertEqual(self.index.get('漢').strokes, 10)
+
+    def test_components(self):
+        self.assertEqual(self.index.get('漢').components, ['氵', '口', '夫'])
+
+    def test_character_without_components(self):
+        self.assertEqual(self.index.get('a').components, [])
+
+    def test_variant_entry(self):
+        self.assertEqual(self.index.get('字', 'Kaisho').strokes, 6)
+
+    def test_missing_raises_invalid_character(self):
+        self.assertRaises(colorizer.InvalidCharacterError,
+                          self.index.get, 'Л')
+
+    def test_ignores_other_files(self):
+        open(os.path.join(self.corpus.directory, 'README'), 'w').close()
+        self.assertEqual(len(build_index()), len(self.corpus.characters))
+
+    def test_round_trips_through_json(self):
+        copy = KanjiVGIndex.from_json(self.index.to_json())
+        self.assertEqual(list(copy), list(self.index))
+
+    def test_rejects_other_versions(self):
+        self.assertRaises(ValueError, KanjiVGIndex.from_json,
+                          {'version': -1, 'kanji': {}})
+
+
+class KanjiVGQueryTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(KanjiVGQueryTest, self).setUp()
+        self.addCleanup(index._indexes.clear)
+
+    def test_with_stroke_count(self):
+        self.assertEqual(KanjiVG.with_stroke_count(6),
+                         [('休', ''), ('字', ''), ('字', 'Kaisho')])
+
+    def test_containing_element(self):
+        self.assertEqual(KanjiVG.containing_element('木'), [('休', '')])
+
+    def test_variants_of(self):
+        self.assertEqual(KanjiVG.variants_of('字'), ['Kaisho'])
+        self.assertEqual(KanjiVG.variants_of('漢'), [])
+
+    def test_queries_dont_read_svgs_once_indexed(self):
+        get_index()
+        with patch('builtins.open') as mock_open:
+            KanjiVG.with_stroke_count(3)
+            KanjiVG.containing_element('口')
+            self.assertFalse(mock_open.called)
+
+    def test_uses_saved_index_for_bundled_data(self):
+        saved = os.path.join(self.corpus.root, 'index.json')
+        build_index().save(saved)
+        with patch.object(index, '_bundled_directory',
+                          colorizer.source_directory), \
+                patch.object(index, 'index_path', saved), \
+                patch.object(index, 'build_index') as mock_build:
+            self.assertEqual(len(get_index()), len(self.corpus.characters))
+            self.assertFalse(mock_build.called)
+
+    def treat_as_bundled(self):
+        '''
+        Makes the corpus count as the bundled data, with its index saved
+        in the corpus directory; returns the index path
+        '''
+        saved = os.path.join(self.corpus.root, 'index.json')
+        for p in [patch.object(index, '_bundled_directory',
+                               colorizer.source_directory),
+                  patch.object(index, 'index_path', saved)]:
+            p.start()
+            self.addCleanup(p.stop)
+        return saved
+
+    def test_builds_and_saves_missing_index(self):
+        saved = self.treat_as_bundled()
+        self.assertEqual(len(get_index()), len(self.corpus.characters))
+        self.assertEqual(len(KanjiVGIndex.load(saved)),
+                         len(self.corpus.characters))
+
+    def test_rebuilds_stale_index(self):
+        saved = self.treat_as_bundled()
+        build_index().save(saved)
+        self.corpus.write('本', strokes=5)
+        self.assertEqual(get_index().get('本').strokes, 5)
+        self.assertIn(('本', ''), KanjiVGIndex.load(saved))
+
+    def test_uses_copied_index_with_new_mtimes(self):
+        saved = self.treat_as_bundled()
+        build_index().save(saved)
+        for name in os.listdir(self.corpus.directory):
+            os.utime(os.path.join(self.corpus.directory, name),
+                     (0, 12345678))
+        with patch.object(index, 'build_index') as mock_build:
+            self.assertEqual(len(get_index()), len(self.corpus.characters))
+            self.assertFalse(mock_build.called)
+
+    def test_rebuilds_index_of_other_version(self):
+        saved = self.treat_as_bundled()
+        with open(saved, 'w', encoding='utf-8') as f:
+            f.write('{"version": 1, "kanji": {}}')
+        self.assertEqual(len(get_index()), len(self.corpus.characters))
+
+
+if __name__ == "__main__":
+    unittest.main()
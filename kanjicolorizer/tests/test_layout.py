@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_layout.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import collections
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.layout import INDEX_FILENAME, OutputLayout
+from kanjicolorizer.shards import merge_shards
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class OutputLayoutTest(unittest.TestCase):
+
+    def test_hash_spreads_evenly(self):
+        layout = OutputLayout('sharded', 'hash', 16, 1)
+        counts = collections.Counter(
+            layout.directories(chr(c), '')[0]
+            for c in range(0x4e00, 0x4e00 + 1600))
+        self.assertEqual(len(counts), 16)
+        self.assertLess(max(counts.values()), 2 * 1600 // 16)
+
+    def test_directory_names_fit_fan_out(self):
+        for fan_out in [2, 16, 100, 256, 4096]:
+            layout = OutputLayout('sharded', 'hash', fan_out, 3)
+            names = layout.directories('漢', 'Kaisho')
+            self.assertEqual(len(names), 3)
+            for name in names:
+                self.assertEqual(len(name), len('%x' % (fan_out - 1)))
+                self.assertLess(int(name, 16), fan_out)
+
+    def test_variant_is_part_of_the_hash(self):
+        layout = OutputLayout('sharded', 'hash', 4096, 1)
+        self.assertNotEqual(layout.directories('字', ''),
+                            layout.directories('字', 'Kaisho'))
+
+    def test_codepoint_keeps_neighbors_together(self):
+        layout = OutputLayout('sharded', 'codepoint', 256, 1)
+        self.assertEqual(layout.path('漢', '', 'x'),
+                         layout.path(chr(ord('漢') + 1), '', 'x'))
+
+    def test_bad_settings(self):
+        self.assertRaises(ValueError, OutputLayout, 'deep')
+        self.assertRaises(ValueError, OutputLayout, 'sharded', 'name')
+        self.assertRaises(ValueError, OutputLayout, 'sharded', 'hash', 1)
+        self.assertRaises(ValueError, OutputLayout, 'sharded', 'hash', 16, 0)
+
+
+class ShardedWriteAllTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(ShardedWriteAllTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def written(self, directory):
+        files = {}
+        for root, dirs, names in os.walk(directory):
+            for name in names:
+                if name.endswith('.svg'):
+                    path = os.path.relpath(os.path.join(root, name),
+                                           directory)
+                    with open(os.path.join(root, name), 'rb') as f:
+                        files[path.replace(os.sep, '/')] = f.read()
+        return files
+
+    def index(self, directory):
+        with open(os.path.join(directory, INDEX_FILENAME),
+                  encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_same_files_as_flat(self):
+        flat = os.path.join(self.tmp, 'flat')
+        sharded = os.path.join(self.tmp, 'sharded')
+        KanjiColorizer('-o ' + flat).write_all()
+        KanjiColorizer('--output-layout sharded --fan-out 16 --depth 2 '
+                       '-o ' + sharded).write_all()
+        flat_files = self.written(flat)
+        sharded_files = self.written(sharded)
+        self.assertEqual(
+            sorted(flat_files.values()), sorted(sharded_files.values()))
+        for path in sharded_files:
+            self.assertEqual(path.count('/'), 2)
+            self.assertIn(os.path.basename(path), flat_files)
+
+    def test_index_maps_every_character(self):
+        directory = os.path.join(self.tmp, 'out')
+        KanjiColorizer('--output-layout sharded --filename-mode code '
+                       '-o ' + directory).write_all()
+        index = self.index(directory)
+        self.assertEqual(sorted(index.values()),
+                         sorted(self.written(directory)))
+        self.assertTrue(index['漢'].endswith('/06f22.svg'))
+        self.assertTrue(index['字-Kaisho'].endswith('/05b57-Kaisho.svg'))
+
+    def test_codepoint_key(self):
+        directory = os.path.join(self.tmp, 'out')
+        KanjiColorizer('--output-layout sharded --layout-key codepoint '
+                       '-o ' + directory).write_all()
+        self.assertEqual(self.index(directory)['漢'], '6f/漢.svg')
+
+    def test_flat_has_no_index(self):
+        directory = os.path.join(self.tmp, 'out')
+        KanjiColorizer('-o ' + directory).write_all()
+        self.assertFalse(
+            os.path.exists(os.path.join(directory, INDEX_FILENAME)))
+
+    def test_shared_stylesheet_found_from_subdirectories(self):
+        directory = os.path.join(self.tmp, 'out')
+        KanjiColorizer('--output-layout sharded --depth 2 --color-output '
+                       'class --stylesheet k.css -o ' + directory).write_all()
+        for path, svg in self.written(directory).items():
+            self.assertIn(b'href="../../k.css"', svg)
+        self.assertTrue(os.path.exists(os.path.join(directory, 'k.css')))
+
+    def test_merge_shards(self):
+        directories = []
+        for i in range(1, 4):
+            directories.append(os.path.join(self.tmp, 'shard%d' % i))
+            KanjiColorizer('--output-layout sharded --shard %d/3 -o %s'
+                           % (i, directories[-1])).write_all()
+        merged = os.path.join(self.tmp, 'merged')
+        merge_shards(directories, merged)
+        unsharded = os.path.join(self.tmp, 'all')
+        KanjiColorizer('--output-layout sharded -o ' + unsharded).write_all()
+        self.assertEqual(self.written(merged), self.written(unsharded))
+        self.assertEqual(self.index(merged), self.index(unsharded))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_manifest.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.manifest import Manifest, ManifestError
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class ManifestOptionTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(ManifestOptionTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.output = os.path.join(self.tmp, 'out')
+
+    def write(self, args, name):
+        path = os.path.join(self.tmp, name)
+        kc = KanjiColorizer('-o %s --manifest %s %s'
+                            % (self.output, path, args))
+        kc.write_all()
+        return Manifest.load(path), kc
+
+    def test_lists_every_file(self):
+        for name in ['m.json', 'm.csv']:
+            manifest, kc = self.write('', name)
+            self.assertEqual(sorted(manifest.files),
+                             sorted(os.listdir(self.output)))
+            self.assertEqual(manifest.fingerprint, kc.settings_fingerprint())
+            manifest.verify(self.output)
+
+    def test_lists_stylesheet_and_index(self):
+        for name in ['m.json', 'm.csv']:
+            manifest, kc = self.write(
+                '--characters 漢字a --output-layout sharded '
+                '--color-output class --stylesheet k.css', name)
+            self.assertIn('k.css', manifest.files)
+            self.assertIn('index.json', manifest.files)
+            self.assertFalse(manifest.is_diagram('k.css'))
+            self.assertEqual(len([path for path in manifest.files
+                                  if manifest.is_diagram(path)]), 3)
+            written = [os.path.relpath(os.path.join(root, name),
+                                       self.output).replace(os.sep, '/')
+                       for root, dirs, files in os.walk(self.output)
+                       for name in files]
+            self.assertEqual(sorted(manifest.files), sorted(written))
+            manifest.verify(self.output)
+
+    def test_diff_sees_changed_stylesheet(self):
+        old, kc = self.write('--characters 漢 --color-output class '
+                             '--stylesheet k.css', 'old.json')
+        new, kc = self.write('--characters 漢 --color-output class '
+                             '--stylesheet k.css --mode contrast',
+                             'new.json')
+        self.assertIn('k.css', old.diff(new).changed)
+
+    def test_csv_same_as_json(self):
+        json_manifest, kc = self.write('', 'm.json')
+        csv_manifest, kc = self.write('', 'm.csv')
+        self.assertEqual(csv_manifest.files, json_manifest.files)
+        self.assertEqual(csv_manifest.fingerprint, json_manifest.fingerprint)
+
+    def test_no_manifest_by_default(self):
+        KanjiColorizer('-o ' + self.output).write_all()
+        self.assertFalse(any(name.startswith('manifest')
+                             for name in os.listdir(self.output)))
+
+    def test_diff_same_run_is_empty(self):
+        old, kc = self.write('', 'old.json')
+        new, kc = self.write('', 'new.csv')
+        self.assertEqual(old.diff(new), ([], [], []))
+
+    def test_diff_after_settings_change(self):
+        old, kc = self.write('--characters 漢字a', 'old.json')
+        new, kc = self.write('--characters 漢字木 --mode contrast',
+                             'new.json')
+        diff = old.diff(new)
+        self.assertEqual(diff.added, ['木.svg'])
+        self.assertEqual(diff.changed, ['字.svg', '漢.svg'])
+        self.assertEqual(diff.removed, ['a.svg'])
+
+    def test_diff_sees_code_filenames_as_different_files(self):
+        old, kc = self.write('--characters 漢', 'old.json')
+        new, kc = self.write('--characters 漢 --filename-mode code',
+                             'new.json')
+        self.assertEqual(old.diff(new), (['06f22.svg'], [], ['漢.svg']))
+
+    def test_bad_csv(self):
+        path = os.path.join(self.tmp, 'bad.csv')
+        with open(path, 'w') as f:
+            f.write('path,size\na.svg,6\n')
+        self.assertRaises(ManifestError, Manifest.load, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_memory.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Peak memory budgets, measured with tracemalloc, for the operations that
+go over the whole corpus.  The generator is run in memory-limited
+containers, so these are meant to catch leaks and anything that starts
+holding every file in memory at once.
+'''
+
+import gc
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from kanjicolorizer import colorizer
+from kanjicolorizer.colorizer import KanjiColorizer, KanjiVG, colorize
+from kanjicolorizer.tests.synthetic import (SyntheticCorpus,
+                                             SyntheticCorpusMixin)
+
+# Budgets in bytes.  They are a few times what was measured when they
+# were set, so that they only fail on real regressions.
+
+# get_all returns every svg, so it may use this many times the size of
+# the files (the strings are decoded, so can take more room than the
+# utf-8 on disk)
+GET_ALL_PER_SOURCE_BYTE = 3
+# anything that goes one file at a time, however big the corpus
+STREAMING_BUDGET = 512 * 1024
+# how much more a run over twice as many files may use
+GROWTH_BUDGET = 64 * 1024
+# rendering one large character with --group-mode
+GROUP_MODE_BUDGET = 256 * 1024
+# memory still held after colorize has been called many more times
+RETAINED_BUDGET = 64 * 1024
+
+
+def peak_memory(function, *args):
+    '''
+    Calls function and returns (peak, still allocated) in bytes of
+    memory allocated while it ran
+
+    >>> peak, current = peak_memory(lambda: [0] * 100000)
+    >>> peak >= 800000 > current
+    True
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(*args)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, current
+
+
+def corpus_of(count, strokes=12):
+    '''
+    A SyntheticCorpus of count characters with strokes strokes each
+    '''
+    return SyntheticCorpus(dict(
+        ((chr(0x4e00 + i), ''), {'strokes': strokes})
+        for i in range(count)))
+
+
+def source_bytes():
+    directory = colorizer.source_directory
+    return sum(os.path.getsize(os.path.join(directory, f))
+               for f in os.listdir(directory))
+
+
+class CorpusMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def measure(self, count, function):
+        with corpus_of(count):
+            function()  # warm up caches, imports, etc.
+            return peak_memory(function)
+
+    def write_all(self, output='out'):
+        output = os.path.join(self.tmp, output)
+        KanjiColorizer('-o ' + output).write_all()
+        shutil.rmtree(output)
+
+    def iterate(self):
+        for kanji in KanjiVG.iter_all():
+            pass
+
+    def test_get_all_within_budget(self):
+        with corpus_of(200):
+            total = source_bytes()
+            peak, _ = peak_memory(KanjiVG.get_all)
+        self.assertLess(peak, GET_ALL_PER_SOURCE_BYTE * total)
+
+    def test_iter_all_does_not_grow_with_corpus(self):
+        small, _ = self.measure(200, self.iterate)
+        large, _ = self.measure(400, self.iterate)
+        self.assertLess(large, STREAMING_BUDGET)
+        self.assertLess(large - small, GROWTH_BUDGET)
+
+    def test_write_all_does_not_grow_with_corpus(self):
+        small, _ = self.measure(200, self.write_all)
+        large, _ = self.measure(400, self.write_all)
+        self.assertLess(large, STREAMING_BUDGET)
+        self.assertLess(large - small, GROWTH_BUDGET)
+
+    def test_write_all_pipelined_within_budget(self):
+        def write_all():
+            output = os.path.join(self.tmp, 'out')
+            KanjiColorizer('--pipeline -o ' + output).write_all()
+            shutil.rmtree(output)
+        peak, _ = self.measure(400, write_all)
+        self.assertLess(peak, STREAMING_BUDGET)
+
+
+class RenderMemoryTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    corpus_characters = {('漢', ''): {'components': [
+        (chr(0x4e00 + i), 6) for i in range(8)]}}
+
+    def test_group_mode_within_budget(self):
+        kc = KanjiColorizer('--group-mode')
+        kc.get_colored_svg('漢')
+        kc.renderer()._cache.clear()
+        peak, _ = peak_memory(kc.get_colored_svg, '漢')
+        self.assertLess(peak, GROUP_MODE_BUDGET)
+
+    def test_repeated_colorize_does_not_leak(self):
+        def call(times):
+            for i in range(times):
+                colorize('漢')
+        call(200)
+        _, retained = peak_memory(call, 200)
+        _, retained_more = peak_memory(call, 1000)
+        self.assertLess(retained_more - retained, RETAINED_BUDGET)
+        self.assertLess(retained_more, STREAMING_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
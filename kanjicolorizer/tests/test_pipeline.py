@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_pipeline.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from mock import patch
+from kanjicolorizer import pipeline
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class PipelineRunTest(unittest.TestCase):
+
+    def test_keeps_order(self):
+        written = []
+        pipeline.run(range(100), str, written.append, 2, 2)
+        self.assertEqual(written, [str(n) for n in range(100)])
+
+    def test_empty_source(self):
+        written = []
+        stats = pipeline.run([], str, written.append)
+        self.assertEqual(written, [])
+        self.assertEqual([s.items for s in stats], [0, 0, 0])
+
+    def test_slow_writer_stalls_upstream_stages(self):
+        def slow_write(item):
+            time.sleep(0.01)
+        read, transform, write = pipeline.run(range(20), str, slow_write,
+                                              1, 1)
+        self.assertGreater(read.stall, 0.05)
+        self.assertGreater(write.busy, 0.15)
+
+    def test_slow_reader_stalls_downstream_stages(self):
+        def slow_source():
+            for n in range(10):
+                time.sleep(0.01)
+                yield n
+        read, transform, write = pipeline.run(slow_source(), str,
+                                              lambda item: None)
+        self.assertGreater(write.stall, 0.05)
+        self.assertGreater(read.busy, 0.05)
+
+    def assertStopsAndRaises(self, source, transform, sink):
+        before = threading.active_count()
+        with self.assertRaises(ValueError):
+            pipeline.run(source, transform, sink, 1, 1)
+        self.assertEqual(threading.active_count(), before)
+
+    def test_source_error_raised(self):
+        def source():
+            yield 1
+            raise ValueError()
+        self.assertStopsAndRaises(source(), str, lambda item: None)
+
+    def test_transform_error_raised(self):
+        def transform(item):
+            raise ValueError()
+        self.assertStopsAndRaises(range(100), transform, lambda item: None)
+
+    def test_sink_error_raised(self):
+        def sink(item):
+            raise ValueError()
+        self.assertStopsAndRaises(range(100), str, sink)
+
+
+class PipelinedWriteAllTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(PipelinedWriteAllTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write_all(self, directory, args=''):
+        output = os.path.join(self.tmp, directory)
+        stderr = io.StringIO()
+        with patch('sys.stderr', stderr):
+            KanjiColorizer('-o %s %s' % (output, args)).write_all()
+        files = {}
+        for name in os.listdir(output):
+            with open(os.path.join(output, name), 'rb') as f:
+                files[name] = f.read()
+        return files, stderr.getvalue()
+
+    def test_same_output_as_sequential(self):
+        sequential, _ = self.write_all('sequential')
+        pipelined, _ = self.write_all(
+            'pipelined', '--pipeline --read-ahead 1 --write-behind 2')
+        self.assertEqual(pipelined, sequential)
+
+    def test_reports_stage_stalls(self):
+        _, report = self.write_all('pipelined', '--pipeline')
+        for stage in ['read', 'transform', 'write']:
+            self.assertRegex(report, stage + r' .*stalled \d')
+
+    def test_counts_invalid_characters(self):
+        files, report = self.write_all('pipelined',
+                                       '--pipeline --characters 漢Л')
+        self.assertEqual(list(files), ['漢.svg'])
+        self.assertIn('skipped 1 invalid', report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_prerendered.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from kanjicolorizer.colorizer import (KanjiColorizer, Renderer,
+                                      RenderSettings, InvalidCharacterError)
+from kanjicolorizer.prerendered import PrerenderedStore, build_store
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class PrerenderedTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(PrerenderedTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'prerendered.bin')
+        self.count = build_store(self.path)
+
+    def test_byte_identical(self):
+        store = PrerenderedStore(self.path)
+        self.assertEqual(len(store), self.count)
+        self.assertEqual(self.count, len(self.corpus.characters))
+        renderer = Renderer()
+        for character, variant in self.corpus.characters:
+            self.assertEqual(store.get(character, variant),
+                             renderer.render_bytes(character, variant))
+
+    def test_smaller_than_diagrams(self):
+        renderer = Renderer()
+        total = sum(len(renderer.render_bytes(*key))
+                    for key in self.corpus.characters)
+        self.assertLess(os.path.getsize(self.path), total / 2)
+
+    def test_renderer_copies(self):
+        renderer = Renderer(prerendered=self.path)
+        self.assertEqual(renderer.render_bytes('字', 'Kaisho'),
+                         Renderer().render_bytes('字', 'Kaisho'))
+        self.assertEqual(renderer.stats.prerendered_hits, 1)
+        self.assertEqual(renderer.stats.rendered, 0)
+
+    def test_renderer_falls_back(self):
+        # characters added to the data after the store was made, and
+        # characters there is no data for, work as they do without it
+        self.corpus.write('本', strokes=5)
+        renderer = Renderer(prerendered=self.path)
+        self.assertEqual(renderer.render('本'), Renderer().render('本'))
+        self.assertEqual(renderer.stats.rendered, 1)
+        self.assertRaises(InvalidCharacterError, renderer.render, 'Л')
+
+    def test_other_settings_ignore_it(self):
+        settings = RenderSettings(mode='contrast')
+        renderer = Renderer(settings, prerendered=self.path)
+        self.assertEqual(renderer.render('漢'), Renderer(settings).render('漢'))
+        self.assertEqual(renderer.stats.prerendered_hits, 0)
+
+    def test_kanji_colorizer_option(self):
+        kc = KanjiColorizer('--prerendered ' + self.path)
+        kc.get_colored_svg('漢')
+        self.assertEqual(kc.renderer().stats.prerendered_hits, 1)
+        kc.settings.prerendered = None
+        self.assertIsNone(kc.renderer().prerendered_path)
+
+    def test_write_all_copies(self):
+        outputs = []
+        for args in ['', '--prerendered ' + self.path]:
+            output = tempfile.mkdtemp(dir=self.directory)
+            kc = KanjiColorizer('--characters 漢字a -o %s %s'
+                                % (output, args))
+            kc.write_all()
+            outputs.append(dict(
+                (name, open(os.path.join(output, name), 'rb').read())
+                for name in os.listdir(output)))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(kc.stats.rendered, 0)
+        self.assertEqual(kc.stats.prerendered_hits, 3)
+
+    def test_not_a_store(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'<svg/>\n')
+        self.assertRaises(ValueError, PrerenderedStore, self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_prewarm.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from mock import patch
+from kanjicolorizer.colorizer import (KanjiColorizer, Renderer,
+                                      RenderSettings, InvalidCharacterError)
+from kanjicolorizer.prewarm import Prewarm, prewarm
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class DiskCacheTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(DiskCacheTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_survives_new_renderer(self):
+        svg = Renderer(cache_directory=self.tmp).render('漢')
+        renderer = Renderer(cache_directory=self.tmp)
+        with patch('kanjicolorizer.colorizer.KanjiVG') as kanjivg:
+            self.assertEqual(renderer.render('漢'), svg)
+        self.assertFalse(kanjivg.called)
+        self.assertEqual(renderer.stats.disk_cache_hits, 1)
+        self.assertEqual(renderer.stats.rendered, 0)
+
+    def test_settings_kept_apart(self):
+        Renderer(cache_directory=self.tmp).render('漢')
+        contrast = Renderer(RenderSettings(mode='contrast'),
+                            cache_directory=self.tmp)
+        contrast.render('漢')
+        self.assertEqual(contrast.stats.disk_cache_hits, 0)
+        self.assertEqual(len(os.listdir(self.tmp)), 2)
+
+    def test_variant_file(self):
+        renderer = Renderer(cache_directory=self.tmp)
+        renderer.render('字', 'Kaisho')
+        directory, = os.listdir(self.tmp)
+        self.assertEqual(os.listdir(os.path.join(self.tmp, directory)),
+                         ['05b57-Kaisho.svg'])
+
+    def test_invalid_keys(self):
+        renderer = Renderer(cache_directory=self.tmp)
+        for key in [('ab', ''), ('', ''), ('a', '../../x')]:
+            self.assertRaises(InvalidCharacterError, renderer.render, *key)
+        self.assertEqual(renderer.stats.invalid, 3)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_cache_dir_option(self):
+        kc = KanjiColorizer('--cache-dir ' + self.tmp)
+        self.assertEqual(kc.renderer().cache_directory, self.tmp)
+        kc.get_colored_svg('a')
+        self.assertEqual(len(os.listdir(self.tmp)), 1)
+
+
+class PrewarmTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(PrewarmTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.list_path = os.path.join(self.tmp, 'frequency.txt')
+        with open(self.list_path, 'w', encoding='utf-8') as f:
+            f.write('木\t900\n漢\t800\n字\t700\nЛ\t600\na\t500\n')
+
+    def test_top(self):
+        renderer = Renderer()
+        self.assertEqual(prewarm(renderer, '木漢字Лa', top=2), 2)
+        self.assertEqual(set(renderer._cache), {('木', ''), ('漢', '')})
+
+    def test_budget(self):
+        renderer = Renderer()
+
+        def slow_render(character, variant=''):
+            time.sleep(0.05)
+        renderer.render_bytes = slow_render
+        self.assertLess(prewarm(renderer, '木漢字a' * 10, budget=0.12), 5)
+
+    def test_cancel(self):
+        renderer = Renderer()
+        job = Prewarm(renderer, ['木'] * 100000)
+        job.cancel()
+        self.assertTrue(job.wait(5))
+        self.assertLess(job.warmed, 100000)
+
+    def test_prewarm_at_construction(self):
+        kc = KanjiColorizer('--prewarm %s --prewarm-top 3' % self.list_path)
+        self.assertTrue(kc.prewarming.wait(5))
+        self.assertEqual(kc.prewarming.warmed, 3)
+        kc.get_colored_svg('漢')
+        self.assertEqual(kc.renderer().stats.cache_hits, 1)
+
+    def test_prewarm_skips_invalid(self):
+        kc = KanjiColorizer('')
+        self.assertEqual(kc.prewarm(['Л', 'a'], background=False), 1)
+
+    def test_bad_line_with_disk_cache(self):
+        with open(self.list_path, 'a', encoding='utf-8') as f:
+            f.write('ab-x\n')
+        kc = KanjiColorizer('--cache-dir %s --prewarm %s'
+                            % (os.path.join(self.tmp, 'cache'),
+                               self.list_path))
+        self.assertTrue(kc.prewarming.wait(5))
+        self.assertEqual(kc.prewarming.warmed, 4)
+
+    def test_warmed_set_after_error(self):
+        with patch('kanjicolorizer.prewarm.prewarm',
+                   side_effect=RuntimeError('broken')), \
+                patch('threading.excepthook'):
+            job = Prewarm(Renderer(), ['a'])
+            self.assertTrue(job.wait(5))
+        self.assertEqual(job.warmed, 0)
+
+    def test_doesnt_decode(self):
+        renderer = Renderer()
+        with patch.object(renderer, 'render') as render:
+            self.assertEqual(prewarm(renderer, '木漢'), 2)
+        self.assertFalse(render.called)
+
+    def check_cl_args(self, args):
+        with patch('sys.argv', ['kanji_colorize.py'] + args.split()):
+            kc = KanjiColorizer('')
+            kc.read_cl_args()
+        return kc
+
+    def test_command_line_needs_cache_dir(self):
+        with patch('sys.stderr'):
+            self.assertRaises(SystemExit, self.check_cl_args,
+                              '--prewarm ' + self.list_path)
+
+    def test_command_line_rejects_characters(self):
+        cache = os.path.join(self.tmp, 'cache')
+        for option in ['--characters 漢', '--charset grade1',
+                       '--characters-file ' + self.list_path]:
+            with patch('sys.stderr'):
+                self.assertRaises(
+                    SystemExit, self.check_cl_args,
+                    '--prewarm %s --cache-dir %s %s'
+                    % (self.list_path, cache, option))
+
+    def test_command_line_prewarm(self):
+        kc = self.check_cl_args('--prewarm %s --cache-dir %s'
+                                % (self.list_path,
+                                   os.path.join(self.tmp, 'cache')))
+        self.assertTrue(kc.prewarming.wait(5))
+        self.assertEqual(kc.prewarming.warmed, 4)
+
+    def test_prewarm_fills_disk_cache(self):
+        cache = os.path.join(self.tmp, 'cache')
+        kc = KanjiColorizer('--cache-dir %s --prewarm %s'
+                            % (cache, self.list_path))
+        kc.prewarming.wait(5)
+        directory, = os.listdir(cache)
+        self.assertEqual(len(os.listdir(os.path.join(cache, directory))), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
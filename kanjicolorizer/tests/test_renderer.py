@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_renderer.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import collections
+import threading
+import time
+import unittest
+import xml.dom.minidom
+from concurrent.futures import ThreadPoolExecutor
+from mock import patch
+from kanjicolorizer import colorizer
+from kanjicolorizer.colorizer import (KanjiColorizer, Renderer,
+                                      RenderSettings)
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class RendererTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def test_same_output_as_kanji_colorizer(self):
+        kc = KanjiColorizer('--mode contrast --image-size 200')
+        renderer = Renderer(RenderSettings.from_namespace(kc.settings))
+        self.assertEqual(
+            renderer.render('漢'),
+            kc._modify_svg(colorizer.KanjiVG('漢').svg))
+
+    def test_renders_variants(self):
+        svg = Renderer().render('字', 'Kaisho')
+        self.assertIn('kvg:StrokePaths_05b57-Kaisho', svg)
+
+    def test_invalid_character_raises(self):
+        self.assertRaises(colorizer.InvalidCharacterError,
+                          Renderer().render, 'Л')
+
+    def test_settings_cant_be_changed(self):
+        renderer = Renderer()
+        with self.assertRaises(AttributeError):
+            renderer.settings.mode = 'contrast'
+        with self.assertRaises(AttributeError):
+            renderer.settings = RenderSettings(mode='contrast')
+
+    def test_cache_is_bounded(self):
+        renderer = Renderer(cache_size=2)
+        for character in 'a木休':
+            renderer.render(character)
+        self.assertEqual(len(renderer._cache), 2)
+        self.assertNotIn(('a', ''), renderer._cache)
+
+    def test_errors_arent_cached(self):
+        renderer = Renderer()
+        with patch.object(colorizer, 'KanjiVG',
+                          side_effect=IOError(31, 'Permission denied')):
+            self.assertRaises(IOError, renderer.render, 'a')
+        self.assertIn('00061', renderer.render('a'))
+
+
+class CompoundTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def test_is_well_formed(self):
+        svg = Renderer().render_compound_bytes('漢字休')
+        root = xml.dom.minidom.parseString(svg).documentElement
+        self.assertEqual(root.getAttribute('viewBox'), '0 0 981 327')
+        translates = [g.getAttribute('transform')
+                      for g in root.childNodes
+                      if getattr(g, 'tagName', None) == 'g']
+        self.assertEqual(translates, ['translate(0,0)', 'translate(327,0)',
+                                      'translate(654,0)'])
+
+    def test_contains_each_diagram(self):
+        renderer = Renderer()
+        svg = renderer.render_compound('漢字')
+        for character in '漢字':
+            diagram = renderer.render(character)
+            self.assertIn(diagram[diagram.index('<svg '):].rstrip(), svg)
+
+    def test_one_notice_and_stylesheet_link(self):
+        kc = KanjiColorizer('--color-output class --stylesheet k.css')
+        svg = kc.get_compound_svg('漢字')
+        self.assertEqual(svg.count('Copyright (C)'), 1)
+        self.assertEqual(svg.count('<?xml-stylesheet'), 1)
+
+    def test_variants_and_repeats(self):
+        renderer = Renderer()
+        svg = renderer.render_compound([('字', 'Kaisho'), '字', '字'])
+        self.assertIn('kvg:StrokePaths_05b57-Kaisho', svg)
+        self.assertEqual(renderer.stats.rendered, 2)
+        self.assertEqual(renderer.stats.cache_hits, 1)
+
+    def test_invalid_character_raises(self):
+        for characters in ['漢Л', '']:
+            self.assertRaises(colorizer.InvalidCharacterError,
+                              Renderer().render_compound, characters)
+
+
+class ColorizeManyTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def test_results_and_errors(self):
+        results = list(colorizer.colorize_many(['漢', ('字', 'Kaisho'), 'Л']))
+        self.assertEqual([key for key, result in results],
+                         [('漢', ''), ('字', 'Kaisho'), ('Л', '')])
+        self.assertEqual(results[0][1], Renderer().render('漢'))
+        self.assertIn('05b57-Kaisho', results[1][1])
+        error = results[2][1]
+        self.assertIsInstance(error, colorizer.InvalidCharacterError)
+        self.assertEqual(error.args, ('Л', ''))
+
+    def test_settings(self):
+        settings = RenderSettings(mode='contrast', image_size=100)
+        (key, svg), = colorizer.colorize_many('漢', settings)
+        self.assertEqual(svg, Renderer(settings).render('漢'))
+
+    def test_shares_renderer(self):
+        renderer = Renderer()
+        list(colorizer.colorize_many('漢字漢', renderer=renderer))
+        list(colorizer.colorize_many('漢', renderer=renderer))
+        self.assertEqual(renderer.stats.rendered, 2)
+        self.assertEqual(renderer.stats.cache_hits, 2)
+
+    def test_other_errors_dont_stop_the_batch(self):
+        renderer = Renderer()
+        original = renderer.render
+
+        def render(character, variant=''):
+            if character == '字':
+                raise IOError(31, 'Permission denied')
+            return original(character, variant)
+        renderer.render = render
+        results = dict(colorizer.colorize_many('漢字木', renderer=renderer))
+        self.assertIsInstance(results[('字', '')], IOError)
+        self.assertIn('kvg:', results[('木', '')])
+
+    def test_threads_ordered(self):
+        characters = list('a漢字休木あЛ') * 5
+        results = colorizer.colorize_many(characters, threads=4)
+        self.assertEqual([key[0] for key, result in results], characters)
+
+    def test_threads_unordered(self):
+        renderer = Renderer()
+        original = renderer.render
+
+        def render(character, variant=''):
+            if character == '漢':
+                time.sleep(0.2)
+            return original(character, variant)
+        renderer.render = render
+        results = list(colorizer.colorize_many(
+            '漢字休', threads=3, ordered=False, renderer=renderer))
+        self.assertEqual(sorted(key[0] for key, result in results),
+                         sorted('漢字休'))
+        self.assertEqual(results[-1][0], ('漢', ''))
+
+    def test_stop_event(self):
+        stop = threading.Event()
+        seen = []
+        for key, svg in colorizer.colorize_many('a漢字休木', stop=stop):
+            seen.append(key)
+            stop.set()
+        self.assertEqual(seen, [('a', '')])
+
+    def test_closing_stops_rendering(self):
+        renderer = Renderer()
+        results = colorizer.colorize_many(
+            iter(list('a漢字休木あ') * 100), threads=2, renderer=renderer)
+        next(results)
+        results.close()
+        time.sleep(0.1)
+        self.assertLess(renderer.stats.cache_misses +
+                        renderer.stats.cache_hits, 600)
+
+    def test_as_bytes(self):
+        (key, svg), = colorizer.colorize_many('漢', as_bytes=True)
+        self.assertIsInstance(svg, bytes)
+
+
+class RendererConcurrencyTest(SyntheticCorpusMixin, unittest.TestCase):
+    '''
+    Stress tests for sharing one Renderer between threads
+    '''
+
+    THREADS = 16
+
+    def setUp(self):
+        super(RendererConcurrencyTest, self).setUp()
+        self.renderer = Renderer()
+        self.renders = collections.Counter()
+        original = self.renderer._modify_svg
+
+        def slow_modify_svg(svg):
+            # long enough for every thread to ask before it finishes
+            time.sleep(0.05)
+            self.renders[svg] += 1
+            return original(svg)
+        self.renderer._modify_svg = slow_modify_svg
+
+    def render_concurrently(self, keys):
+        start = threading.Barrier(len(keys))
+
+        def render(key):
+            start.wait()
+            return self.renderer.render(*key)
+        with ThreadPoolExecutor(len(keys)) as pool:
+            return list(pool.map(render, keys))
+
+    def test_identical_requests_render_once(self):
+        results = self.render_concurrently([('漢', '')] * self.THREADS)
+        self.assertEqual(sum(self.renders.values()), 1)
+        self.assertEqual(len(set(results)), 1)
+
+    def test_different_requests_all_render(self):
+        keys = [('漢', ''), ('字', ''), ('字', 'Kaisho'), ('休', '')] * 4
+        results = self.render_concurrently(keys)
+        self.assertEqual(sum(self.renders.values()), 4)
+        for key, svg in zip(keys, results):
+            self.assertEqual(svg, self.renderer.render(*key))
+
+    def test_waiting_threads_get_the_error(self):
+        errors = []
+
+        def render():
+            try:
+                self.renderer.render('Л')
+            except colorizer.InvalidCharacterError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=render)
+                   for i in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(errors), self.THREADS)
+
+    def test_many_mixed_requests(self):
+        keys = [(c, '') for c in 'a漢字休木あ'] * 50
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            results = list(pool.map(lambda k: self.renderer.render(*k), keys))
+        self.assertEqual(sum(self.renders.values()), 6)
+        self.assertEqual(len(set(results)), 6)
+        self.assertEqual(self.renderer._in_flight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
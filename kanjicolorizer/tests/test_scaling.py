@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_scaling.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Checks that every stage of _modify_svg takes time in proportion to the
+size of its input, using synthetic svgs much bigger than any in
+KanjiVG, so that odd user-supplied data can't make rendering
+pathologically slow.
+
+Big strings are slower to work with per character than small ones
+(they don't fit in the processor's caches, and the memory for them is
+new), so each stage's slowdown on the big input is compared with that
+of a plain copy of the same input, which is linear.
+'''
+
+import time
+import unittest
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.tests.synthetic import make_large_svg
+
+# the big input is this many times the small one
+GROWTH = 8
+
+# how much more a stage may slow down than copying does; a linear stage
+# is close to 1, a quadratic one close to GROWTH
+LIMIT = 3
+
+SMALL = 250
+
+SHAPES = {
+    'many strokes': {},
+    'deep nesting': {'depth': 12},
+    'huge stroke numbers': {'text_size': 2000},
+}
+
+# settings that change how the svg is colored; the other stages are
+# only checked with the default settings
+SETTINGS = ['--group-mode', '--color-output class',
+            '--color-output class --group-mode', '--grid 4x4diag']
+
+
+def best_time(function, argument, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def copy(svg):
+    return svg.encode('utf-8').decode('utf-8')
+
+
+def stages(kc):
+    return {
+        'stroke count': kc._stroke_count,
+        'color': kc._color_svg,
+        'remove strokes': kc._remove_strokes,
+        'grid': kc._add_grid,
+        'resize': kc._resize_svg,
+        'style': lambda svg: kc._style_svg(svg, 3),
+        'copyright': kc._comment_copyright,
+        'all': kc._modify_svg,
+    }
+
+
+class ScalingTest(unittest.TestCase):
+
+    def slowdown(self, function, small, big):
+        function(big)  # warm up regular expression caches
+        return best_time(function, big) / best_time(function, small)
+
+    def check_stages(self, args, names=None):
+        kc = KanjiColorizer(args)
+        for shape, kwargs in sorted(SHAPES.items()):
+            small = make_large_svg(SMALL, **kwargs)
+            big = make_large_svg(SMALL * GROWTH, **kwargs)
+            linear = self.slowdown(copy, small, big)
+            for stage, function in sorted(stages(kc).items()):
+                if names is not None and stage not in names:
+                    continue
+                with self.subTest(shape=shape, settings=args, stage=stage):
+                    self.assertLess(
+                        self.slowdown(function, small, big) / linear, LIMIT)
+
+    def test_stages_scale_linearly(self):
+        self.check_stages('')
+
+    def test_coloring_scales_linearly_with_any_settings(self):
+        for args in SETTINGS:
+            self.check_stages(args, ['color', 'all'])
+
+    def test_large_input_is_fully_processed(self):
+        svg = make_large_svg(SMALL * GROWTH, depth=3)
+        result = KanjiColorizer('')._modify_svg(svg)
+        self.assertEqual(result.count('style="stroke: #'), SMALL * GROWTH)
+        self.assertEqual(result.count('style="fill: #'), SMALL * GROWTH)
+
+    def test_group_mode_colors_outermost_groups(self):
+        svg = make_large_svg(SMALL, depth=4)
+        result = KanjiColorizer('--group-mode')._modify_svg(svg)
+        self.assertEqual(result.count('<g style="stroke: #'), SMALL)
+        self.assertNotIn('<text', result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_shards.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.manifest import Manifest, ManifestError
+from kanjicolorizer.shards import merge_shards, shard_of
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+SHARDS = 3
+
+
+class ShardOfTest(unittest.TestCase):
+
+    def test_every_character_in_exactly_one_shard(self):
+        for codepoint in range(0x4e00, 0x4e00 + 500):
+            shard = shard_of(chr(codepoint), '', SHARDS)
+            self.assertTrue(1 <= shard <= SHARDS)
+
+    def test_uses_all_shards(self):
+        shards = set(shard_of(chr(c), '', SHARDS)
+                     for c in range(0x4e00, 0x4e00 + 500))
+        self.assertEqual(shards, set(range(1, SHARDS + 1)))
+
+    def test_variant_is_part_of_the_key(self):
+        shards = set(shard_of('字', v, 16) for v in ['', 'Kaisho', 'Vt2'])
+        self.assertGreater(len(shards), 1)
+
+
+class ShardedWriteAllTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(ShardedWriteAllTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write_shards(self, extra_args=''):
+        directories = []
+        for i in range(1, SHARDS + 1):
+            directory = os.path.join(self.tmp, 'shard%d' % i)
+            KanjiColorizer('--shard %d/%d -o %s %s' % (
+                i, SHARDS, directory, extra_args)).write_all()
+            directories.append(directory)
+        return directories
+
+    def svgs(self, directory):
+        return sorted(f for f in os.listdir(directory) if f.endswith('.svg'))
+
+    def test_shards_write_disjoint_subsets_of_everything(self):
+        written = []
+        for directory in self.write_shards():
+            written.extend(self.svgs(directory))
+        unsharded = os.path.join(self.tmp, 'all')
+        KanjiColorizer('-o ' + unsharded).write_all()
+        self.assertEqual(sorted(written), self.svgs(unsharded))
+
+    def test_shards_with_characters_option(self):
+        written = []
+        for directory in self.write_shards('--characters 漢字木'):
+            written.extend(self.svgs(directory))
+        self.assertEqual(sorted(written), ['字.svg', '木.svg', '漢.svg'])
+
+    def test_shard_writes_manifest(self):
+        directory = self.write_shards()[0]
+        manifest = Manifest.load(
+            os.path.join(directory, 'manifest-shard-1-of-3.json'))
+        self.assertEqual(manifest.shard, (1, SHARDS))
+        self.assertEqual(sorted(manifest.files), self.svgs(directory))
+        manifest.verify(directory)
+
+    def test_adding_characters_doesnt_move_others(self):
+        before = [set(self.svgs(d)) for d in self.write_shards()]
+        self.corpus.write('本', strokes=5)
+        for directory in os.listdir(self.tmp):
+            shutil.rmtree(os.path.join(self.tmp, directory))
+        after = [set(self.svgs(d)) for d in self.write_shards()]
+        for old, new in zip(before, after):
+            self.assertEqual(new - {'本.svg'}, old)
+
+    def test_merge_combines_all_shards(self):
+        output = os.path.join(self.tmp, 'merged')
+        merged = merge_shards(self.write_shards(), output)
+        self.assertEqual(len(merged.files), len(self.corpus.characters))
+        self.assertEqual(self.svgs(output), sorted(merged.files))
+        Manifest.load(os.path.join(output, 'manifest.json')).verify(output)
+
+    def test_merge_sharded_layout(self):
+        output = os.path.join(self.tmp, 'merged')
+        merged = merge_shards(self.write_shards('--output-layout sharded'),
+                              output)
+        self.assertEqual([path for path in merged.files
+                          if not merged.is_diagram(path)], ['index.json'])
+        self.assertEqual(len(merged.files), len(self.corpus.characters) + 1)
+        merged.verify(output)
+
+    def test_merge_copies_stylesheet(self):
+        output = os.path.join(self.tmp, 'merged')
+        directories = self.write_shards('--color-output class '
+                                        '--stylesheet k.css')
+        merged = merge_shards(directories, output)
+        self.assertFalse(merged.is_diagram('k.css'))
+        with open(os.path.join(directories[0], 'k.css')) as f:
+            stylesheet = f.read()
+        with open(os.path.join(output, 'k.css')) as f:
+            self.assertEqual(f.read(), stylesheet)
+        for svg in self.svgs(output):
+            with open(os.path.join(output, svg), encoding='utf-8') as f:
+                scope = re.search(r'class="(n\d+)"', f.read()).group(1)
+            self.assertIn('.%s .s1 ' % scope, stylesheet)
+        merged.verify(output)
+
+    def test_merge_rejects_different_stylesheets(self):
+        directories = self.write_shards('--color-output class '
+                                        '--stylesheet k.css')
+        # as if shard 2 had been written from other data
+        with open(os.path.join(directories[1], 'k.css'), 'a') as f:
+            f.write('/* edited */\n')
+        manifest = os.path.join(directories[1],
+                                'manifest-shard-2-of-%d.json' % SHARDS)
+        loaded = Manifest.load(manifest)
+        with open(os.path.join(directories[1], 'k.css'), 'rb') as f:
+            loaded.add_file('k.css', f.read())
+        loaded.save(manifest)
+        with self.assertRaisesRegex(ManifestError, 'k.css is different'):
+            merge_shards(directories, os.path.join(self.tmp, 'merged'))
+
+    def test_merge_with_cli_settings(self):
+        output = os.path.join(self.tmp, 'merged')
+        directories = self.write_shards()
+        kc = KanjiColorizer('--merge-shards %s -o %s'
+                            % (' '.join(directories), output))
+        kc.merge_shards()
+        self.assertEqual(len(self.svgs(output)), len(self.corpus.characters))
+
+    def test_merge_rejects_missing_shard(self):
+        directories = self.write_shards()
+        with self.assertRaisesRegex(ManifestError, 'missing shard.*2/3'):
+            merge_shards([directories[0], directories[2]],
+                         os.path.join(self.tmp, 'merged'))
+
+    def test_merge_rejects_changed_file(self):
+        directories = self.write_shards()
+        svg = os.path.join(directories[0], self.svgs(directories[0])[0])
+        with open(svg, 'a') as f:
+            f.write('<!-- edited -->')
+        with self.assertRaisesRegex(ManifestError, 'does not match'):
+            merge_shards(directories, os.path.join(self.tmp, 'merged'))
+
+    def test_merge_rejects_mixed_settings(self):
+        directories = self.write_shards()
+        shutil.rmtree(directories[1])
+        KanjiColorizer('--mode contrast --shard 2/%d -o %s'
+                       % (SHARDS, directories[1])).write_all()
+        with self.assertRaisesRegex(ManifestError, 'different settings'):
+            merge_shards(directories, os.path.join(self.tmp, 'merged'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_startup.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+
+'''
+Checks that one-shot uses start quickly: importing the module and
+rendering a diagram with colorize() or a Renderer shouldn't load what
+only the command line needs, and writing a few given characters
+shouldn't look through the whole data directory.
+'''
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from mock import patch
+from kanjicolorizer import colorizer
+from kanjicolorizer.colorizer import KanjiColorizer
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+# modules that only parsing settings or writing files need
+DEFERRED = ['argparse', 'hashlib', 'json']
+
+# seconds for a new interpreter to import the module and render one
+# diagram; far more than it should take, so only a big regression fails
+BUDGET = 1.0
+
+SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import kanjicolorizer.colorizer
+imported = sorted(sys.modules)
+kanjicolorizer.colorizer.colorize('a')
+elapsed = time.perf_counter() - start
+rendered = sorted(sys.modules)
+import json
+print(json.dumps([imported, rendered, elapsed]))
+'''
+
+
+def run_fresh():
+    '''
+    Runs SCRIPT in a new interpreter and returns the modules loaded
+    after the import, those loaded after rendering, and the time taken
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT],
+                                     cwd=ROOT, env=env)
+    return json.loads(output.decode('utf-8'))
+
+
+class FreshInterpreterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.imported, cls.rendered, cls.elapsed = run_fresh()
+
+    def test_import_defers_modules(self):
+        for name in DEFERRED + ['colorsys']:
+            self.assertNotIn(name, self.imported)
+
+    def test_render_defers_modules(self):
+        for name in DEFERRED:
+            self.assertNotIn(name, self.rendered)
+
+    def test_within_budget(self):
+        self.assertLess(self.elapsed, BUDGET)
+
+
+class GivenCharactersTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(GivenCharactersTest, self).setUp()
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def test_write_all_doesnt_list_data(self):
+        kc = KanjiColorizer('--characters 漢字 -o ' + self.output)
+        listdir = os.listdir
+        with patch.object(colorizer.os, 'listdir') as mock_listdir:
+            mock_listdir.side_effect = listdir
+            kc.write_all()
+        listed = [call[0][0] for call in mock_listdir.call_args_list]
+        self.assertNotIn(colorizer.source_directory, listed)
+        self.assertEqual(sorted(listdir(self.output)), ['字.svg', '漢.svg'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_stats.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from mock import patch
+from kanjicolorizer import colorizer
+from kanjicolorizer.colorizer import KanjiColorizer, Renderer
+from kanjicolorizer.stats import RunStats
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+class RunStatsTest(unittest.TestCase):
+
+    def test_latency_buckets_are_cumulative(self):
+        stats = RunStats()
+        for seconds in [0.0001, 0.003, 0.003, 5]:
+            stats.observe_latency(seconds)
+        buckets = stats.to_json()['latency_seconds']['buckets']
+        self.assertEqual(buckets['0.0005'], 1)
+        self.assertEqual(buckets['0.0025'], 1)
+        self.assertEqual(buckets['0.005'], 3)
+        self.assertEqual(buckets['1.0'], 3)
+        self.assertEqual(buckets['+Inf'], 4)
+
+    def test_stop_freezes_times(self):
+        stats = RunStats()
+        stats.stop()
+        self.assertEqual(stats.wall_time, stats.wall_time)
+        self.assertEqual(stats.cpu_time, stats.cpu_time)
+
+    def test_keeps_limited_invalid_examples(self):
+        stats = RunStats()
+        for i in range(1000):
+            stats.add_invalid(chr(0x400 + i), '')
+        self.assertEqual(stats.invalid, 1000)
+        self.assertEqual(len(stats.invalid_characters), 100)
+
+    def test_prometheus_format(self):
+        stats = RunStats()
+        stats.count('rendered', 3)
+        stats.observe_latency(0.01)
+        text = stats.to_prometheus()
+        self.assertIn('kanjicolorizer_rendered_total 3\n', text)
+        self.assertIn('kanjicolorizer_latency_seconds_bucket{le="+Inf"} 1\n',
+                      text)
+        self.assertIn('kanjicolorizer_latency_seconds_count 1\n', text)
+        for line in text.splitlines():
+            if not line.startswith('#'):
+                self.assertRegex(line, r'^[a-z_]+(\{[a-z]+="[^"]*"\})? \S+$')
+
+    def test_prometheus_prefix(self):
+        text = RunStats().to_prometheus(prefix='kc')
+        self.assertIn('kc_rendered_total 0', text)
+
+
+class WriteAllStatsTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(WriteAllStatsTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write_all(self, args):
+        kc = KanjiColorizer('-o %s %s' % (os.path.join(self.tmp, 'out'),
+                                          args))
+        with patch('sys.stderr', io.StringIO()):
+            kc.write_all()
+        return kc.stats
+
+    def test_counts(self):
+        stats = self.write_all('--characters 漢,木,木,Л,字-Kaisho')
+        self.assertEqual(stats.rendered, 3)
+        self.assertEqual(stats.skipped, 1)
+        self.assertEqual(stats.invalid, 1)
+        self.assertEqual(sum(stats.latency_counts), 3)
+
+    def test_bytes_written_matches_files(self):
+        stats = self.write_all('--characters 漢木')
+        output = os.path.join(self.tmp, 'out')
+        self.assertEqual(stats.bytes_written, sum(
+            os.path.getsize(os.path.join(output, f))
+            for f in os.listdir(output)))
+
+    def test_bytes_read_matches_sources(self):
+        stats = self.write_all('--characters 漢木')
+        self.assertEqual(stats.bytes_read, sum(
+            os.path.getsize(os.path.join(colorizer.source_directory, f))
+            for f in ['06f22.svg', '06728.svg']))
+
+    def test_stats_json_option(self):
+        path = os.path.join(self.tmp, 'stats.json')
+        self.write_all('--characters 漢Л --stats-json ' + path)
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual(data['rendered'], 1)
+        self.assertEqual(data['invalid'], 1)
+        self.assertGreater(data['wall_time_seconds'], 0)
+        self.assertIn('cpu_time_seconds', data)
+
+    def test_pipeline_stages_included(self):
+        stats = self.write_all('--characters 漢木 --pipeline')
+        self.assertEqual([s.name for s in stats.stages],
+                         ['read', 'transform', 'write'])
+        self.assertIn('stall_seconds', stats.to_json()['stages']['read'])
+        self.assertIn('kanjicolorizer_stage_stall_seconds{stage="write"}',
+                      stats.to_prometheus())
+
+
+class RendererStatsTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def test_cache_hits_and_misses(self):
+        renderer = Renderer()
+        for character in '漢漢漢木':
+            renderer.render(character)
+        self.assertEqual(renderer.stats.cache_misses, 2)
+        self.assertEqual(renderer.stats.cache_hits, 2)
+        self.assertEqual(renderer.stats.rendered, 2)
+        self.assertEqual(renderer.stats.cache_hit_rate, 0.5)
+
+    def test_invalid_counted(self):
+        renderer = Renderer()
+        self.assertRaises(colorizer.InvalidCharacterError,
+                          renderer.render, 'Л')
+        self.assertEqual(renderer.stats.invalid, 1)
+        self.assertEqual(renderer.stats.rendered, 0)
+
+    def test_kanji_colorizer_renderer_stats(self):
+        kc = KanjiColorizer('')
+        kc.get_colored_svg('漢')
+        kc.get_colored_svg('漢')
+        text = kc.renderer().stats.to_prometheus()
+        self.assertTrue(re.search(r'cache_hits_total 1\b', text))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_worker.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import unittest
+from kanjicolorizer.worker import DebouncedWorker
+from kanjicolorizer.tests.fakeanki import MainThread
+
+
+class DebouncedWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.main = MainThread()
+        self.worker = DebouncedWorker(self.main.run_on_main, delay=0.02)
+        self.results = []
+        self.calls = []
+
+    def work(self, value):
+        def work():
+            self.calls.append(value)
+            return value
+        return work
+
+    def test_submit_returns_immediately(self):
+        def slow():
+            time.sleep(0.2)
+        start = time.perf_counter()
+        self.worker.submit('note', slow, self.results.append)
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.main.run_until_idle(self.worker)
+
+    def test_result_delivered_on_main_thread(self):
+        self.worker.submit('note', self.work(1), self.results.append)
+        time.sleep(0.1)
+        self.assertEqual(self.results, [])
+        self.main.run_until_idle(self.worker)
+        self.assertEqual(self.results, [1])
+
+    def test_rapid_submissions_debounced(self):
+        for i in range(5):
+            self.worker.submit('note', self.work(i), self.results.append)
+        self.main.run_until_idle(self.worker)
+        self.assertEqual(self.calls, [4])
+        self.assertEqual(self.results, [4])
+
+    def test_keys_are_independent(self):
+        self.worker.submit('a', self.work('a'), self.results.append)
+        self.worker.submit('b', self.work('b'), self.results.append)
+        self.main.run_until_idle(self.worker)
+        self.assertEqual(sorted(self.results), ['a', 'b'])
+
+    def test_stale_result_dropped(self):
+        self.worker.submit('note', self.work(1), self.results.append)
+        while not self.calls:
+            time.sleep(0.005)
+        # the first job has run but not been delivered yet
+        self.worker.submit('note', self.work(2), self.results.append)
+        self.main.run_until_idle(self.worker)
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual(self.results, [2])
+
+    def test_cancel(self):
+        self.worker.submit('note', self.work(1), self.results.append)
+        self.worker.cancel('note')
+        self.main.run_until_idle(self.worker)
+        self.assertEqual(self.results, [])
+
+    def test_errors_delivered(self):
+        def fail():
+            raise ValueError('bad')
+        errors = []
+        self.worker.submit('note', fail, self.results.append, errors.append)
+        self.main.run_until_idle(self.worker)
+        self.assertEqual([str(e) for e in errors], ['bad'])
+
+    def test_errors_raised_on_main_thread_by_default(self):
+        def fail():
+            raise ValueError('bad')
+        self.worker.submit('note', fail, self.results.append)
+        self.assertTrue(self.worker.wait(0) is False)
+        while not self.main.callbacks:
+            time.sleep(0.005)
+        self.assertRaises(ValueError, self.main.run_pending)
+        self.assertTrue(self.worker.wait(1))
+
+
+    def test_failed_delivery_dropped(self):
+        def deliver(callback):
+            if not delivered:
+                delivered.append(callback)
+                raise RuntimeError('main window closed')
+            self.main.run_on_main(callback)
+        delivered = []
+        self.worker = DebouncedWorker(deliver, delay=0.02)
+        self.worker.submit('a', self.work('a'), self.results.append)
+        self.assertTrue(self.worker.wait(1))
+        self.worker.submit('b', self.work('b'), self.results.append)
+        self.main.run_until_idle(self.worker)
+        self.assertEqual(self.calls, ['a', 'b'])
+        self.assertEqual(self.results, ['b'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# test_xmlsource.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+import builtins
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import patch
+from kanjicolorizer import colorizer
+from kanjicolorizer.colorizer import (KanjiColorizer, KanjiVG,
+                                      InvalidCharacterError)
+from kanjicolorizer.xmlsource import KanjiVGXML
+from kanjicolorizer.tests.synthetic import SyntheticCorpusMixin
+
+
+def paths(svg):
+    return re.findall('<path [^>]*>', svg)
+
+
+class XMLSourceTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(XMLSourceTest, self).setUp()
+        self.xml = os.path.join(self.corpus.root, 'kanjivg.xml')
+        self.corpus.write_xml(self.xml)
+        self.source = KanjiVGXML(self.xml)
+
+    def test_iterates_everything(self):
+        keys = [(c, v) for c, v, svg in self.source]
+        self.assertEqual(sorted(keys), sorted(self.corpus.characters))
+
+    def test_same_strokes_as_svg_files(self):
+        for character, variant, svg in self.source:
+            self.assertEqual(paths(svg),
+                             paths(KanjiVG(character, variant).svg))
+
+    def test_random_access_without_iterating(self):
+        svg = self.source.get_svg('字', 'Kaisho')
+        self.assertEqual(paths(svg), paths(KanjiVG('字', 'Kaisho').svg))
+        self.assertIn('id="kvg:StrokePaths_05b57-Kaisho"', svg)
+
+    def test_random_access_after_iterating(self):
+        svgs = dict(((c, v), svg) for c, v, svg in self.source)
+        with patch.object(self.source, '_scan') as scan:
+            for key, svg in svgs.items():
+                self.assertEqual(self.source.get_svg(*key), svg)
+        self.assertFalse(scan.called)
+
+    def test_random_access_while_iterating(self):
+        iterator = iter(self.source)
+        character, variant, svg = next(iterator)
+        with patch.object(self.source, '_scan') as scan:
+            self.assertEqual(self.source.get_svg(character, variant), svg)
+        self.assertFalse(scan.called)
+        self.assertEqual(len(list(iterator)) + 1,
+                         len(self.corpus.characters))
+
+    def test_first_pass_done_once(self):
+        scans = []
+        scan = self.source._scan
+
+        def counted(keep_data):
+            scans.append(keep_data)
+            return scan(keep_data)
+
+        start = threading.Barrier(8)
+        results = []
+
+        def look_up():
+            start.wait()
+            results.append(self.source.get_svg('字', 'Kaisho'))
+            results.append(len(self.source.keys()))
+
+        with patch.object(self.source, '_scan', counted):
+            threads = [threading.Thread(target=look_up) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(scans, [False])
+        self.assertEqual(results.count(len(self.corpus.characters)), 8)
+        self.assertEqual(len(set(results)), 2)
+
+    def test_missing_character(self):
+        self.assertRaises(InvalidCharacterError, self.source.get_svg, 'Л')
+
+    def test_include_filter(self):
+        keys = [(c, v) for c, v, svg in
+                self.source.iter_svgs(lambda c, v: c == '字')]
+        self.assertEqual(keys, [('字', ''), ('字', 'Kaisho')])
+
+    def test_keeps_copyright(self):
+        self.assertIn('Copyright (C)', self.source.get_svg('a'))
+
+
+class XMLSourceColorizerTest(SyntheticCorpusMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(XMLSourceColorizerTest, self).setUp()
+        self.xml = os.path.join(self.corpus.root, 'kanjivg.xml')
+        self.corpus.write_xml(self.xml)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for name in ['source_file', 'source_directory']:
+            restore = patch.object(colorizer, name,
+                                   getattr(colorizer, name))
+            restore.start()
+            self.addCleanup(restore.stop)
+
+    def test_write_all_reads_file_once(self):
+        output = os.path.join(self.tmp, 'out')
+        real_open = builtins.open
+        with patch('builtins.open', side_effect=real_open) as mock_open:
+            KanjiColorizer('--source %s -o %s' % (self.xml, output)
+                           ).write_all()
+        reads = [c for c in mock_open.call_args_list
+                 if c[0][0] == self.xml]
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(len(os.listdir(output)), 7)
+
+    def test_colored_svg(self):
+        svg = KanjiColorizer('--source ' + self.xml).get_colored_svg('漢')
+        self.assertEqual(svg.count('style="stroke: #'), 10)
+        self.assertIn('has been modified', svg)
+
+    def test_index(self):
+        colorizer.use_source(self.xml)
+        self.assertEqual(KanjiVG.with_stroke_count(10), [('漢', '')])
+
+    def test_directory_source(self):
+        colorizer.use_source(self.xml)
+        colorizer.use_source(self.tmp)
+        self.assertIsNone(colorizer.source_file)
+        self.assertEqual(colorizer.source_directory, self.tmp)
+
+    def test_source_only_applies_to_its_colorizer(self):
+        directory = colorizer.source_directory
+        from_xml = KanjiColorizer('--source ' + self.xml)
+        self.assertIsNone(colorizer.source_file)
+        self.assertEqual(colorizer.source_directory, directory)
+        svg = KanjiColorizer('').get_colored_svg('漢')
+        self.assertNotEqual(svg, from_xml.get_colored_svg('漢'))
+        self.assertEqual(svg, KanjiColorizer('').get_colored_svg('漢'))
+
+    def test_renderer_changes_with_source(self):
+        kc = KanjiColorizer('--source ' + self.xml)
+        renderer = kc.renderer()
+        svg = renderer.render('漢')
+        kc.read_arg_string('')
+        self.assertIsNot(kc.renderer(), renderer)
+        self.assertNotEqual(kc.renderer().render('漢'), svg)
+
+    def test_disk_cache_kept_apart(self):
+        cache = os.path.join(self.tmp, 'cache')
+        svg = KanjiColorizer('--cache-dir ' + cache).get_colored_svg('漢')
+        from_xml = KanjiColorizer('--source %s --cache-dir %s'
+                                  % (self.xml, cache))
+        self.assertNotEqual(from_xml.get_colored_svg('漢'), svg)
+        self.assertEqual(len(os.listdir(cache)), 2)
+
+    def test_missing_source(self):
+        missing = os.path.join(self.tmp, 'missing.xml')
+        with patch('sys.stderr') as stderr:
+            self.assertRaises(SystemExit, KanjiColorizer,
+                              '--source ' + missing)
+        message = ''.join(c[0][0] for c in stderr.write.call_args_list)
+        self.assertIn("can't read KanjiVG data from " + missing, message)
+
+
+if __name__ == "__main__":
+    unittest.main()
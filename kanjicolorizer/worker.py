@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# worker.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+A background worker for the Anki add-on, so that leaving a field
+doesn't wait for diagrams to be rendered and written.  It doesn't
+depend on Anki: the add-on passes in a function that runs things on
+its main thread.
+'''
+
+import queue
+import threading
+import time
+
+
+class DebouncedWorker(object):
+    '''
+    Runs jobs in a background thread, a short delay after they are
+    submitted.  Submitting another job with the same key before the
+    first one's result has been delivered cancels it, so a burst of
+    submissions only does the work once and never delivers an out of
+    date result.
+
+    deliver is called from the worker thread with a function that
+    should be run on the main thread; by default it is just called.
+    If deliver raises, that job's result is dropped.
+
+    >>> worker = DebouncedWorker(delay=0.01)
+    >>> results = []
+    >>> worker.submit('note', lambda: 1, results.append)
+    >>> worker.submit('note', lambda: 2, results.append)
+    >>> worker.wait()
+    True
+    >>> results
+    [2]
+    '''
+
+    def __init__(self, deliver=None, delay=0.15):
+        self._deliver = deliver or (lambda function: function())
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._generations = {}
+        self._outstanding = 0
+        self._jobs = queue.Queue()
+        self._thread = None
+
+    def submit(self, key, work, done, failed=None):
+        '''
+        Calls work() in the background after the delay, then done with
+        its result on the main thread, unless this is superseded by
+        another job with the same key in the meantime.  If work raises
+        an exception, failed is called with it on the main thread; by
+        default it is raised there.
+        '''
+        with self._lock:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            self._outstanding += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+            self._jobs.put((time.monotonic() + self.delay, key, generation,
+                            work, done, failed))
+
+    def cancel(self, key):
+        '''
+        Drops any job for key that hasn't delivered its result yet
+        '''
+        with self._lock:
+            if key in self._generations:
+                self._generations[key] += 1
+
+    def wait(self, timeout=None):
+        '''
+        Waits until every job submitted so far has delivered its result
+        or been dropped; returns False if timeout ran out first
+        '''
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0,
+                                       timeout)
+
+    def _current(self, key, generation):
+        with self._lock:
+            return self._generations.get(key) == generation
+
+    def _finished(self):
+        with self._lock:
+            self._outstanding -= 1
+            if self._outstanding == 0:
+                self._idle.notify_all()
+
+    def _run(self):
+        # jobs are queued in the order they are due, so waiting for
+        # each one in turn doesn't hold up the ones behind it
+        while True:
+            due, key, generation, work, done, failed = self._jobs.get()
+            time.sleep(max(0, due - time.monotonic()))
+            if not self._current(key, generation):
+                self._finished()
+                continue
+            try:
+                result = work()
+            except Exception as e:
+                callback = self._callback(key, generation,
+                                          failed or _raise, e)
+            else:
+                callback = self._callback(key, generation, done, result)
+            try:
+                self._deliver(callback)
+            except Exception:
+                # nothing will run the callback (the main window may
+                # already be gone), so the job finishes here and the
+                # thread carries on with the next one
+                self._finished()
+
+    def _callback(self, key, generation, function, argument):
+        '''
+        A function for the main thread that calls function(argument) if
+        the job is still current, and marks it finished either way
+        '''
+        def callback():
+            try:
+                if self._current(key, generation):
+                    function(argument)
+            finally:
+                self._finished()
+        return callback
+
+
+def _raise(error):
+    raise error
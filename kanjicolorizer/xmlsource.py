@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# xmlsource.py is part of kanji-colorize which makes KanjiVG data
+# into colored stroke order diagrams
+#
+# Copyright 2012 Cayenne Boyer
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License along with this program.  If not, see
+# <http://www.gnu.org/licenses/>.
+
+'''
+Reading KanjiVG data from the single kanjivg.xml file that KanjiVG
+publishes alongside the individual svgs.
+
+The file is read a line at a time, and each <kanji> element is turned
+into an svg in the same form as the files in the kanji directory, so
+the rest of kanjicolorizer doesn't need to know where its data came
+from.  kanjivg.xml doesn't include stroke number positions, so
+diagrams made from it have no stroke numbers.
+'''
+
+import re
+import threading
+
+from .colorizer import InvalidCharacterError
+
+_start_re = re.compile(rb'<kanji id="kvg:kanji_([0-9a-f]+)-?([^"]*)">')
+_end = b'</kanji>'
+
+DOCTYPE = '''<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN" "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd" [
+<!ATTLIST g
+xmlns:kvg CDATA #FIXED "http://kanjivg.tagaini.net"
+kvg:element CDATA #IMPLIED >
+<!ATTLIST path
+xmlns:kvg CDATA #FIXED "http://kanjivg.tagaini.net"
+kvg:type CDATA #IMPLIED >
+]>
+'''
+
+SVG_START = ('<svg xmlns="http://www.w3.org/2000/svg" width="109" '
+             'height="109" viewBox="0 0 109 109">\n'
+             '<g id="kvg:StrokePaths_%s" style="fill:none;stroke:#000000;'
+             'stroke-width:3;stroke-linecap:round;stroke-linejoin:round;">\n')
+
+SVG_END = '</g>\n</svg>\n'
+
+
+class KanjiVGXML(object):
+    '''
+    The characters in a kanjivg.xml file, as svgs.
+
+    Iterating over it reads the whole file once, in order, and on the
+    way records where each character is, so that get_svg can seek
+    straight to any of them.  Calling get_svg for a character that
+    hasn't been found yet does that pass without making svgs; only
+    one thread does it at a time, and the others wait for it.
+
+    >>> import tempfile
+    >>> path = tempfile.mktemp()
+    >>> with open(path, 'w', encoding='utf-8') as f:
+    ...     _ = f.write("""<?xml version="1.0" encoding="UTF-8"?>
+    ... <!--
+    ... Copyright (C) 2009-2013 Ulrich Apel.
+    ... -->
+    ... <kanjivg xmlns:kvg='http://kanjivg.tagaini.net'>
+    ... <kanji id="kvg:kanji_00061">
+    ... <g id="kvg:00061" kvg:element="a">
+    ... <path id="kvg:00061-s1" d="M1,1"/>
+    ... </g>
+    ... </kanji>
+    ... </kanjivg>
+    ... """)
+    >>> source = KanjiVGXML(path)
+    >>> [(character, variant) for character, variant, svg in source]
+    [('a', '')]
+    >>> print(source.get_svg('a'))  # doctest: +ELLIPSIS
+    <?xml version="1.0" encoding="UTF-8"?>
+    <!--
+    Copyright (C) 2009-2013 Ulrich Apel.
+    -->
+    <!DOCTYPE svg ...
+    ]>
+    <svg xmlns="http://www.w3.org/2000/svg" width="109" height="109" viewBox="0 0 109 109">
+    <g id="kvg:StrokePaths_00061" style="...">
+    <g id="kvg:00061" kvg:element="a">
+    <path id="kvg:00061-s1" d="M1,1"/>
+    </g>
+    </g>
+    </svg>
+    <BLANKLINE>
+    >>> import os
+    >>> os.remove(path)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._offsets = {}
+        self._complete = False
+        self._prolog = None
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self.iter_svgs()
+
+    def iter_svgs(self, include=None):
+        '''
+        Yields (character, variant, svg) for everything in the file, in
+        file order.  If include is given, it is called with each
+        (character, variant) pair and svgs are only made for the ones
+        it returns true for.
+        '''
+        for character, variant, data in self._scan(keep_data=True):
+            if include is None or include(character, variant):
+                yield character, variant, self._to_svg(character, variant,
+                                                       data)
+
+    def get_svg(self, character, variant=''):
+        '''
+        Returns the svg for character (and variant).  Raises
+        InvalidCharacterError if the file doesn't have it.
+        '''
+        if (character, variant) not in self._offsets:
+            self._scan_all()
+        try:
+            offset, length = self._offsets[(character, variant)]
+        except KeyError:
+            raise InvalidCharacterError(character, variant)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        return self._to_svg(character, variant, data)
+
+    def keys(self):
+        '''
+        (character, variant) pairs for everything in the file
+        '''
+        self._scan_all()
+        return list(self._offsets)
+
+    def _scan_all(self):
+        '''
+        Makes sure the whole file has been scanned, scanning it here if
+        no one else has
+        '''
+        if self._complete:
+            return
+        with self._lock:
+            if not self._complete:
+                for entry in self._scan(keep_data=False):
+                    pass
+
+    def _scan(self, keep_data):
+        '''
+        Reads the file in one pass, yielding (character, variant, the
+        bytes of its <kanji> element, or None unless keep_data), and
+        records the prolog and the offset of each element as it goes
+        '''
+        found = False
+        prolog = []
+        offset = 0
+        start = key = None
+        lines = []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if start is None:
+                    m = _start_re.search(line)
+                    if m:
+                        start = offset + m.start()
+                        key = (chr(int(m.group(1), 16)),
+                               m.group(2).decode('ascii'))
+                        lines = [line[m.start():]]
+                    elif not found and self._prolog is None:
+                        prolog.append(line)
+                elif keep_data:
+                    lines.append(line)
+                offset += len(line)
+                if start is not None and _end in line:
+                    end = offset - len(line) + line.index(_end) + len(_end)
+                    if self._prolog is None:
+                        self._set_prolog(prolog)
+                    self._offsets[key] = (start, end - start)
+                    found = True
+                    data = None
+                    if keep_data:
+                        data = b''.join(lines)[:end - start]
+                    yield key[0], key[1], data
+                    start = key = None
+        self._complete = True
+
+    def _set_prolog(self, lines):
+        '''
+        Keeps the xml declaration and copyright comment from the start
+        of the file, to go at the start of each svg
+        '''
+        prolog = b''.join(lines).decode('utf-8')
+        m = re.search('<!DOCTYPE|<kanjivg', prolog)
+        if m:
+            prolog = prolog[:m.start()]
+        self._prolog = prolog.rstrip('\n') + '\n'
+
+    def _to_svg(self, character, variant, data):
+        '''
+        Makes an svg like the ones in the kanji directory out of a
+        <kanji> element
+        '''
+        code = '%05x' % ord(character)
+        if variant:
+            code += '-' + variant
+        body = data.decode('utf-8')
+        body = body[body.index('>') + 1:body.rindex(_end.decode())]
+        return (self._prolog + DOCTYPE + SVG_START % code +
+                body.strip('\n') + '\n' + SVG_END)
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def get_source(path):
+    '''
+    Returns a KanjiVGXML for path, keeping it (and the offsets it has
+    found) for the life of the process
+    '''
+    with _sources_lock:
+        if path not in _sources:
+            _sources[path] = KanjiVGXML(path)
+        return _sources[path]
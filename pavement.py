@@ -28,7 +28,8 @@ import zipfile
 options(
     anki=Bunch(
         builddir=path('build') / 'anki_addon',
-        zip=path('dist') / 'KanjiColorizerAnkiAddon.ankiaddon'))
+        zip=path('dist') / 'KanjiColorizerAnkiAddon.ankiaddon'),
+    build_anki_addon=Bunch(prerender=False))
 
 
 setup(
@@ -42,7 +43,8 @@ setup(
     url='http://github.com/cayennes/kanji-colorize',
     packages=['kanjicolorizer'],
     scripts=['kanji_colorize.py'],
-    package_data={'kanjicolorizer': ['data/kanjivg/kanji/*.svg']},
+    package_data={'kanjicolorizer': ['data/kanjivg/kanji/*.svg',
+                                     'data/kanjivg-index.json']},
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Console',
@@ -57,11 +59,19 @@ setup(
 
 
 @task
-@needs('generate_setup', 'minilib', 'setuptools.command.sdist')
+@needs('build_index', 'generate_setup', 'minilib',
+       'setuptools.command.sdist')
 def sdist():
     pass
 
 
+@task
+def build_index():
+    from kanjicolorizer.index import build_index, index_path
+    build_index().save()
+    print("wrote metadata index to " + index_path)
+
+
 @task
 def clean_anki_addon(options):
     if options.anki.builddir.exists():
@@ -69,7 +79,9 @@ def clean_anki_addon(options):
 
 
 @task
-@needs('setuptools.command.build', 'clean_anki_addon')
+@needs('build_index', 'setuptools.command.build', 'clean_anki_addon')
+@cmdopts([('prerender', 'p', 'include diagrams for the default config, '
+           'so that they are copied instead of rendered')])
 def build_anki_addon(options):
 
     import argparse
@@ -95,6 +107,28 @@ def build_anki_addon(options):
     license_dest = options.anki.builddir / 'kanjicolorizer' / 'licenses'
     path('licenses').copytree(license_dest)
 
+    if options.build_anki_addon.prerender:
+        prerender_anki_addon(options.anki.builddir / 'prerendered.bin')
+
+
+def prerender_anki_addon(store_path):
+    '''
+    Renders everything with the settings in the add-on's default config
+    into a store that the add-on copies diagrams from while its config
+    still has those settings
+    '''
+    import json
+    from kanjicolorizer.colorizer import Renderer, RenderSettings
+    from kanjicolorizer.prerendered import build_store
+    with open(path('anki') / 'config.json', encoding='utf-8') as f:
+        config = json.load(f)
+    settings = RenderSettings(
+        mode=config['mode'], saturation=config['saturation'],
+        value=config['value'], image_size=config['image-size'],
+        grid=config['grid'], group_mode=config['group-mode'])
+    count = build_store(store_path, Renderer(settings, cache_size=0))
+    print("prerendered %d diagrams to %s" % (count, store_path))
+
 
 @task
 @needs('build_anki_addon')